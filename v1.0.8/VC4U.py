@@ -1,249 +1,612 @@
-import logging
-import os
-import sys
-import threading
-from datetime import datetime
-
-from menu_bar import MenuBar
-from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
-from pydub import AudioSegment
-from PyQt5.QtCore import QFile, Qt, QTextStream, QTime
-from PyQt5.QtGui import QIcon, QMovie
-from PyQt5.QtWidgets import (
-    QApplication,
-    QFileDialog,
-    QLabel,
-    QLineEdit,
-    QMainWindow,
-    QMessageBox,
-    QPushButton,
-    QTimeEdit,
-    QVBoxLayout,
-    QHBoxLayout,
-    QWidget,
-)
-
-# Constants for supported file types
-VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mkv']
-AUDIO_EXTENSIONS = ['.mp3', '.wav', '.flac']
-ALL_EXTENSIONS = VIDEO_EXTENSIONS + AUDIO_EXTENSIONS
-
-class VideoCutterApp(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("VC4U")
-        self.setGeometry(400, 50, 480, 520)
-        self.setWindowIcon(QIcon(r"../Images/window_icon4.png"))  # Provide the path to your icon
-        self.initUI()
-        self.cut_thread = None
-        self.terminate_cut = threading.Event()
-
-    def initUI(self):
-        # Heading image at top
-        heading_image_label = QLabel(self)
-        self.movie = QMovie("../Images/Header1.gif")  # Provide path to your GIF file
-        heading_image_label.setMovie(self.movie)
-        self.movie.start()
-
-        # Load the stylesheet from the file
-        self.load_stylesheet("style.qss")
-
-        # Create a central widget and set a layout
-        central_widget = QWidget()
-        main_layout = QVBoxLayout(central_widget)
-
-        # Center the heading image
-        heading_layout = QHBoxLayout()
-        heading_layout.addStretch()
-        heading_layout.addWidget(heading_image_label)
-        heading_layout.addStretch()
-        main_layout.addLayout(heading_layout)
-
-        # Add menu bar
-        self.menu_bar = MenuBar(self)
-        self.setMenuBar(self.menu_bar)
-
-        self.input_button, self.input_entry = self.create_file_selection(main_layout, "Select Input File", self.select_input_file)
-        self.output_button, self.output_entry = self.create_file_selection(main_layout, "Select Output File", self.select_output_file)
-
-        self.label_start, self.time_edit_start = self.create_time_edit(main_layout, "Start Time (hh:mm:ss.mmm)")
-        self.label_end, self.time_edit_end = self.create_time_edit(main_layout, "End Time (hh:mm:ss.mmm)")
-
-        self.cut_button = self.create_button(main_layout, "Cut File", self.cut_file, "Click to cut the video or audio file")
-
-        self.animation_label = QLabel(self)
-        self.spinner_movie = QMovie("../Images/spinner3.gif")  # Replace "spinner3.gif" with the path to your GIF file
-        self.animation_label.setMovie(self.spinner_movie)
-        main_layout.addWidget(self.animation_label, alignment=Qt.AlignCenter)
-        self.animation_label.hide()
-
-        self.status_label = QLabel(self)
-        main_layout.addWidget(self.status_label)
-        self.status_label.setAlignment(Qt.AlignCenter)
-
-        self.original_size_label = QLabel(self)
-        main_layout.addWidget(self.original_size_label)
-
-        self.cut_size_label = QLabel(self)
-        main_layout.addWidget(self.cut_size_label)
-
-        self.clear_button = self.create_button(main_layout, "Clear", self.clear_fields, "Clear all fields and reset")
-
-        self.setCentralWidget(central_widget)
-
-    def load_stylesheet(self, stylesheet_path):
-        style_file = QFile(stylesheet_path)
-        if style_file.open(QFile.ReadOnly | QFile.Text):
-            stream = QTextStream(style_file)
-            app.setStyleSheet(stream.readAll())
-            style_file.close()
-
-    def create_file_selection(self, layout, button_text, button_callback):
-        button = QPushButton(self)
-        button.setText(button_text)
-        layout.addWidget(button)
-        button.clicked.connect(button_callback)
-        button.setToolTip(f"Click to {button_text.lower()}")
-
-        line_edit = QLineEdit(self)
-        layout.addWidget(line_edit)
-        return button, line_edit
-
-    def create_time_edit(self, layout, label_text):
-        label = QLabel(self)
-        label.setText(label_text)
-        layout.addWidget(label)
-
-        time_edit = QTimeEdit(self)
-        time_edit.setDisplayFormat("HH:mm:ss.zzz")
-        layout.addWidget(time_edit)
-        return label, time_edit
-
-    def create_button(self, layout, text, callback, tooltip):
-        button = QPushButton(self)
-        button.setText(text)
-        layout.addWidget(button)
-        button.clicked.connect(callback)
-        button.setToolTip(tooltip)
-        return button
-
-    def select_input_file(self):
-        input_file, _ = QFileDialog.getOpenFileName(
-            self,
-            "Select Video or Audio File",
-            "",
-            "Video Files (*.mp4 *.avi *.mkv);;Audio Files (*.mp3 *.wav *.flac);;All Files (*)",
-        )
-        if input_file:
-            self.input_entry.setText(input_file)
-
-    def select_output_file(self):
-        output_file, _ = QFileDialog.getSaveFileName(
-            self,
-            "Save Cut File As",
-            "",
-            "Video Files (*.mp4 *.avi *.mkv);;Audio Files (*.mp3 *.wav *.flac);;All Files (*)",
-            options=QFileDialog.DontConfirmOverwrite,
-        )
-        if output_file:
-            self.output_entry.setText(output_file)
-
-    def cut_file(self):
-        if self.cut_thread and self.cut_thread.is_alive():
-            QMessageBox.warning(self, "Warning", "A cutting operation is already in progress.")
-            return
-
-        input_file = self.input_entry.text()
-        output_file = self.output_entry.text()
-
-        if not input_file or not output_file:
-            QMessageBox.warning(self, "Error", "Please select both input and output files.")
-            return
-
-        self.cut_thread = threading.Thread(target=self.perform_cut, args=(input_file, output_file))
-        self.cut_thread.start()
-        self.animation_label.show()  # Show the animation while processing
-        self.spinner_movie.start()  # Start the animation
-
-    def perform_cut(self, input_file, output_file):
-        try:
-            start_seconds = self.time_to_seconds(self.time_edit_start.time().toString("HH:mm:ss.zzz"))
-            end_seconds = self.time_to_seconds(self.time_edit_end.time().toString("HH:mm:ss.zzz"))
-
-            self.update_status_label("Cutting in progress...")
-            self.disable_ui()
-
-            file_extension = os.path.splitext(input_file)[1].lower()
-
-            if file_extension in VIDEO_EXTENSIONS:
-                ffmpeg_extract_subclip(input_file, start_seconds, end_seconds, targetname=output_file)
-            elif file_extension in AUDIO_EXTENSIONS:
-                audio = AudioSegment.from_file(input_file)
-                cut_audio = audio[start_seconds * 1000:end_seconds * 1000]
-                cut_audio.export(output_file, format=file_extension[1:])
-            else:
-                raise ValueError("Unsupported file type")
-
-            self.show_file_sizes(input_file, output_file)
-            self.update_status_label("File cut successfully!")
-        except Exception as e:
-            logging.exception("Error cutting file")
-            self.update_status_label(f"Error: {str(e)}")
-        finally:
-            self.enable_ui()
-            self.animation_label.hide()  # Hide the animation after completion
-
-    def show_file_sizes(self, input_file, output_file):
-        original_size = os.path.getsize(input_file)
-        cut_size = os.path.getsize(output_file)
-        self.original_size_label.setText(f"Original Size: {self.format_size(original_size)}")
-        self.cut_size_label.setText(f"Cut Size: {self.format_size(cut_size)}")
-
-    def disable_ui(self):
-        self.input_button.setEnabled(False)
-        self.output_button.setEnabled(False)
-        self.time_edit_start.setEnabled(False)
-        self.time_edit_end.setEnabled(False)
-        self.cut_button.setEnabled(False)
-        self.clear_button.setEnabled(False)
-
-    def enable_ui(self):
-        self.input_button.setEnabled(True)
-        self.output_button.setEnabled(True)
-        self.time_edit_start.setEnabled(True)
-        self.time_edit_end.setEnabled(True)
-        self.cut_button.setEnabled(True)
-        self.clear_button.setEnabled(True)
-
-    def update_status_label(self, message):
-        self.status_label.setText(message)
-
-    def time_to_seconds(self, time_str):
-        try:
-            time_obj = datetime.strptime(time_str, "%H:%M:%S.%f")
-            return (time_obj - datetime(1900, 1, 1)).total_seconds()
-        except ValueError:
-            raise ValueError("Invalid time format. Use hh:mm:ss.mmm")
-
-    def format_size(self, size):
-        for unit in ["B", "KB", "MB", "GB"]:
-            if size < 1024.0:
-                return f"{size:.2f} {unit}"
-            size /= 1024.0
-
-    def clear_fields(self):
-        self.input_entry.clear()
-        self.output_entry.clear()
-        self.time_edit_start.setTime(QTime(0, 0))
-        self.time_edit_end.setTime(QTime(0, 0))
-        self.update_status_label("")
-        self.original_size_label.setText("")
-        self.cut_size_label.setText("")
-
-
-if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
-    app = QApplication(sys.argv)
-    window = VideoCutterApp()
-    window.show()
-    sys.exit(app.exec_())
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+from collections import deque
+from datetime import datetime
+
+from audio_cutter import AUDIO_MODE_COPY, AUDIO_MODE_REENCODE
+from cutter import VIDEO_EXTENSIONS, parse_time, probe_or_none
+from job_queue import FINISHED_STATES, JOB_CANCELLED, JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, CutJob, JobQueue, JoinJob, SplitJob
+from keyframe_index import get_keyframe_index
+from manifest import ManifestReader, group_jobs
+from menu_bar import MenuBar
+from PyQt5.QtCore import QFile, Qt, QTextStream, QTime, QTimer, pyqtSignal
+from PyQt5.QtGui import QIcon, QMovie
+from PyQt5.QtWidgets import (
+    QApplication,
+    QCheckBox,
+    QAbstractItemView,
+    QComboBox,
+    QFileDialog,
+    QHeaderView,
+    QInputDialog,
+    QLabel,
+    QLineEdit,
+    QMainWindow,
+    QMessageBox,
+    QProgressBar,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QTimeEdit,
+    QVBoxLayout,
+    QHBoxLayout,
+    QWidget,
+)
+from splitter import parse_size
+from video_cutter import VIDEO_MODE_COPY, VIDEO_MODE_REENCODE, VIDEO_MODE_SMART
+
+# Display names for the audio cutting modes
+AUDIO_MODE_NAMES = {
+    "Re-encode (sample accurate)": AUDIO_MODE_REENCODE,
+    "Stream copy (lossless, frame boundaries)": AUDIO_MODE_COPY,
+}
+
+# Display names for the video cutting modes
+VIDEO_MODE_NAMES = {
+    "Stream copy (snaps to keyframes)": VIDEO_MODE_COPY,
+    "Smart cut (frame accurate)": VIDEO_MODE_SMART,
+    "Re-encode (frame accurate, all cores)": VIDEO_MODE_REENCODE,
+}
+
+# Finished jobs kept in the jobs table, older ones are dropped as new ones finish
+MAX_FINISHED_ROWS = 200
+
+class VideoCutterApp(QMainWindow):
+    # Emitted from the prefetch thread once the selected input has been probed
+    probe_finished = pyqtSignal(str, object)
+    # Emitted from the prefetch thread with (input file, keyframe index or None, error message)
+    keyframes_indexed = pyqtSignal(str, object, str)
+    # Emitted from a describe thread with (job_id, input media info, output media info)
+    outputs_probed = pyqtSignal(int, object, object)
+    # Emitted from the job queue's threads with (job_id, status, detail)
+    job_updated = pyqtSignal(int, str, object)
+    # Emitted from the manifest thread as the cut list is read
+    manifest_progress = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("VC4U")
+        self.setGeometry(400, 50, 480, 520)
+        self.setWindowIcon(QIcon(r"../Images/window_icon4.png"))  # Provide the path to your icon
+        self.prefetch_file = None
+        # (input file, keyframe index, error message) from the last prefetch, and the input
+        # whose times are to be snapped once its index arrives
+        self.keyframe_index = None
+        self.snap_pending = None
+        # Jobs held back until the prefetch of their input finishes
+        self.pending_jobs = []
+        self.jobs = {}
+        self.job_rows = {}
+        self.finished_jobs = deque()
+        self.file_sizes = None
+        self.job_queue = JobQueue(on_update=self.job_updated.emit)
+        self.manifest_thread = None
+        self.stop_manifest = threading.Event()
+        self.probe_finished.connect(self.apply_media_info)
+        self.keyframes_indexed.connect(self.apply_keyframe_index)
+        self.outputs_probed.connect(self.apply_file_descriptions)
+        self.job_updated.connect(self.update_job)
+        self.initUI()
+
+    def initUI(self):
+        # Heading image at top
+        heading_image_label = QLabel(self)
+        self.movie = QMovie("../Images/Header1.gif")  # Provide path to your GIF file
+        heading_image_label.setMovie(self.movie)
+        self.movie.start()
+
+        # Load the stylesheet from the file
+        self.load_stylesheet("style.qss")
+
+        # Create a central widget and set a layout
+        central_widget = QWidget()
+        main_layout = QVBoxLayout(central_widget)
+
+        # Center the heading image
+        heading_layout = QHBoxLayout()
+        heading_layout.addStretch()
+        heading_layout.addWidget(heading_image_label)
+        heading_layout.addStretch()
+        main_layout.addLayout(heading_layout)
+
+        # Add menu bar
+        self.menu_bar = MenuBar(self)
+        self.setMenuBar(self.menu_bar)
+
+        self.input_button, self.input_entry = self.create_file_selection(main_layout, "Select Input File", self.select_input_file)
+        # Probe typed paths once the user pauses, so the work is done before Cut is clicked
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.setInterval(500)
+        self.prefetch_timer.timeout.connect(self.prefetch_input)
+        self.input_entry.textChanged.connect(self.prefetch_timer.start)
+        self.input_entry.editingFinished.connect(self.prefetch_input)
+        self.output_button, self.output_entry = self.create_file_selection(main_layout, "Select Output File", self.select_output_file)
+
+        self.label_start, self.time_edit_start = self.create_time_edit(main_layout, "Start Time (hh:mm:ss.mmm)")
+        self.label_end, self.time_edit_end = self.create_time_edit(main_layout, "End Time (hh:mm:ss.mmm)")
+
+        self.snap_checkbox = QCheckBox("Snap times to keyframes", self)
+        self.snap_checkbox.setToolTip("Move the start and end times to the nearest video keyframes")
+        main_layout.addWidget(self.snap_checkbox)
+        self.snap_checkbox.toggled.connect(self.snap_times_to_keyframes)
+        self.time_edit_start.editingFinished.connect(self.snap_times_to_keyframes)
+        self.time_edit_end.editingFinished.connect(self.snap_times_to_keyframes)
+
+        self.label_video_mode, self.video_mode_combo = self.create_combo_box(main_layout, "Video Mode", list(VIDEO_MODE_NAMES))
+        self.label_audio_mode, self.audio_mode_combo = self.create_combo_box(main_layout, "Audio Mode", list(AUDIO_MODE_NAMES))
+
+        self.cut_button = self.create_button(main_layout, "Cut File", self.cut_file, "Click to cut the video or audio file")
+        self.manifest_button = self.create_button(main_layout, "Import Manifest", self.import_manifest, "Queue every cut listed in a CSV, JSON or EDL file")
+        self.split_button = self.create_button(main_layout, "Split File", self.split_file, "Split the whole input into numbered parts of a set length or size, in one pass")
+        self.join_button = self.create_button(main_layout, "Join Files", self.join_files, "Play several files one after another in a single file, without re-encoding the ones that match")
+        self.cancel_button = self.create_button(main_layout, "Cancel", self.cancel_cut, "Stop the selected cuts (or all of them) and delete their partial output")
+        self.cancel_button.setEnabled(False)
+
+        self.animation_label = QLabel(self)
+        self.spinner_movie = QMovie("../Images/spinner3.gif")  # Replace "spinner3.gif" with the path to your GIF file
+        self.animation_label.setMovie(self.spinner_movie)
+        main_layout.addWidget(self.animation_label, alignment=Qt.AlignCenter)
+        self.animation_label.hide()
+
+        self.status_label = QLabel(self)
+        main_layout.addWidget(self.status_label)
+        self.status_label.setAlignment(Qt.AlignCenter)
+
+        # One row per queued cut, so several can run side by side
+        self.jobs_table = QTableWidget(0, 3, self)
+        self.jobs_table.setHorizontalHeaderLabels(["Output", "Status", "Progress"])
+        self.jobs_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.jobs_table.verticalHeader().hide()
+        self.jobs_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.jobs_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        main_layout.addWidget(self.jobs_table)
+
+        self.manifest_label = QLabel(self)
+        main_layout.addWidget(self.manifest_label)
+        self.manifest_label.setAlignment(Qt.AlignCenter)
+        self.manifest_progress.connect(self.manifest_label.setText)
+
+        self.original_size_label = QLabel(self)
+        main_layout.addWidget(self.original_size_label)
+
+        self.cut_size_label = QLabel(self)
+        main_layout.addWidget(self.cut_size_label)
+
+        self.clear_button = self.create_button(main_layout, "Clear", self.clear_fields, "Clear all fields and reset")
+
+        self.setCentralWidget(central_widget)
+
+    def load_stylesheet(self, stylesheet_path):
+        style_file = QFile(stylesheet_path)
+        if style_file.open(QFile.ReadOnly | QFile.Text):
+            stream = QTextStream(style_file)
+            app.setStyleSheet(stream.readAll())
+            style_file.close()
+
+    def create_file_selection(self, layout, button_text, button_callback):
+        button = QPushButton(self)
+        button.setText(button_text)
+        layout.addWidget(button)
+        button.clicked.connect(button_callback)
+        button.setToolTip(f"Click to {button_text.lower()}")
+
+        line_edit = QLineEdit(self)
+        layout.addWidget(line_edit)
+        return button, line_edit
+
+    def create_time_edit(self, layout, label_text):
+        label = QLabel(self)
+        label.setText(label_text)
+        layout.addWidget(label)
+
+        time_edit = QTimeEdit(self)
+        time_edit.setDisplayFormat("HH:mm:ss.zzz")
+        layout.addWidget(time_edit)
+        return label, time_edit
+
+    def create_combo_box(self, layout, label_text, items):
+        label = QLabel(self)
+        label.setText(label_text)
+        layout.addWidget(label)
+
+        combo_box = QComboBox(self)
+        combo_box.addItems(items)
+        layout.addWidget(combo_box)
+        return label, combo_box
+
+    def create_button(self, layout, text, callback, tooltip):
+        button = QPushButton(self)
+        button.setText(text)
+        layout.addWidget(button)
+        button.clicked.connect(callback)
+        button.setToolTip(tooltip)
+        return button
+
+    def select_input_file(self):
+        input_file, _ = QFileDialog.getOpenFileName(
+            self,
+            "Select Video or Audio File",
+            "",
+            "Video Files (*.mp4 *.avi *.mkv);;Audio Files (*.mp3 *.wav *.flac);;All Files (*)",
+        )
+        if input_file:
+            self.input_entry.setText(input_file)
+            self.prefetch_input()
+
+    def select_output_file(self):
+        output_file, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Cut File As",
+            "",
+            "Video Files (*.mp4 *.avi *.mkv);;Audio Files (*.mp3 *.wav *.flac);;All Files (*)",
+            options=QFileDialog.DontConfirmOverwrite,
+        )
+        if output_file:
+            self.output_entry.setText(output_file)
+
+    def probe_input(self, input_file):
+        return probe_or_none(input_file)
+
+    def prefetch_input(self):
+        self.prefetch_timer.stop()
+        input_file = self.input_entry.text()
+        if input_file == self.prefetch_file or not os.path.isfile(input_file):
+            return
+        self.prefetch_file = input_file
+        self.keyframe_index = None
+        threading.Thread(target=self.prefetch_worker, args=(input_file,), daemon=True).start()
+
+    def prefetch_worker(self, input_file):
+        # Warm the probe and keyframe caches in the background so the cut itself starts immediately
+        media_info = self.probe_input(input_file)
+        self.probe_finished.emit(input_file, media_info)
+        index, error = None, ""
+        if media_info and media_info.has_video:
+            try:
+                index = get_keyframe_index(input_file)
+            except Exception as e:
+                logging.exception("Error indexing keyframes for %s", input_file)
+                error = str(e)
+        self.keyframes_indexed.emit(input_file, index, error)
+
+    def apply_media_info(self, input_file, media_info):
+        if input_file != self.input_entry.text():
+            return
+        # Keep the time editors inside the real length of the selected file
+        if media_info and media_info.duration:
+            max_time = self.seconds_to_time(min(media_info.duration, 86399.999))
+        else:
+            max_time = QTime(23, 59, 59, 999)
+        self.time_edit_start.setMaximumTime(max_time)
+        self.time_edit_end.setMaximumTime(max_time)
+        if media_info and media_info.duration and self.time_edit_end.time() == QTime(0, 0):
+            self.time_edit_end.setTime(max_time)
+
+    def apply_keyframe_index(self, input_file, index, error):
+        waiting = [job for job in self.pending_jobs if job.input_file == input_file]
+        self.pending_jobs = [job for job in self.pending_jobs if job.input_file != input_file]
+        for job in waiting:
+            self.job_queue.submit(job)
+        if input_file != self.prefetch_file:
+            return
+        self.keyframe_index = (input_file, index, error)
+        if self.snap_pending == input_file:
+            self.snap_times_to_keyframes()
+
+    def snap_times_to_keyframes(self):
+        input_file = self.input_entry.text()
+        if not self.snap_checkbox.isChecked() or os.path.splitext(input_file)[1].lower() not in VIDEO_EXTENSIONS:
+            return
+        if self.keyframe_index is None or self.keyframe_index[0] != input_file:
+            # Indexing a large file takes a while, so the prefetch thread does it and the snap follows
+            self.snap_pending = input_file
+            self.prefetch_input()
+            return
+        self.snap_pending = None
+        _, index, error = self.keyframe_index
+        if index is None:
+            self.update_status_label(f"Error: {error}" if error else "Error: no video keyframes to snap to")
+            return
+
+        # Start snaps back and end snaps forward so the snapped range always covers the requested one
+        start_seconds = self.time_to_seconds(self.time_edit_start.time().toString("HH:mm:ss.zzz"))
+        end_seconds = self.time_to_seconds(self.time_edit_end.time().toString("HH:mm:ss.zzz"))
+        snapped_start = index.keyframe_at_or_before(start_seconds)
+        snapped_end = index.keyframe_at_or_after(end_seconds)
+        if snapped_start is not None:
+            self.time_edit_start.setTime(self.seconds_to_time(snapped_start))
+        if snapped_end is not None and end_seconds > 0:
+            self.time_edit_end.setTime(self.seconds_to_time(snapped_end))
+
+    def cut_file(self):
+        input_file = self.input_entry.text()
+        output_file = self.output_entry.text()
+
+        if not input_file or not output_file:
+            QMessageBox.warning(self, "Error", "Please select both input and output files.")
+            return
+        if any(output_file in job.outputs for job_id, job in self.jobs.items() if self.job_queue.status.get(job_id) in (JOB_QUEUED, JOB_RUNNING)):
+            QMessageBox.warning(self, "Warning", "A cut to this output file is already queued.")
+            return
+
+        job = CutJob(
+            input_file,
+            output_file,
+            self.time_to_seconds(self.time_edit_start.time().toString("HH:mm:ss.zzz")),
+            self.time_to_seconds(self.time_edit_end.time().toString("HH:mm:ss.zzz")),
+            video_mode=VIDEO_MODE_NAMES[self.video_mode_combo.currentText()],
+            audio_mode=AUDIO_MODE_NAMES[self.audio_mode_combo.currentText()],
+        )
+        self.submit_job(job)
+
+    def split_file(self):
+        input_file = self.input_entry.text()
+        output_file = self.output_entry.text()
+        if not input_file or not output_file:
+            QMessageBox.warning(self, "Error", "Please select both input and output files.")
+            return
+        limit, accepted = QInputDialog.getText(self, "Split File", "Part length (hh:mm:ss) or largest part size (e.g. 700M, 2G):")
+        if not accepted or not limit.strip():
+            return
+        # A bare number is a length, a unit makes it a size
+        try:
+            job = SplitJob(input_file, output_file, part_seconds=parse_time(limit))
+        except ValueError:
+            try:
+                job = SplitJob(input_file, output_file, part_bytes=parse_size(limit))
+            except ValueError:
+                QMessageBox.warning(self, "Error", "Enter a length such as 00:10:00 or a size such as 2G.")
+                return
+        if any(job.outputs[0] in other.outputs for job_id, other in self.jobs.items() if self.job_queue.status.get(job_id) in (JOB_QUEUED, JOB_RUNNING)):
+            QMessageBox.warning(self, "Warning", "A cut to this output file is already queued.")
+            return
+        self.submit_job(job)
+
+    def join_files(self):
+        input_files, _ = QFileDialog.getOpenFileNames(
+            self,
+            "Select Files to Join (in order)",
+            "",
+            "Video Files (*.mp4 *.avi *.mkv);;Audio Files (*.mp3 *.wav *.flac);;All Files (*)",
+        )
+        if not input_files:
+            return
+        if len(input_files) < 2:
+            QMessageBox.warning(self, "Error", "Please select at least two files to join.")
+            return
+        output_file, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Joined File As",
+            "",
+            "Video Files (*.mp4 *.avi *.mkv);;Audio Files (*.mp3 *.wav *.flac);;All Files (*)",
+            options=QFileDialog.DontConfirmOverwrite,
+        )
+        if not output_file:
+            return
+        if any(output_file in job.outputs for job_id, job in self.jobs.items() if self.job_queue.status.get(job_id) in (JOB_QUEUED, JOB_RUNNING)):
+            QMessageBox.warning(self, "Warning", "A cut to this output file is already queued.")
+            return
+        self.submit_job(JoinJob(input_files, output_file))
+
+    def import_manifest(self):
+        manifest_file, _ = QFileDialog.getOpenFileName(
+            self,
+            "Select Cut List",
+            "",
+            "Cut Lists (*.csv *.json *.edl);;All Files (*)",
+        )
+        if not manifest_file:
+            return
+        if self.manifest_thread and self.manifest_thread.is_alive():
+            QMessageBox.warning(self, "Warning", "A cut list is still being queued.")
+            return
+        # EDL events without a clip name are taken from the selected input, unnamed outputs
+        # go next to the selected output file (or the manifest)
+        output_dir = os.path.dirname(self.output_entry.text()) or None
+        try:
+            reader = ManifestReader(
+                manifest_file,
+                output_dir=output_dir,
+                source=self.input_entry.text() or None,
+                video_mode=VIDEO_MODE_NAMES[self.video_mode_combo.currentText()],
+                audio_mode=AUDIO_MODE_NAMES[self.audio_mode_combo.currentText()],
+            )
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Error", f"Could not read the cut list: {str(e)}")
+            return
+        self.stop_manifest.clear()
+        self.manifest_thread = threading.Thread(target=self.feed_manifest, args=(reader,), daemon=True)
+        self.manifest_thread.start()
+
+    def feed_manifest(self, reader):
+        # The cut list is read only as fast as the workers take jobs, so huge lists never load whole
+        def report():
+            self.manifest_progress.emit(f"Cut list: {reader.rows_read} rows read ({reader.fraction:.0%})")
+
+        try:
+            self.job_queue.submit_all(group_jobs(reader), cancel=self.stop_manifest, submitted=report)
+        except (OSError, ValueError) as e:
+            logging.error("Error reading cut list: %s", e)
+            self.manifest_progress.emit(f"Error in cut list: {str(e)}")
+            return
+        if self.stop_manifest.is_set():
+            self.manifest_progress.emit(f"Cut list stopped after {reader.rows_read} rows")
+        else:
+            self.manifest_progress.emit(f"Cut list: all {reader.rows_read} rows queued")
+
+    def submit_job(self, job):
+        # A job on an input still being prefetched waits for it, so the worker finds the probe
+        # and keyframe caches warm rather than building them a second time
+        if job.input_file == self.prefetch_file and (self.keyframe_index is None or self.keyframe_index[0] != job.input_file):
+            self.pending_jobs.append(job)
+            return
+        self.job_queue.submit(job)
+
+    def cancel_cut(self):
+        selected_rows = {index.row() for index in self.jobs_table.selectionModel().selectedRows()}
+        job_ids = [job_id for job_id, row in self.job_rows.items() if row in selected_rows]
+        if not job_ids:
+            # Nothing selected stops everything, including the rest of an imported cut list
+            self.stop_manifest.set()
+            job_ids = list(self.job_rows)
+        for job_id in job_ids:
+            if self.job_queue.status.get(job_id) in (JOB_QUEUED, JOB_RUNNING):
+                self.job_queue.cancel(job_id)
+                self.jobs_table.item(self.job_rows[job_id], 1).setText("Cancelling...")
+
+    def update_job(self, job_id, status, detail):
+        if status == JOB_QUEUED:
+            self.add_job_row(job_id, detail)
+        row = self.job_rows.get(job_id)
+        if row is None:
+            return
+        status_item = self.jobs_table.item(row, 1)
+        progress_bar = self.jobs_table.cellWidget(row, 2)
+        job = self.jobs[job_id]
+
+        if status == JOB_QUEUED:
+            status_item.setText("Queued")
+        elif status == JOB_RUNNING:
+            if detail is None:
+                status_item.setText("Cutting...")
+            else:
+                progress_bar.setValue(int(detail.fraction * 1000))
+                status_item.setText(self.describe_progress(detail))
+        elif status == JOB_DONE:
+            progress_bar.setValue(1000)
+            status_item.setText("Done")
+            self.show_file_sizes(job_id, job.input_file, job.outputs[0])
+        elif status == JOB_CANCELLED:
+            status_item.setText("Cancelled")
+        elif status == JOB_FAILED:
+            logging.error("Error cutting %s: %s", job.input_file, detail)
+            status_item.setText(f"Error: {detail}")
+            status_item.setToolTip(detail)
+        if status in FINISHED_STATES:
+            self.finished_jobs.append(job_id)
+            while len(self.finished_jobs) > MAX_FINISHED_ROWS:
+                self.remove_job_row(self.finished_jobs.popleft())
+
+        active = self.job_queue.active_count()
+        counts = self.job_queue.counts
+        self.cancel_button.setEnabled(active > 0)
+        self.animation_label.setVisible(active > 0)
+        summary = f"{counts[JOB_DONE]} done, {counts[JOB_FAILED]} failed"
+        if active:
+            self.spinner_movie.start()
+            self.update_status_label(f"{active} cut(s) queued or running, {summary}")
+        else:
+            self.spinner_movie.stop()
+            self.update_status_label(f"All cuts finished: {summary}")
+
+    def add_job_row(self, job_id, job):
+        row = self.jobs_table.rowCount()
+        self.jobs_table.insertRow(row)
+        outputs = job.outputs
+        label = os.path.basename(outputs[0]) + (f" (+{len(outputs) - 1} more)" if len(outputs) > 1 else "")
+        output_item = QTableWidgetItem(label)
+        output_item.setToolTip(f"{job.input_file} -> " + ", ".join(outputs))
+        self.jobs_table.setItem(row, 0, output_item)
+        self.jobs_table.setItem(row, 1, QTableWidgetItem(""))
+        progress_bar = QProgressBar(self)
+        progress_bar.setRange(0, 1000)
+        progress_bar.setFormat("%p%")
+        progress_bar.setValue(0)
+        self.jobs_table.setCellWidget(row, 2, progress_bar)
+        self.jobs[job_id] = job
+        self.job_rows[job_id] = row
+
+    def describe_progress(self, update):
+        details = [f"{update.mb_per_second:.1f} MB/s", f"{update.realtime_factor:.1f}x realtime"]
+        if update.eta_seconds is not None:
+            details.append(f"ETA {self.seconds_to_time(update.eta_seconds).toString('HH:mm:ss')}")
+        return "  |  ".join(details)
+
+    def show_file_sizes(self, job_id, input_file, output_file):
+        # Sizes show at once; ffprobe runs off the GUI thread and the descriptions follow
+        original_size = os.path.getsize(input_file)
+        cut_size = os.path.getsize(output_file)
+        self.file_sizes = (job_id, f"Original Size: {self.format_size(original_size)}", f"Cut Size: {self.format_size(cut_size)}")
+        self.original_size_label.setText(self.file_sizes[1])
+        self.cut_size_label.setText(self.file_sizes[2])
+        threading.Thread(target=self.describe_worker, args=(job_id, input_file, output_file), daemon=True).start()
+
+    def describe_worker(self, job_id, input_file, output_file):
+        self.outputs_probed.emit(job_id, self.probe_input(input_file), self.probe_input(output_file))
+
+    def apply_file_descriptions(self, job_id, input_info, output_info):
+        # A later job may have finished while these were probed; its sizes stay
+        if self.file_sizes is None or self.file_sizes[0] != job_id:
+            return
+        self.original_size_label.setText(self.file_sizes[1] + self.describe_media(input_info))
+        self.cut_size_label.setText(self.file_sizes[2] + self.describe_media(output_info))
+
+    def describe_media(self, media_info):
+        return f" ({media_info.describe()})" if media_info else ""
+
+    def update_status_label(self, message):
+        self.status_label.setText(message)
+
+    def time_to_seconds(self, time_str):
+        try:
+            time_obj = datetime.strptime(time_str, "%H:%M:%S.%f")
+            return (time_obj - datetime(1900, 1, 1)).total_seconds()
+        except ValueError:
+            raise ValueError("Invalid time format. Use hh:mm:ss.mmm")
+
+    def seconds_to_time(self, seconds):
+        return QTime(0, 0).addMSecs(int(round(seconds * 1000)))
+
+    def format_size(self, size):
+        for unit in ["B", "KB", "MB", "GB"]:
+            if size < 1024.0:
+                return f"{size:.2f} {unit}"
+            size /= 1024.0
+
+    def clear_fields(self):
+        self.input_entry.clear()
+        self.prefetch_file = None
+        self.keyframe_index = None
+        self.snap_pending = None
+        self.output_entry.clear()
+        self.time_edit_start.setTime(QTime(0, 0))
+        self.time_edit_end.setTime(QTime(0, 0))
+        self.apply_media_info("", None)
+        self.update_status_label("")
+        self.clear_finished_jobs()
+        self.manifest_label.setText("")
+        self.file_sizes = None
+        self.original_size_label.setText("")
+        self.cut_size_label.setText("")
+
+    def remove_job_row(self, job_id):
+        row = self.job_rows.pop(job_id, None)
+        if row is None:
+            return
+        self.jobs_table.removeRow(row)
+        del self.jobs[job_id]
+        for other_id, other_row in self.job_rows.items():
+            if other_row > row:
+                self.job_rows[other_id] = other_row - 1
+
+    def clear_finished_jobs(self):
+        while self.finished_jobs:
+            self.remove_job_row(self.finished_jobs.popleft())
+
+    def closeEvent(self, event):
+        # Closing the window stops every queued and running cut
+        self.job_queue.shutdown()
+        super().closeEvent(event)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    logging.basicConfig(level=logging.INFO)
+    app = QApplication(sys.argv)
+    window = VideoCutterApp()
+    window.show()
+    sys.exit(app.exec_())
@@ -0,0 +1,34 @@
+import os
+
+from ffmpeg_command import STREAMS_AUDIO, cut_args
+from ffmpeg_utils import run_ffmpeg
+from progress import ProgressReporter, track
+
+# Audio cutting modes
+AUDIO_MODE_REENCODE = "reencode"
+AUDIO_MODE_COPY = "copy"
+AUDIO_MODES = [AUDIO_MODE_REENCODE, AUDIO_MODE_COPY]
+
+
+def cut_audio(input_file, output_file, start_seconds, end_seconds, mode=AUDIO_MODE_REENCODE, progress=None, cancel=None, options=None):
+    duration = end_seconds - start_seconds
+    if duration <= 0:
+        raise ValueError("End time must be after start time")
+    if mode not in AUDIO_MODES:
+        raise ValueError(f"Unknown audio mode: {mode}")
+
+    # Seeking on the input side lets ffmpeg skip straight to the start time and stream
+    # only the requested range through the encoder, so memory use stays flat
+    # no matter how long the source is.
+    output_format = os.path.splitext(input_file)[1].lower()[1:]
+    output_args = ["-map_metadata", "0"]
+    if mode == AUDIO_MODE_COPY:
+        # Copy the compressed frames as-is: no decode, no generation loss, and the cut
+        # lands on the nearest frame boundary instead of the exact sample.
+        output_args += ["-c:a", "copy"]
+    args = cut_args(
+        input_file, output_file, start_seconds, end_seconds, output_args,
+        options=options, streams=STREAMS_AUDIO, output_format=output_format,
+    )
+    reporter = ProgressReporter(duration, progress) if progress else None
+    run_ffmpeg(args, progress=track(reporter, duration), cancel=cancel)
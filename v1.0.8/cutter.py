@@ -0,0 +1,89 @@
+import logging
+import os
+import re
+
+from audio_cutter import AUDIO_MODE_REENCODE, AUDIO_MODES
+from engines import CutRequest, choose_engine
+from ffmpeg_utils import CutCancelled, remove_partial_output
+from media_probe import probe_media
+from video_cutter import VIDEO_MODE_COPY, VIDEO_MODES
+
+# Constants for supported file types
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mkv']
+AUDIO_EXTENSIONS = ['.mp3', '.wav', '.flac']
+ALL_EXTENSIONS = VIDEO_EXTENSIONS + AUDIO_EXTENSIONS
+
+TIME_PATTERN = re.compile(r"^(?:(?:(\d+):)?(\d+):)?(\d+(?:\.\d*)?)$")
+
+
+def parse_time(value):
+    # Accepts plain seconds ("90.5"), mm:ss(.mmm) or hh:mm:ss(.mmm)
+    match = TIME_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid time: {value!r}. Use seconds or hh:mm:ss.mmm")
+    hours, minutes, seconds = match.groups()
+    return int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds)
+
+
+def probe_or_error(input_file):
+    # (media info, None), or (None, why the probe failed)
+    try:
+        return probe_media(input_file), None
+    except Exception as e:
+        logging.exception("Error probing %s", input_file)
+        return None, str(e)
+
+
+def probe_or_none(input_file):
+    return probe_or_error(input_file)[0]
+
+
+def cut_media(
+    input_file,
+    output_file,
+    start_seconds,
+    end_seconds,
+    video_mode=VIDEO_MODE_COPY,
+    audio_mode=AUDIO_MODE_REENCODE,
+    progress=None,
+    cancel=None,
+    options=None,
+    engine=None,
+):
+    # options is an ffmpeg_command.FFmpegOptions with seek mode, stream mapping, threads and muxer flags.
+    # engine forces a cut engine by name, otherwise the cheapest one able to do the cut is used.
+    if video_mode not in VIDEO_MODES:
+        raise ValueError(f"Unknown video mode: {video_mode}")
+    if audio_mode not in AUDIO_MODES:
+        raise ValueError(f"Unknown audio mode: {audio_mode}")
+    if not os.path.isfile(input_file):
+        raise FileNotFoundError(f"Input file not found: {input_file}")
+
+    media_info, probe_error = probe_or_error(input_file)
+    if media_info and media_info.duration:
+        if start_seconds >= media_info.duration:
+            raise ValueError("Start time is beyond the end of the file")
+        end_seconds = min(end_seconds, media_info.duration)
+
+    file_extension = os.path.splitext(input_file)[1].lower()
+    if file_extension not in ALL_EXTENSIONS:
+        raise ValueError("Unsupported file type")
+    request = CutRequest(
+        input_file,
+        output_file,
+        start_seconds,
+        end_seconds,
+        is_video=file_extension in VIDEO_EXTENSIONS,
+        video_mode=video_mode,
+        audio_mode=audio_mode,
+        options=options,
+        media_info=media_info,
+        probe_error=probe_error,
+    )
+    cut_engine = choose_engine(request, engine)
+    try:
+        cut_engine.cut(request, progress=progress, cancel=cancel)
+    except (CutCancelled, KeyboardInterrupt):
+        # Never leave a half-written file behind that looks like a finished cut
+        remove_partial_output(output_file)
+        raise
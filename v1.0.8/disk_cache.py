@@ -0,0 +1,142 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def get_cache_dir():
+    override = os.environ.get("VC4U_CACHE_DIR")
+    if override:
+        return override
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+        return os.path.join(base, "VC4U", "cache")
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "vc4u")
+
+
+def file_cache_key(path):
+    # Entries are tied to the exact file contents we saw: a changed size or mtime means a new key
+    stat = os.stat(path)
+    identity = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(identity.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCache:
+    def __init__(self, name, max_bytes):
+        self.directory = os.path.join(get_cache_dir(), name)
+        self.max_bytes = max_bytes
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+    def get(self, key):
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        # Touch the entry so eviction sees it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            # The cache is an optimisation only, a read-only or full disk must not break a cut
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError:
+            # A full disk leaves a partial temp file behind; eviction only sees .bin entries
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    def evict(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        entries = []
+        total = 0
+        for name in names:
+            if not name.endswith(".bin"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        # Drop least recently used entries until the cache fits its budget
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def cached_index(key, memory, disk, build, dump, load):
+    # Looks key up in memory, then on disk, and only calls build() when neither has it.
+    # dump and load turn the value into the bytes kept on disk and back; an entry load
+    # cannot read (an older format, a truncated file) is rebuilt and overwritten.
+    value = memory.get(key)
+    if value is not None:
+        return value
+    data = disk.get(key)
+    if data is not None:
+        try:
+            value = load(data)
+        except (ValueError, TypeError, struct.error):
+            value = None
+    if value is None:
+        value = build()
+        disk.put(key, dump(value))
+    memory.put(key, value)
+    return value
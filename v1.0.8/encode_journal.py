@@ -0,0 +1,75 @@
+import hashlib
+import os
+import shutil
+import threading
+
+JOURNAL_NAME = "journal.txt"
+CHECKPOINT_SUFFIX = ".vc4u-resume-"
+
+
+def checkpoint_dir(output_file, *identity):
+    # A hidden folder beside the output, named after everything that decides what the
+    # segments contain, so running the same cut again finds the segments it already has.
+    # Leftovers from earlier attempts at the same output with other settings are removed.
+    output_file = os.path.abspath(output_file)
+    parent, name = os.path.split(output_file)
+    digest = hashlib.sha1(repr(identity).encode("utf-8", "surrogateescape")).hexdigest()[:16]
+    prefix = f".{name}{CHECKPOINT_SUFFIX}"
+    directory = os.path.join(parent, prefix + digest)
+    try:
+        entries = os.listdir(parent)
+    except OSError:
+        entries = []
+    for entry in entries:
+        if entry.startswith(prefix) and entry != prefix + digest:
+            shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def sync_file(path):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+class SegmentJournal:
+    # Append-only list of finished segments. A segment is only recorded once its file is on
+    # disk under its final name, so after a crash or power loss the journal never names a
+    # segment that is missing or half written.
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, JOURNAL_NAME)
+        self._lock = threading.Lock()
+        self.finished = self._load()
+
+    def _load(self):
+        finished = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return finished
+        for line in lines:
+            # A crash while appending can leave a partial last line
+            parts = line.split(" ", 2)
+            if len(parts) != 3 or not parts[0].isdigit() or not parts[1].isdigit():
+                continue
+            number, size, name = int(parts[0]), int(parts[1]), parts[2]
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getsize(path) == size:
+                    finished[number] = path
+            except OSError:
+                pass
+        return finished
+
+    def record(self, number, partial_path, path):
+        sync_file(partial_path)
+        os.replace(partial_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(f"{number} {size} {os.path.basename(path)}\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.finished[number] = path
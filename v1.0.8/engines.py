@@ -0,0 +1,388 @@
+import logging
+import os
+import shutil
+from collections import namedtuple
+
+from audio_cutter import AUDIO_MODE_COPY, AUDIO_MODE_REENCODE, cut_audio
+from ffmpeg_command import SEEK_INPUT, STREAMS_ALL, STREAMS_AUDIO, STREAMS_VIDEO, check_options
+from ffmpeg_utils import CutCancelled, get_ffmpeg_binary
+from flac_cutter import cut_flac, read_flac_info
+from mkv_cutter import cut_mkv, read_mkv_info
+from mp3_cutter import cut_mp3, read_mp3_info, trim_fits
+from mp4_cutter import cut_mp4, read_moov_size
+from pyav_cutter import STREAM_TYPES, pyav_available, remux_cut
+from video_cutter import VIDEO_MODE_COPY, VIDEO_MODE_REENCODE, VIDEO_MODE_SMART, CHECKPOINT_SECONDS, chunk_count, copy_cut, reencode_cut, smart_cut
+from wav_cutter import cut_wav, read_wav_info
+
+# Set to an engine name to bypass automatic selection, e.g. VC4U_ENGINE=pydub
+ENGINE_ENV = "VC4U_ENGINE"
+
+# How exact a cut has to be
+ACCURACY_KEYFRAME = "keyframe"  # video may start on the keyframe before the requested time
+ACCURACY_FRAME = "frame"  # video or compressed audio frames, no re-encode of the whole range
+ACCURACY_SAMPLE = "sample"  # audio cut on the exact sample
+
+# Rough throughputs behind the cost estimates, in seconds of work per unit
+PROCESS_SPAWN_SECONDS = 0.05
+PYAV_OPEN_SECONDS = 0.005
+COPY_BYTES_PER_SECOND = 200 * 1024 * 1024
+DISK_COPY_BYTES_PER_SECOND = 1024 * 1024 * 1024
+FLAC_REWRITE_BYTES_PER_SECOND = 100 * 1024 * 1024
+MP4_INDEX_BYTES_PER_SECOND = 10 * 1024 * 1024
+MKV_BLOCK_BYTES_PER_SECOND = 64 * 1024 * 1024
+PYDUB_BYTES_PER_SECOND = 20 * 1024 * 1024
+AUDIO_ENCODE_REALTIME = 150.0
+VIDEO_ENCODE_REALTIME = 3.0
+# Two GOPs of a typical stream get re-encoded by a smart cut
+SMART_CUT_ENCODED_SECONDS = 4.0
+SMART_CUT_PROCESSES = 5
+
+# What a cut asks of an engine. media_info may be None when the input could not be probed;
+# probe_error then says why.
+CutRequest = namedtuple(
+    "CutRequest",
+    ["input_file", "output_file", "start_seconds", "end_seconds", "is_video", "video_mode", "audio_mode", "options", "media_info", "probe_error"],
+    defaults=(None,),
+)
+
+
+def required_accuracy(request):
+    if request.is_video:
+        return ACCURACY_KEYFRAME if request.video_mode == VIDEO_MODE_COPY else ACCURACY_FRAME
+    return ACCURACY_SAMPLE if request.audio_mode == AUDIO_MODE_REENCODE else ACCURACY_FRAME
+
+
+def estimated_bytes(request):
+    # Bytes of the source that fall inside the requested range
+    duration = request.end_seconds - request.start_seconds
+    media_info = request.media_info
+    if media_info and media_info.bit_rate:
+        return media_info.bit_rate / 8 * duration
+    size = os.path.getsize(request.input_file)
+    if media_info and media_info.duration:
+        return size * min(duration / media_info.duration, 1.0)
+    return size
+
+
+def ffmpeg_available():
+    binary = get_ffmpeg_binary()
+    return os.path.isfile(binary) or shutil.which(binary) is not None
+
+
+class CutEngine:
+    # Subclasses set name, say which requests they can serve, estimate how long they take and do the cut
+    name = None
+
+    def available(self):
+        return True
+
+    def supports(self, request):
+        raise NotImplementedError
+
+    def cost(self, request):
+        raise NotImplementedError
+
+    def cut(self, request, progress=None, cancel=None):
+        raise NotImplementedError
+
+
+class FFmpegEngine(CutEngine):
+    # One ffmpeg process per step; handles every input and mode
+    name = "ffmpeg"
+
+    def available(self):
+        return ffmpeg_available()
+
+    def supports(self, request):
+        return True
+
+    def cost(self, request):
+        duration = request.end_seconds - request.start_seconds
+        copy_seconds = estimated_bytes(request) / COPY_BYTES_PER_SECOND
+        if request.is_video and request.video_mode == VIDEO_MODE_SMART:
+            encode_seconds = min(duration, SMART_CUT_ENCODED_SECONDS) / VIDEO_ENCODE_REALTIME
+            return SMART_CUT_PROCESSES * PROCESS_SPAWN_SECONDS + copy_seconds + encode_seconds
+        if request.is_video and request.video_mode == VIDEO_MODE_REENCODE:
+            # The chunks encode side by side, then audio and the join run as for a smart cut
+            workers = chunk_count(duration)
+            chunks = max(workers, int(duration // CHECKPOINT_SECONDS))
+            return (chunks + 2) * PROCESS_SPAWN_SECONDS + copy_seconds + duration / VIDEO_ENCODE_REALTIME / workers
+        if not request.is_video and request.audio_mode == AUDIO_MODE_REENCODE:
+            return PROCESS_SPAWN_SECONDS + duration / AUDIO_ENCODE_REALTIME
+        return PROCESS_SPAWN_SECONDS + copy_seconds
+
+    def cut(self, request, progress=None, cancel=None):
+        job_options = {"progress": progress, "cancel": cancel, "options": request.options}
+        args = (request.input_file, request.output_file, request.start_seconds, request.end_seconds)
+        if not request.is_video:
+            cut_audio(*args, mode=request.audio_mode, **job_options)
+        elif request.video_mode == VIDEO_MODE_SMART:
+            smart_cut(*args, **job_options)
+        elif request.video_mode == VIDEO_MODE_REENCODE:
+            reencode_cut(*args, **job_options)
+        else:
+            copy_cut(*args, **job_options)
+
+
+class PydubEngine(CutEngine):
+    # Decodes the whole file into memory; slow, but WAV needs nothing beyond Python itself
+    name = "pydub"
+
+    def available(self):
+        try:
+            import pydub  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    def supports(self, request):
+        return not request.is_video and request.audio_mode != AUDIO_MODE_COPY
+
+    def cost(self, request):
+        # The whole file is loaded as raw samples, and anything but WAV is first converted by ffmpeg
+        total_seconds = request.media_info.duration if request.media_info and request.media_info.duration else 0.0
+        cost = os.path.getsize(request.input_file) / PYDUB_BYTES_PER_SECOND
+        if not request.input_file.lower().endswith(".wav"):
+            cost += PROCESS_SPAWN_SECONDS + total_seconds / AUDIO_ENCODE_REALTIME
+        return cost + (request.end_seconds - request.start_seconds) / AUDIO_ENCODE_REALTIME
+
+    def cut(self, request, progress=None, cancel=None):
+        from pydub import AudioSegment
+
+        output_format = os.path.splitext(request.input_file)[1].lower()[1:]
+        audio = AudioSegment.from_file(request.input_file, format=output_format)
+        if cancel is not None and cancel.is_set():
+            raise CutCancelled()
+        clip = audio[int(round(request.start_seconds * 1000)):int(round(request.end_seconds * 1000))]
+        clip.export(request.output_file, format=output_format)
+
+
+class PyAVEngine(CutEngine):
+    # Stream copies through libav inside the worker: no process to start, and the input
+    # stays open for the next clip from the same source
+    name = "pyav"
+
+    def available(self):
+        return pyav_available()
+
+    def supports(self, request):
+        if request.is_video and request.video_mode != VIDEO_MODE_COPY:
+            return False
+        if not request.is_video and request.audio_mode != AUDIO_MODE_COPY:
+            return False
+        # Remuxed FLAC keeps the whole file's STREAMINFO and frame numbers; the flac engine rewrites them
+        if request.input_file.lower().endswith(".flac"):
+            return False
+        options = check_options(request.options)
+        if options.seek_mode != SEEK_INPUT or request.media_info is None:
+            return False
+        # Subtitles and data streams are converted by ffmpeg where the output container needs it; a remux can't
+        wanted = STREAM_TYPES[self.streams(request)]
+        return all(stream.get("codec_type") in ("video", "audio") for stream in request.media_info.streams if stream.get("codec_type") in wanted)
+
+    def cost(self, request):
+        return PYAV_OPEN_SECONDS + estimated_bytes(request) / COPY_BYTES_PER_SECOND
+
+    def streams(self, request):
+        return check_options(request.options).streams or (STREAMS_ALL if request.is_video else STREAMS_AUDIO)
+
+    def cut(self, request, progress=None, cancel=None):
+        options = check_options(request.options)
+        output_format = None if request.is_video else os.path.splitext(request.input_file)[1].lower()[1:]
+        remux_cut(
+            request.input_file, request.output_file, request.start_seconds, request.end_seconds,
+            streams=self.streams(request), muxer_options=options.muxer_options, output_format=output_format,
+            progress=progress, cancel=cancel,
+        )
+
+
+class WavEngine(CutEngine):
+    # Uncompressed WAV: rewrite the header and copy the sample bytes, exact to the sample
+    name = "wav"
+
+    def supports(self, request):
+        if request.is_video or not request.input_file.lower().endswith(".wav"):
+            return False
+        options = check_options(request.options)
+        if options.streams == STREAMS_VIDEO or options.muxer_options:
+            return False
+        try:
+            read_wav_info(request.input_file)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def cost(self, request):
+        return estimated_bytes(request) / DISK_COPY_BYTES_PER_SECOND
+
+    def cut(self, request, progress=None, cancel=None):
+        cut_wav(request.input_file, request.output_file, request.start_seconds, request.end_seconds, progress=progress, cancel=cancel)
+
+
+class FlacEngine(CutEngine):
+    # FLAC frames are copied as they are; with audio re-encoding, ffmpeg re-encodes only the
+    # partial frames at either end so the cut is still exact to the sample
+    name = "flac"
+
+    def supports(self, request):
+        if request.is_video or not request.input_file.lower().endswith(".flac"):
+            return False
+        if request.audio_mode == AUDIO_MODE_REENCODE and not ffmpeg_available():
+            return False
+        options = check_options(request.options)
+        if options.streams == STREAMS_VIDEO or options.muxer_options:
+            return False
+        try:
+            read_flac_info(request.input_file)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def cost(self, request):
+        cost = estimated_bytes(request) / FLAC_REWRITE_BYTES_PER_SECOND
+        if request.audio_mode == AUDIO_MODE_REENCODE:
+            cost += 2 * PROCESS_SPAWN_SECONDS
+        return cost
+
+    def cut(self, request, progress=None, cancel=None):
+        cut_flac(
+            request.input_file, request.output_file, request.start_seconds, request.end_seconds,
+            exact=request.audio_mode == AUDIO_MODE_REENCODE, progress=progress, cancel=cancel,
+        )
+
+
+class Mp3Engine(CutEngine):
+    # Whole MP3 frames are copied and the LAME tag tells gapless decoders which samples to
+    # drop at either end, so the cut is exact to the sample without re-encoding anything
+    name = "mp3"
+
+    def supports(self, request):
+        if request.is_video or not request.input_file.lower().endswith(".mp3"):
+            return False
+        options = check_options(request.options)
+        if options.streams == STREAMS_VIDEO or options.muxer_options:
+            return False
+        try:
+            info = read_mp3_info(request.input_file)
+        except (OSError, ValueError):
+            return False
+        sample_rate = info.header.sample_rate
+        return trim_fits(info, int(round(request.start_seconds * sample_rate)), int(round(request.end_seconds * sample_rate)))
+
+    def cost(self, request):
+        return estimated_bytes(request) / DISK_COPY_BYTES_PER_SECOND
+
+    def cut(self, request, progress=None, cancel=None):
+        cut_mp3(request.input_file, request.output_file, request.start_seconds, request.end_seconds, progress=progress, cancel=cancel)
+
+
+class Mp4Engine(CutEngine):
+    # Stream copies of MP4 by rewriting the sample tables; the new moov goes in front of the
+    # samples, so the cut is faststart without the second pass ffmpeg makes for it
+    name = "mp4"
+    extensions = (".mp4", ".m4v")
+
+    def supports(self, request):
+        if not request.is_video or request.video_mode != VIDEO_MODE_COPY:
+            return False
+        if not request.input_file.lower().endswith(self.extensions) or not request.output_file.lower().endswith(self.extensions):
+            return False
+        options = check_options(request.options)
+        if options.seek_mode != SEEK_INPUT:
+            return False
+        # The output is faststart anyway; any other muxer option needs ffmpeg
+        if any(option != "movflags" or value.strip("+") != "faststart" for option, value in options.muxer_options):
+            return False
+        try:
+            read_moov_size(request.input_file)
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def cost(self, request):
+        return read_moov_size(request.input_file) / MP4_INDEX_BYTES_PER_SECOND + estimated_bytes(request) / DISK_COPY_BYTES_PER_SECOND
+
+    def cut(self, request, progress=None, cancel=None):
+        cut_mp4(
+            request.input_file, request.output_file, request.start_seconds, request.end_seconds,
+            streams=check_options(request.options).streams, progress=progress, cancel=cancel,
+        )
+
+
+class MkvEngine(CutEngine):
+    # Stream copies of Matroska and WebM: the Cues lead to the start cluster and the blocks
+    # of the range are copied into new clusters, every track kept
+    name = "mkv"
+    extensions = (".mkv", ".webm")
+
+    def supports(self, request):
+        if not request.is_video or request.video_mode != VIDEO_MODE_COPY:
+            return False
+        extension = os.path.splitext(request.input_file)[1].lower()
+        if extension not in self.extensions or os.path.splitext(request.output_file)[1].lower() != extension:
+            return False
+        options = check_options(request.options)
+        if options.seek_mode != SEEK_INPUT or options.streams not in (None, STREAMS_ALL) or options.muxer_options:
+            return False
+        try:
+            read_mkv_info(request.input_file)
+        except (OSError, ValueError, IndexError):
+            return False
+        return True
+
+    def cost(self, request):
+        return estimated_bytes(request) / MKV_BLOCK_BYTES_PER_SECOND
+
+    def cut(self, request, progress=None, cancel=None):
+        cut_mkv(request.input_file, request.output_file, request.start_seconds, request.end_seconds, progress=progress, cancel=cancel)
+
+
+ENGINES = [FFmpegEngine(), PydubEngine(), PyAVEngine(), WavEngine(), FlacEngine(), Mp3Engine(), Mp4Engine(), MkvEngine()]
+
+
+def register_engine(engine):
+    # Later registrations win ties in cost, so specialised engines go after the general ones
+    ENGINES.append(engine)
+
+
+def engine_names():
+    return [engine.name for engine in ENGINES]
+
+
+def get_engine(name):
+    for engine in ENGINES:
+        if engine.name == name:
+            return engine
+    raise ValueError(f"Unknown cut engine: {name}. Choose from {', '.join(engine_names())}")
+
+
+def forced_engine_name(engine=None):
+    return engine or os.environ.get(ENGINE_ENV) or None
+
+
+def choose_engine(request, engine=None):
+    # A forced engine (argument or VC4U_ENGINE) must be able to do the job; otherwise the
+    # cheapest available engine that meets the requested accuracy wins
+    forced = forced_engine_name(engine)
+    if forced:
+        chosen = get_engine(forced)
+        if not chosen.available():
+            raise ValueError(f"The {forced} cut engine is not available here")
+        if not chosen.supports(request):
+            if request.probe_error:
+                # Most engines need the probe; its failure is the real reason, not the file
+                raise ValueError(f"The {forced} cut engine needs the input probed first: {request.probe_error}")
+            raise ValueError(f"The {forced} cut engine cannot do a {required_accuracy(request)}-accurate cut of this file")
+        return chosen
+
+    candidates = []
+    for position, candidate in enumerate(ENGINES):
+        if candidate.available() and candidate.supports(request):
+            candidates.append((candidate.cost(request), -position, candidate))
+    if not candidates:
+        if request.probe_error:
+            raise ValueError(f"No cut engine can handle this file: {request.probe_error}")
+        raise ValueError("No cut engine can handle this file")
+    cost, _, chosen = min(candidates, key=lambda item: item[:2])
+    logging.debug("Cutting %s with the %s engine (estimated %.2fs)", request.input_file, chosen.name, cost)
+    return chosen
@@ -0,0 +1,76 @@
+from collections import namedtuple
+
+# Where ffmpeg seeks to the start time
+SEEK_INPUT = "input"  # the demuxer jumps straight to the keyframe before the start: fast
+SEEK_OUTPUT = "output"  # everything before the start is read and thrown away: slow, but never skips ahead
+SEEK_HYBRID = "hybrid"  # jump close to the start, then read the last few seconds like an output seek
+SEEK_MODES = [SEEK_INPUT, SEEK_OUTPUT, SEEK_HYBRID]
+
+# How far before the start a hybrid seek lands before it switches to reading
+HYBRID_SEEK_PREROLL = 5.0
+
+# Which streams of the input end up in the cut
+STREAMS_ALL = "all"
+STREAMS_AUDIO_VIDEO = "av"
+STREAMS_VIDEO = "video"
+STREAMS_AUDIO = "audio"
+STREAM_MAPS = {
+    STREAMS_ALL: ["-map", "0"],
+    STREAMS_AUDIO_VIDEO: ["-map", "0:v:0?", "-map", "0:a?"],
+    STREAMS_VIDEO: ["-map", "0:v:0"],
+    STREAMS_AUDIO: ["-map", "0:a"],
+}
+
+# Tuning knobs shared by every ffmpeg based cut. streams=None keeps each cutter's own default,
+# threads=None lets ffmpeg decide, muxer_options is a sequence of (option, value) pairs such as
+# ("movflags", "+faststart").
+FFmpegOptions = namedtuple("FFmpegOptions", ["seek_mode", "streams", "threads", "muxer_options"])
+FFmpegOptions.__new__.__defaults__ = (SEEK_INPUT, None, None, ())
+
+DEFAULT_OPTIONS = FFmpegOptions()
+
+
+def check_options(options):
+    options = options or DEFAULT_OPTIONS
+    if options.seek_mode not in SEEK_MODES:
+        raise ValueError(f"Unknown seek mode: {options.seek_mode}")
+    if options.streams is not None and options.streams not in STREAM_MAPS:
+        raise ValueError(f"Unknown stream selection: {options.streams}")
+    return options
+
+
+def seek_args(start_seconds, duration, seek_mode):
+    # Returns the arguments that go before and after "-i"
+    if seek_mode == SEEK_OUTPUT:
+        return [], ["-ss", repr(start_seconds), "-t", repr(duration)]
+    if seek_mode == SEEK_HYBRID:
+        preroll = min(start_seconds, HYBRID_SEEK_PREROLL)
+        return ["-ss", repr(start_seconds - preroll)], ["-ss", repr(preroll), "-t", repr(duration)]
+    return ["-ss", repr(start_seconds)], ["-t", repr(duration)]
+
+
+def stream_args(options, default=STREAMS_ALL):
+    return list(STREAM_MAPS[options.streams or default])
+
+
+def thread_args(options):
+    return ["-threads", str(options.threads)] if options.threads else []
+
+
+def muxer_args(options):
+    args = []
+    for option, value in options.muxer_options:
+        args += ["-" + option.lstrip("-"), str(value)]
+    return args
+
+
+def cut_args(input_file, output_file, start_seconds, end_seconds, output_args, options=None, streams=STREAMS_ALL, output_format=None):
+    # Builds a complete single-range cut: seek, stream mapping, codecs (output_args), threads and muxer flags
+    options = check_options(options)
+    input_seek, output_seek = seek_args(start_seconds, end_seconds - start_seconds, options.seek_mode)
+    args = input_seek + ["-i", input_file] + output_seek
+    args += stream_args(options, streams)
+    args += list(output_args) + thread_args(options) + muxer_args(options)
+    if output_format:
+        args += ["-f", output_format]
+    return args + [output_file]
@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+
+# How long ffmpeg gets to exit after being asked to stop before it is killed outright
+TERMINATE_TIMEOUT = 3.0
+
+# Lines of ffmpeg's own output quoted in a failure message
+ERROR_CONTEXT_LINES = 10
+
+FFPROBE_MISSING = "ffprobe is required but was not found ({}); install FFmpeg or set VC4U_FFPROBE"
+
+
+class CutCancelled(Exception):
+    pass
+
+
+class FFmpegError(RuntimeError):
+    def __init__(self, message, command=None, diagnostics=None):
+        super().__init__(message)
+        self.command = command
+        self.diagnostics = diagnostics or []
+
+
+def get_ffmpeg_binary():
+    # Prefer an explicit override, then ffmpeg on PATH, then the binary bundled with imageio-ffmpeg
+    binary = os.environ.get("VC4U_FFMPEG") or shutil.which("ffmpeg")
+    if binary:
+        return binary
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+
+def get_ffprobe_binary():
+    binary = os.environ.get("VC4U_FFPROBE") or shutil.which("ffprobe")
+    if binary:
+        return binary
+    # ffprobe usually ships in the same folder as ffmpeg
+    sibling = os.path.join(os.path.dirname(get_ffmpeg_binary()), "ffprobe")
+    for candidate in (sibling, sibling + ".exe"):
+        if os.path.isfile(candidate):
+            return candidate
+    return "ffprobe"
+
+
+def stop_process(process):
+    if process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=TERMINATE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def watch_for_cancel(process, cancel, finished):
+    # Runs beside the reader loop, so a cancel lands even while ffmpeg is silent
+    while not finished.is_set():
+        if cancel.wait(0.1):
+            stop_process(process)
+            return
+
+
+def run_ffmpeg(args, progress=None, cancel=None):
+    # Returns ffmpeg's warnings as a list of lines; they are logged at INFO level as well
+    if cancel is not None and cancel.is_set():
+        raise CutCancelled()
+
+    cmd = [get_ffmpeg_binary(), "-hide_banner", "-nostdin", "-loglevel", "warning", "-y"]
+    if progress is not None:
+        # Machine-readable key=value progress blocks on stdout instead of the human status line
+        cmd += ["-progress", "pipe:1", "-nostats"]
+    cmd += list(args)
+    logging.debug("Running %s", " ".join(shlex.quote(arg) for arg in cmd))
+
+    # stderr goes to a temporary file so a chatty ffmpeg can never block on a full pipe
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE if progress is not None else subprocess.DEVNULL,
+            stderr=stderr_file,
+        )
+        finished = threading.Event()
+        if cancel is not None:
+            threading.Thread(target=watch_for_cancel, args=(process, cancel, finished), daemon=True).start()
+        try:
+            if progress is not None:
+                block = {}
+                for line in process.stdout:
+                    key, _, value = line.decode(errors="replace").strip().partition("=")
+                    if not key:
+                        continue
+                    block[key] = value
+                    if key == "progress":
+                        progress(block)
+                        block = {}
+                process.stdout.close()
+            returncode = process.wait()
+        except BaseException:
+            stop_process(process)
+            raise
+        finally:
+            finished.set()
+
+        if cancel is not None and cancel.is_set():
+            raise CutCancelled()
+        stderr_file.seek(0)
+        diagnostics = stderr_file.read().decode(errors="replace").splitlines()
+
+    diagnostics = [line for line in diagnostics if line.strip()]
+    if returncode != 0:
+        message = "\n".join(diagnostics[-ERROR_CONTEXT_LINES:]) or f"exit code {returncode}"
+        raise FFmpegError(f"ffmpeg failed: {message}", command=cmd, diagnostics=diagnostics)
+    for line in diagnostics:
+        logging.info("ffmpeg: %s", line)
+    return diagnostics
+
+
+def remove_partial_output(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def run_ffprobe(args):
+    cmd = [get_ffprobe_binary(), "-hide_banner", "-loglevel", "error", "-of", "json"] + list(args)
+    try:
+        result = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError(FFPROBE_MISSING.format(cmd[0]))
+    if result.returncode != 0:
+        message = result.stderr.decode(errors="replace").strip() or f"exit code {result.returncode}"
+        raise RuntimeError(f"ffprobe failed: {message}")
+    return json.loads(result.stdout or b"{}")
+
+
+def iter_ffprobe_entries(args):
+    # Streams ffprobe's compact output one entry at a time, so huge packet listings never sit in memory
+    cmd = [get_ffprobe_binary(), "-hide_banner", "-loglevel", "error", "-of", "compact=p=0"] + list(args)
+    try:
+        process = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError(FFPROBE_MISSING.format(cmd[0]))
+    try:
+        for line in process.stdout:
+            fields = line.decode(errors="replace").strip()
+            if fields:
+                yield dict(field.split("=", 1) for field in fields.split("|") if "=" in field)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode != 0:
+        message = stderr.decode(errors="replace").strip() or f"exit code {returncode}"
+        raise RuntimeError(f"ffprobe failed: {message}")
@@ -0,0 +1,54 @@
+import errno
+import os
+
+from ffmpeg_utils import CutCancelled
+
+# Bytes copied between cancel checks and progress reports
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Errors that mean the kernel can't copy between these two files, rather than a failed copy
+UNSUPPORTED_COPY_ERRORS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, getattr(errno, "ENOTSUP", errno.EOPNOTSUPP)}
+
+
+def _kernel_copy(method, source, target, offset, count):
+    if method == "copy_file_range":
+        return os.copy_file_range(source, target, count, offset)
+    return os.sendfile(target, source, offset, count)
+
+
+def write_all(target, data):
+    # An unbuffered file may take only part of a write, so keep going until it has all of it
+    with memoryview(data) as view:
+        written = 0
+        while written < len(view):
+            written += target.write(view[written:])
+
+
+def copy_range(source, data, target, offset, size, cancel=None, on_copied=None):
+    # Appends size bytes of source, starting at offset, to target (an unbuffered file).
+    # The kernel copies file to file where it can (reflinks on filesystems that share
+    # extents); otherwise the bytes are written straight out of data, the mapped source.
+    methods = [name for name in ("copy_file_range", "sendfile") if hasattr(os, name)]
+    with memoryview(data) as view:
+        copied = 0
+        while copied < size:
+            if cancel is not None and cancel.is_set():
+                raise CutCancelled()
+            count = min(COPY_CHUNK_SIZE, size - copied)
+            done = 0
+            while methods and done < count:
+                try:
+                    written = _kernel_copy(methods[0], source.fileno(), target.fileno(), offset + copied + done, count - done)
+                except OSError as error:
+                    if error.errno not in UNSUPPORTED_COPY_ERRORS:
+                        raise
+                    methods.pop(0)
+                    continue
+                if not written:
+                    raise ValueError("Input file ended before the range to copy did")
+                done += written
+            if done < count:
+                write_all(target, view[offset + copied + done:offset + copied + count])
+            copied += count
+            if on_copied:
+                on_copied(copied)
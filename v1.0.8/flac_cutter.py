@@ -0,0 +1,487 @@
+import mmap
+import os
+import re
+import shutil
+import struct
+import tempfile
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+
+from disk_cache import DiskCache, LRUCache, cached_index, file_cache_key
+from ffmpeg_utils import CutCancelled, run_ffmpeg
+from progress import ProgressReporter
+from pyav_cutter import CHECK_INTERVAL
+
+# Metadata block types
+BLOCK_STREAMINFO = 0
+BLOCK_PADDING = 1
+BLOCK_SEEKTABLE = 3
+BLOCK_VORBIS_COMMENT = 4
+BLOCK_PICTURE = 6
+
+# Tags and cover art are carried over; the rest describes the whole input
+KEPT_BLOCKS = (BLOCK_VORBIS_COMMENT, BLOCK_PICTURE)
+
+PLACEHOLDER_POINT = 0xFFFFFFFFFFFFFFFF
+SEEK_POINT_SECONDS = 10
+
+# FLAC allows blocks this small only as the last frame of a stream
+MIN_BLOCKSIZE = 16
+MAX_BLOCKSIZE = 65535
+
+# Frame indexes are only built for files without a seek table, so few of them are cached
+FRAME_CACHE_MAX_BYTES = 64 * 1024 * 1024
+INDEX_MAGIC = b"VC4UFLI1"
+INDEX_HEADER = struct.Struct("<8sQ")
+
+_disk_cache = DiskCache("flac_frames", FRAME_CACHE_MAX_BYTES)
+_memory_cache = LRUCache(4)
+
+FRAME_SYNC = re.compile(rb"\xff[\xf8\xf9]")
+
+# Block size codes 1-15 of the frame header; 6 and 7 read the size from the end of the header
+BLOCK_SIZES = [None, 192, 576, 1152, 2304, 4608, None, None, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768]
+
+StreamInfo = namedtuple(
+    "StreamInfo",
+    ["min_blocksize", "max_blocksize", "sample_rate", "channels", "bits_per_sample", "total_samples", "streaminfo", "blocks", "seek_points", "first_frame"],
+)
+
+# sample is the first sample of the frame, header_size covers everything up to the header CRC-8 inclusive
+Frame = namedtuple("Frame", ["sample", "offset", "size", "blocksize", "header_size"])
+
+
+def _crc_table(poly, width):
+    top = 1 << (width - 1)
+    mask = (1 << width) - 1
+    table = []
+    for byte in range(256):
+        crc = byte << (width - 8)
+        for _ in range(8):
+            crc = ((crc << 1) ^ poly if crc & top else crc << 1) & mask
+        table.append(crc)
+    return table
+
+
+CRC8_TABLE = _crc_table(0x07, 8)
+CRC16_TABLE = _crc_table(0x8005, 16)
+
+
+def crc8(data):
+    crc = 0
+    for byte in data:
+        crc = CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def crc16(data):
+    crc = 0
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[(crc >> 8) ^ byte]
+    return crc
+
+
+def _crc16_multiply(a, b):
+    # a * b modulo the CRC-16 polynomial
+    result = 0
+    for bit in range(15, -1, -1):
+        result <<= 1
+        if result & 0x10000:
+            result ^= 0x18005
+        if b >> bit & 1:
+            result ^= a
+    return result
+
+
+# x^(8 * 2^k) modulo the polynomial: the effect of 2^k trailing bytes on a CRC
+_BYTE_SHIFTS = [0x100]
+for _ in range(40):
+    _BYTE_SHIFTS.append(_crc16_multiply(_BYTE_SHIFTS[-1], _BYTE_SHIFTS[-1]))
+
+
+def crc16_shift(crc, byte_count):
+    # The CRC of a message followed by byte_count more bytes, less the CRC of those bytes
+    for shift in _BYTE_SHIFTS:
+        if not byte_count:
+            break
+        if byte_count & 1:
+            crc = _crc16_multiply(crc, shift)
+        byte_count >>= 1
+    return crc
+
+
+def _read_number(data, offset):
+    # The UTF-8 style coded frame or sample number; returns (value, length) or None
+    first = data[offset]
+    if first < 0x80:
+        return first, 1
+    length = 2
+    while length <= 7 and first & (0x80 >> length):
+        length += 1
+    if first & 0x40 == 0 or length > 7:
+        return None
+    value = first & (0x7F >> length)
+    for byte in data[offset + 1:offset + length]:
+        if byte & 0xC0 != 0x80:
+            return None
+        value = value << 6 | byte & 0x3F
+    return value, length
+
+
+def _write_number(value):
+    if value < 0x80:
+        return bytes([value])
+    length = 2
+    while value >= 1 << (5 * length + 1):
+        length += 1
+    tail = []
+    for _ in range(length - 1):
+        tail.append(0x80 | value & 0x3F)
+        value >>= 6
+    return bytes([(0xFF00 >> length) & 0xFF | value] + tail[::-1])
+
+
+def parse_frame_header(data, offset, info):
+    # Returns (first sample, block size, header size) for a valid header at offset, else None
+    header = data[offset:offset + 16]
+    if len(header) < 6 or header[0] != 0xFF or header[1] & 0xFE != 0xF8:
+        return None
+    variable = header[1] & 1
+    size_code = header[2] >> 4
+    rate_code = header[2] & 0x0F
+    # Reserved block size, sample rate, channel and sample size codes, or the reserved bit set
+    if size_code == 0 or rate_code == 0x0F or header[3] >> 4 >= 11 or header[3] >> 1 & 0x07 == 3 or header[3] & 1:
+        return None
+    number = _read_number(header, 4)
+    if number is None:
+        return None
+    number, length = number
+    position = 4 + length
+    if size_code == 6:
+        blocksize = header[position] + 1
+        position += 1
+    elif size_code == 7:
+        blocksize = (header[position] << 8 | header[position + 1]) + 1
+        position += 2
+    else:
+        blocksize = BLOCK_SIZES[size_code]
+    if rate_code == 12:
+        position += 1
+    elif rate_code in (13, 14):
+        position += 2
+    if position >= len(header) or crc8(header[:position]) != header[position]:
+        return None
+    sample = number if variable else number * info.min_blocksize
+    return sample, blocksize, position + 1
+
+
+def rewrite_frame_header(header, sample):
+    # The same header with the variable block size flag and a sample number instead of a frame number
+    number, length = _read_number(header, 4)
+    new = b"\xff\xf9" + bytes(header[2:4]) + _write_number(sample) + bytes(header[4 + length:-1])
+    return new + bytes([crc8(new)])
+
+
+def _skip_id3(data):
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = 0
+        for byte in data[6:10]:
+            size = size << 7 | byte & 0x7F
+        return 10 + size + (10 if data[5] & 0x10 else 0)
+    return 0
+
+
+def parse_flac(data):
+    # Raises ValueError for anything that isn't a FLAC stream
+    offset = _skip_id3(data)
+    if data[offset:offset + 4] != b"fLaC":
+        raise ValueError("Not a FLAC file")
+    offset += 4
+    streaminfo = None
+    blocks = []
+    seek_points = []
+    last = False
+    while not last:
+        if offset + 4 > len(data):
+            raise ValueError("FLAC metadata is truncated")
+        flags, size = data[offset], int.from_bytes(data[offset + 1:offset + 4], "big")
+        last = bool(flags & 0x80)
+        block_type = flags & 0x7F
+        body = bytes(data[offset + 4:offset + 4 + size])
+        if block_type == BLOCK_STREAMINFO:
+            streaminfo = body
+        elif block_type == BLOCK_SEEKTABLE:
+            for point in range(0, size - size % 18, 18):
+                sample, point_offset, _ = struct.unpack_from(">QQH", body, point)
+                if sample != PLACEHOLDER_POINT:
+                    seek_points.append((sample, point_offset))
+        elif block_type in KEPT_BLOCKS:
+            blocks.append((block_type, body))
+        offset += 4 + size
+    if streaminfo is None or len(streaminfo) < 34:
+        raise ValueError("FLAC file has no STREAMINFO")
+    min_blocksize, max_blocksize = struct.unpack_from(">HH", streaminfo)
+    packed = int.from_bytes(streaminfo[10:18], "big")
+    sample_rate = packed >> 44
+    channels = (packed >> 41 & 0x07) + 1
+    bits_per_sample = (packed >> 36 & 0x1F) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    seek_points = sorted((sample, offset + point_offset) for sample, point_offset in seek_points)
+    return StreamInfo(min_blocksize, max_blocksize, sample_rate, channels, bits_per_sample, total_samples, streaminfo, blocks, seek_points, offset)
+
+
+def read_flac_info(input_file):
+    with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return parse_flac(data)
+
+
+def scan_frames(data, info, offset, sample):
+    # Walks the frames from a known frame start. A sync code only counts as the next frame if
+    # its header checks out and continues the sample count, which rules out sync-like bytes
+    # inside the compressed data.
+    current = parse_frame_header(data, offset, info)
+    if current is None or current[0] != sample:
+        raise ValueError(f"No FLAC frame at byte {offset}")
+    # An ID3v1 tag may follow the last frame
+    stream_end = len(data) - 128 if len(data) >= 128 and data[-128:-125] == b"TAG" else len(data)
+    while True:
+        _, blocksize, header_size = current
+        expected = sample + blocksize
+        search = offset + header_size
+        following = None
+        while True:
+            match = FRAME_SYNC.search(data, search)
+            if match is None:
+                break
+            candidate = parse_frame_header(data, match.start(), info)
+            if candidate is not None and candidate[0] == expected:
+                following = match.start()
+                break
+            search = match.start() + 1
+        end = following if following is not None else stream_end
+        yield Frame(sample, offset, end - offset, blocksize, header_size)
+        if following is None:
+            return
+        offset, sample = following, expected
+        current = candidate
+
+
+class FrameIndex:
+    # First sample and byte offset of every frame, for files without a seek table
+    def __init__(self, samples, offsets):
+        self.samples = samples
+        self.offsets = offsets
+
+    def to_bytes(self):
+        return INDEX_HEADER.pack(INDEX_MAGIC, len(self.samples)) + self.samples.tobytes() + self.offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, count = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a FLAC frame index")
+        arrays = []
+        offset = INDEX_HEADER.size
+        for _ in range(2):
+            values = array("q")
+            end = offset + values.itemsize * count
+            values.frombytes(data[offset:end])
+            if len(values) != count:
+                raise ValueError("Truncated FLAC frame index")
+            arrays.append(values)
+            offset = end
+        return cls(*arrays)
+
+
+def get_frame_index(input_file, data, info):
+    return cached_index(
+        file_cache_key(input_file), _memory_cache, _disk_cache,
+        lambda: build_frame_index(data, info), FrameIndex.to_bytes, FrameIndex.from_bytes,
+    )
+
+
+def build_frame_index(data, info):
+    samples = array("q")
+    offsets = array("q")
+    for frame in scan_frames(data, info, info.first_frame, 0):
+        samples.append(frame.sample)
+        offsets.append(frame.offset)
+    return FrameIndex(samples, offsets)
+
+
+def seek_point(input_file, data, info, sample):
+    # The closest known frame start at or before sample: from the seek table when the file has
+    # one, otherwise from a frame index built once per file
+    points = info.seek_points
+    i = bisect_right(points, (sample, float("inf")))
+    if i:
+        point_sample, offset = points[i - 1]
+        header = parse_frame_header(data, offset, info)
+        # Some encoders write seek points that miss the frame start; the index doesn't
+        if header is not None and header[0] == point_sample:
+            return point_sample, offset
+    elif points:
+        return 0, info.first_frame
+    index = get_frame_index(input_file, data, info)
+    i = bisect_right(index.samples, sample)
+    return (index.samples[i - 1], index.offsets[i - 1]) if i else (0, info.first_frame)
+
+
+def frames_between(input_file, data, info, start_sample, end_sample):
+    # Every frame holding samples in [start_sample, end_sample)
+    sample, offset = seek_point(input_file, data, info, start_sample)
+    frames = []
+    for frame in scan_frames(data, info, offset, sample):
+        if frame.sample >= end_sample:
+            break
+        if frame.sample + frame.blocksize > start_sample:
+            frames.append(frame)
+    return frames
+
+
+def flac_header(info, total_samples, frame_sizes, blocksizes, seek_points):
+    # fLaC marker and metadata for the cut: a new STREAMINFO (MD5 unknown) and seek table, then the kept blocks
+    packed = info.sample_rate << 44 | (info.channels - 1) << 41 | (info.bits_per_sample - 1) << 36 | total_samples
+    # Both limits stay at 16 or more even when the cut is a single short frame
+    min_blocksize = max(min(blocksizes[:-1] or blocksizes), MIN_BLOCKSIZE)
+    streaminfo = struct.pack(">HH", min_blocksize, max(max(blocksizes), min_blocksize))
+    streaminfo += min(frame_sizes).to_bytes(3, "big") + max(frame_sizes).to_bytes(3, "big")
+    streaminfo += packed.to_bytes(8, "big") + bytes(16)
+    seektable = b"".join(struct.pack(">QQH", *point) for point in seek_points)
+    blocks = [(BLOCK_STREAMINFO, streaminfo), (BLOCK_SEEKTABLE, seektable)] + info.blocks
+    header = b"fLaC"
+    for i, (block_type, body) in enumerate(blocks):
+        flags = block_type | (0x80 if i == len(blocks) - 1 else 0)
+        header += bytes([flags]) + len(body).to_bytes(3, "big") + body
+    return header
+
+
+def encode_boundary(data, info, frames, start_sample, end_sample, work_dir, cancel):
+    # Re-encodes [start_sample, end_sample) from the frames around it as a single FLAC frame
+    # where the size allows it. ffmpeg only ever sees those few frames, never the whole input.
+    source = os.path.join(work_dir, "boundary_in.flac")
+    encoded = os.path.join(work_dir, "boundary_out.flac")
+    first = frames[0].sample
+    streaminfo = info.streaminfo[:10] + (int.from_bytes(info.streaminfo[10:18], "big") & ~0xFFFFFFFFF).to_bytes(8, "big") + bytes(16)
+    with open(source, "wb") as f:
+        f.write(b"fLaC" + bytes([0x80 | BLOCK_STREAMINFO]) + len(streaminfo).to_bytes(3, "big") + streaminfo)
+        for frame in frames:
+            f.write(data[frame.offset:frame.offset + frame.size])
+
+    count = end_sample - start_sample
+    args = [
+        "-i", source,
+        "-af", f"asetpts=N/SR/TB,atrim=start_sample={start_sample - first}:end_sample={end_sample - first}",
+        "-c:a", "flac",
+        "-sample_fmt", "s16" if info.bits_per_sample <= 16 else "s32",
+        "-bits_per_raw_sample", str(info.bits_per_sample),
+    ]
+    if MIN_BLOCKSIZE <= count <= MAX_BLOCKSIZE:
+        args += ["-frame_size", str(count)]
+    run_ffmpeg(args + ["-f", "flac", encoded], cancel=cancel)
+
+    with open(encoded, "rb") as f:
+        output = f.read()
+    encoded_info = parse_flac(output)
+    pieces = [(output, frame) for frame in scan_frames(output, encoded_info, encoded_info.first_frame, 0)]
+    if sum(frame.blocksize for _, frame in pieces) != count:
+        raise ValueError("Re-encoded FLAC boundary has the wrong length")
+    return pieces
+
+
+def cut_flac(input_file, output_file, start_seconds, end_seconds, exact=True, progress=None, cancel=None):
+    # Frames inside the range are copied; only their headers change, to the variable block size
+    # form numbered from the new start (the frame CRC-16 is patched, not recomputed). With exact,
+    # the partial frames at either end are re-encoded so the cut lands on the sample; without,
+    # they are kept whole like any stream copy.
+    if end_seconds <= start_seconds:
+        raise ValueError("End time must be after start time")
+
+    with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        info = parse_flac(data)
+        start_sample = int(round(start_seconds * info.sample_rate))
+        end_sample = int(round(end_seconds * info.sample_rate))
+        if info.total_samples:
+            end_sample = min(end_sample, info.total_samples)
+        frames = frames_between(input_file, data, info, start_sample, end_sample)
+        if not frames or end_sample <= start_sample:
+            raise ValueError("Nothing to cut in the requested range")
+        if not exact:
+            start_sample = frames[0].sample
+            end_sample = frames[-1].sample + frames[-1].blocksize
+
+        # Whole frames inside the range are copied. A head shorter than the minimum block size
+        # takes the next frame with it, as only the last frame may be that small.
+        copied = [frame for frame in frames if frame.sample >= start_sample and frame.sample + frame.blocksize <= end_sample]
+        head_end = copied[0].sample if copied else end_sample
+        if 0 < head_end - start_sample < MIN_BLOCKSIZE and copied:
+            copied.pop(0)
+            head_end = copied[0].sample if copied else end_sample
+        tail_start = copied[-1].sample + copied[-1].blocksize if copied else end_sample
+
+        work_dir = tempfile.mkdtemp(prefix="vc4u_", dir=os.path.dirname(os.path.abspath(output_file)))
+        try:
+            # (source bytes, frame) for every frame of the output, in order
+            pieces = []
+            if head_end > start_sample:
+                around = [frame for frame in frames if frame.sample < head_end]
+                pieces += encode_boundary(data, info, around, start_sample, head_end, work_dir, cancel)
+            pieces += [(data, frame) for frame in copied]
+            if end_sample > tail_start:
+                around = [frame for frame in frames if frame.sample + frame.blocksize > tail_start]
+                pieces += encode_boundary(data, info, around, tail_start, end_sample, work_dir, cancel)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        # New headers first, so the seek table can point at the final frame offsets
+        headers = []
+        sample = 0
+        for source, frame in pieces:
+            headers.append(rewrite_frame_header(source[frame.offset:frame.offset + frame.header_size], sample))
+            sample += frame.blocksize
+        total_samples = sample
+
+        frame_sizes = []
+        seek_points = []
+        position = 0
+        sample = 0
+        interval = SEEK_POINT_SECONDS * info.sample_rate
+        for (source, frame), header in zip(pieces, headers):
+            if sample >= len(seek_points) * interval:
+                seek_points.append((sample, position, frame.blocksize))
+            size = frame.size - frame.header_size + len(header)
+            frame_sizes.append(size)
+            position += size
+            sample += frame.blocksize
+
+        duration = total_samples / info.sample_rate
+        reporter = ProgressReporter(duration, progress) if progress else None
+        if reporter:
+            reporter.track(duration)
+
+        blocksizes = [frame.blocksize for _, frame in pieces]
+        with open(output_file, "wb") as out:
+            out.write(flac_header(info, total_samples, frame_sizes, blocksizes, seek_points))
+            written = 0
+            sample = 0
+            for count, ((source, frame), header) in enumerate(zip(pieces, headers), 1):
+                old_header = source[frame.offset:frame.offset + frame.header_size]
+                body_start = frame.offset + frame.header_size
+                crc_offset = frame.offset + frame.size - 2
+                old_crc = source[crc_offset] << 8 | source[crc_offset + 1]
+                new_crc = old_crc ^ crc16_shift(crc16(old_header) ^ crc16(header), crc_offset - body_start)
+                out.write(header)
+                out.write(source[body_start:crc_offset])
+                out.write(new_crc.to_bytes(2, "big"))
+                written += len(header) + frame.size - frame.header_size
+                sample += frame.blocksize
+                if count % CHECK_INTERVAL == 0:
+                    if cancel is not None and cancel.is_set():
+                        raise CutCancelled()
+                    if reporter:
+                        reporter.advance(sample / info.sample_rate, written)
+
+    if reporter:
+        reporter.advance(duration, written)
+        reporter.report(force=True)
@@ -0,0 +1,331 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from audio_cutter import AUDIO_MODE_REENCODE
+from cutter import VIDEO_EXTENSIONS, cut_media
+from ffmpeg_utils import CutCancelled
+from joiner import join_files
+from multi_cut import cut_segments
+from splitter import part_pattern, split_media
+from video_cutter import VIDEO_MODE_COPY
+
+# Job states reported through JobQueue's on_update callback
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# Jobs submitted ahead of the workers when feeding a batch; the rest stay unread in the manifest
+MAX_PENDING_JOBS = 256
+
+
+def default_worker_count(variable, fallback):
+    value = os.environ.get(variable)
+    if value:
+        try:
+            return max(1, int(value))
+        except ValueError:
+            logging.warning("Ignoring %s=%r, expected a whole number", variable, value)
+    return fallback
+
+
+# Stream copies are bound by disk throughput, so a handful in flight keeps the drive busy
+# without thrashing it; re-encodes are bound by the CPU and each encoder is already
+# multi-threaded, so only a fraction of the cores get their own job
+DEFAULT_COPY_WORKERS = default_worker_count("VC4U_COPY_WORKERS", 4)
+DEFAULT_ENCODE_WORKERS = default_worker_count("VC4U_ENCODE_WORKERS", max(1, (os.cpu_count() or 4) // 4))
+
+
+def needs_encoder(input_file, video_mode, audio_mode):
+    if os.path.splitext(input_file)[1].lower() in VIDEO_EXTENSIONS:
+        return video_mode != VIDEO_MODE_COPY
+    return audio_mode == AUDIO_MODE_REENCODE
+
+
+class CutJob:
+    # Batches can hold a great many of these, slots keep each one small
+    __slots__ = ("input_file", "output_file", "start_seconds", "end_seconds", "video_mode", "audio_mode", "options")
+
+    def __init__(self, input_file, output_file, start_seconds, end_seconds, video_mode=VIDEO_MODE_COPY, audio_mode=AUDIO_MODE_REENCODE, options=None):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.start_seconds = start_seconds
+        self.end_seconds = end_seconds
+        self.video_mode = video_mode
+        self.audio_mode = audio_mode
+        self.options = options
+
+    @property
+    def outputs(self):
+        return [self.output_file]
+
+    @property
+    def is_encode(self):
+        return needs_encoder(self.input_file, self.video_mode, self.audio_mode)
+
+    def run(self, progress=None, cancel=None):
+        cut_media(
+            self.input_file,
+            self.output_file,
+            self.start_seconds,
+            self.end_seconds,
+            video_mode=self.video_mode,
+            audio_mode=self.audio_mode,
+            progress=progress,
+            cancel=cancel,
+            options=self.options,
+        )
+
+
+class SegmentsJob:
+    # Several ranges of one input, written in a single pass over the source
+    __slots__ = ("input_file", "segments", "video_mode", "audio_mode", "options")
+
+    def __init__(self, input_file, segments, video_mode=VIDEO_MODE_COPY, audio_mode=AUDIO_MODE_REENCODE, options=None):
+        self.input_file = input_file
+        self.segments = segments
+        self.video_mode = video_mode
+        self.audio_mode = audio_mode
+        self.options = options
+
+    @property
+    def outputs(self):
+        return [output_file for _, _, output_file in self.segments]
+
+    @property
+    def is_encode(self):
+        return needs_encoder(self.input_file, self.video_mode, self.audio_mode)
+
+    def run(self, progress=None, cancel=None):
+        cut_segments(
+            self.input_file,
+            self.segments,
+            video_mode=self.video_mode,
+            audio_mode=self.audio_mode,
+            progress=progress,
+            cancel=cancel,
+            options=self.options,
+        )
+
+
+class JoinJob:
+    # Several files played one after another in a single output
+    __slots__ = ("input_files", "output_file", "options")
+
+    def __init__(self, input_files, output_file, options=None):
+        self.input_files = input_files
+        self.output_file = output_file
+        self.options = options
+
+    @property
+    def input_file(self):
+        return self.input_files[0]
+
+    @property
+    def outputs(self):
+        return [self.output_file]
+
+    @property
+    def is_encode(self):
+        # Matching files are only copied; the odd file that needs conforming is rare enough
+        # not to hold the join back behind the encoders
+        return False
+
+    def run(self, progress=None, cancel=None):
+        join_files(self.input_files, self.output_file, progress=progress, cancel=cancel, options=self.options)
+
+
+class SplitJob:
+    # One input split into numbered parts in a single pass
+    __slots__ = ("input_file", "output_file", "part_seconds", "part_bytes", "options")
+
+    def __init__(self, input_file, output_file, part_seconds=None, part_bytes=None, options=None):
+        self.input_file = input_file
+        self.output_file = output_file
+        self.part_seconds = part_seconds
+        self.part_bytes = part_bytes
+        self.options = options
+
+    @property
+    def outputs(self):
+        # Only the first part's name is known before the split has run
+        return [part_pattern(self.output_file) % 1]
+
+    @property
+    def is_encode(self):
+        return False
+
+    def run(self, progress=None, cancel=None):
+        split_media(
+            self.input_file,
+            self.output_file,
+            part_seconds=self.part_seconds,
+            part_bytes=self.part_bytes,
+            progress=progress,
+            cancel=cancel,
+            options=self.options,
+        )
+
+
+def run_job(job_id, job, updates, cancel):
+    # Runs inside a pool process; progress travels back over the manager queue
+    updates.put((job_id, JOB_RUNNING, None))
+
+    def progress(update):
+        updates.put((job_id, JOB_RUNNING, update))
+
+    try:
+        job.run(progress=progress, cancel=cancel)
+    except CutCancelled:
+        return JOB_CANCELLED, None
+    except Exception as e:
+        return JOB_FAILED, str(e)
+    return JOB_DONE, None
+
+
+class JobQueue:
+    def __init__(self, copy_workers=DEFAULT_COPY_WORKERS, encode_workers=DEFAULT_ENCODE_WORKERS, on_update=None):
+        self.copy_workers = copy_workers
+        self.encode_workers = encode_workers
+        self.on_update = on_update
+        # Only unfinished jobs are kept, finished ones are just counted
+        self.status = {}
+        self.counts = dict.fromkeys(FINISHED_STATES, 0)
+        self._futures = {}
+        self._cancel_events = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._manager = None
+        self._copy_pool = None
+        self._encode_pool = None
+        self._listener = None
+        self._closing = threading.Event()
+
+    def _start(self):
+        # Spawned workers never inherit the GUI's threads and behave the same on every platform
+        context = multiprocessing.get_context("spawn")
+        self._manager = context.Manager()
+        self._updates = self._manager.Queue()
+        self._copy_pool = ProcessPoolExecutor(self.copy_workers, mp_context=context)
+        self._encode_pool = ProcessPoolExecutor(self.encode_workers, mp_context=context)
+        self._listener = threading.Thread(target=self._listen, daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        while True:
+            item = self._updates.get()
+            if item is None:
+                return
+            self._set_status(*item)
+
+    def _set_status(self, job_id, status, detail):
+        with self._lock:
+            # Progress can arrive after the job's result, never let it reopen a finished job
+            if job_id not in self.status:
+                return
+            if status in FINISHED_STATES:
+                del self.status[job_id]
+                self.counts[status] += 1
+                self._futures.pop(job_id, None)
+                self._cancel_events.pop(job_id, None)
+                self._idle.notify_all()
+            else:
+                self.status[job_id] = status
+        if self.on_update:
+            self.on_update(job_id, status, detail)
+
+    def _job_finished(self, job_id, future):
+        if future.cancelled():
+            self._set_status(job_id, JOB_CANCELLED, None)
+        elif future.exception() is not None:
+            self._set_status(job_id, JOB_FAILED, str(future.exception()))
+        else:
+            self._set_status(job_id, *future.result())
+
+    def submit(self, job):
+        with self._lock:
+            if self._closing.is_set():
+                raise RuntimeError("The job queue has been shut down")
+            if self._manager is None:
+                self._start()
+            job_id = self._next_id
+            self._next_id += 1
+            self.status[job_id] = JOB_QUEUED
+            cancel = self._manager.Event()
+            self._cancel_events[job_id] = cancel
+        if self.on_update:
+            self.on_update(job_id, JOB_QUEUED, job)
+
+        pool = self._encode_pool if job.is_encode else self._copy_pool
+        try:
+            future = pool.submit(run_job, job_id, job, self._updates, cancel)
+        except RuntimeError:
+            self._set_status(job_id, JOB_CANCELLED, None)
+            raise
+        with self._lock:
+            if job_id in self.status:
+                self._futures[job_id] = future
+        future.add_done_callback(lambda future: self._job_finished(job_id, future))
+        return job_id
+
+    def submit_all(self, jobs, max_pending=MAX_PENDING_JOBS, cancel=None, submitted=None):
+        # Pulls jobs lazily and keeps at most max_pending of them queued or running, so a
+        # generator over a huge manifest is read only as fast as the workers get through it
+        for job in jobs:
+            with self._lock:
+                while len(self.status) >= max_pending and not self._closing.is_set() and not (cancel and cancel.is_set()):
+                    self._idle.wait(0.5)
+            if self._closing.is_set() or (cancel and cancel.is_set()):
+                return
+            try:
+                self.submit(job)
+            except RuntimeError:
+                # Lost a race with shutdown(), nothing more may be queued
+                if self._closing.is_set():
+                    return
+                raise
+            if submitted:
+                submitted()
+
+    def cancel(self, job_id):
+        with self._lock:
+            future = self._futures.get(job_id)
+            cancel = self._cancel_events.get(job_id)
+        # Jobs still waiting for a worker are dropped outright, running ones stop their ffmpeg
+        if future is not None and future.cancel():
+            return
+        if cancel is not None:
+            cancel.set()
+
+    def cancel_all(self):
+        with self._lock:
+            job_ids = list(self._futures)
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+    def active_count(self):
+        with self._lock:
+            return len(self.status)
+
+    def wait(self):
+        with self._lock:
+            while self.status:
+                self._idle.wait()
+
+    def shutdown(self):
+        self._closing.set()
+        if self._manager is None:
+            return
+        self.cancel_all()
+        self._copy_pool.shutdown(wait=True)
+        self._encode_pool.shutdown(wait=True)
+        self._updates.put(None)
+        self._listener.join()
+        self._manager.shutdown()
+        self._manager = None
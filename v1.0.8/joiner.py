@@ -0,0 +1,213 @@
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+
+from cutter import cut_media
+from ffmpeg_command import STREAMS_AUDIO, STREAMS_AUDIO_VIDEO, STREAMS_VIDEO, check_options, muxer_args, stream_args, thread_args
+from ffmpeg_utils import CutCancelled, remove_partial_output, run_ffmpeg
+from keyframe_index import get_keyframe_index
+from media_probe import probe_media
+from multi_cut import cut_segments
+from progress import ProgressReporter, track
+from video_cutter import encoder_args, write_concat_list
+
+# Encoders used when a file's audio has to be brought in line with the rest of the join.
+# PCM codecs are their own encoders.
+AUDIO_ENCODERS = {
+    "aac": "aac",
+    "mp3": "libmp3lame",
+    "opus": "libopus",
+    "vorbis": "libvorbis",
+    "flac": "flac",
+    "ac3": "ac3",
+    "eac3": "eac3",
+    "alac": "alac",
+}
+
+# One file of a join: its probe, what has to match between files, and how long it plays
+JoinPart = namedtuple("JoinPart", ["path", "info", "video", "audio", "layout", "duration"])
+
+
+def video_signature(stream):
+    # What has to be equal for copied video to play on across a file boundary. Profile and
+    # level may change: the concat demuxer puts each file's parameter sets in-band, as the
+    # smart cut does for its re-encoded ends. The frame rate and time base may not, or the
+    # copied frames keep the first file's timing and drift away from their audio.
+    if stream is None:
+        return None
+    return (
+        stream.get("codec_name"), stream.get("width"), stream.get("height"), stream.get("pix_fmt"),
+        stream.get("r_frame_rate"), stream.get("avg_frame_rate"), stream.get("time_base"),
+    )
+
+
+def audio_signature(stream):
+    # Audio decoders are set up once from the first file, so the profile has to match as well
+    return (stream.get("codec_name"), stream.get("profile"), stream.get("sample_rate"), stream.get("channels"), stream.get("channel_layout"))
+
+
+def play_duration(path, info):
+    # Matroska files written by ffmpeg leave the last video frame out of their duration,
+    # which would make the next file overlap it; the keyframe index has the real end
+    duration = info.duration
+    if info.has_video and "matroska" in (info.format_name or ""):
+        packets = get_keyframe_index(path).packets
+        if len(packets) > 1:
+            end = packets[-1] + (packets[-1] - packets[-2]) - packets[0]
+            duration = max(duration or 0.0, end)
+    return duration
+
+
+def read_part(path, streams):
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Input file not found: {path}")
+    info = probe_media(path)
+    video = None if streams == STREAMS_AUDIO else video_signature(info.video_stream)
+    audio = () if streams == STREAMS_VIDEO else tuple(audio_signature(stream) for stream in info.audio_streams)
+    # The concat demuxer pairs streams up by index, so their order has to match too
+    layout = tuple(stream.get("codec_type") for stream in info.streams)
+    return JoinPart(path, info, video, audio, layout, play_duration(path, info))
+
+
+def compatibility(part):
+    return part.video, part.audio, part.layout
+
+
+def reference_part(parts):
+    # Whatever the longest stretch of the join already looks like is kept, so the least gets re-encoded
+    totals = {}
+    for part in parts:
+        totals[compatibility(part)] = totals.get(compatibility(part), 0.0) + (part.duration or 0.0)
+    best = max(totals.values())
+    return next(part for part in parts if totals[compatibility(part)] == best)
+
+
+def conform_args(part, reference, output_file, options):
+    # Re-encodes only the streams of part that differ from the reference and copies the rest
+    args = ["-i", part.path]
+    maps = []
+    codecs = []
+    if reference.video is not None:
+        if part.video is None:
+            raise ValueError(f"{part.path} has no video to join with the other files")
+        maps += ["-map", "0:v:0"]
+        if part.video == reference.video:
+            codecs += ["-c:v", "copy"]
+        else:
+            stream = reference.info.video_stream
+            width, height = stream.get("width"), stream.get("height")
+            filters = f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+            rate = stream.get("r_frame_rate") or stream.get("avg_frame_rate")
+            if rate and rate != "0/0":
+                # The fps filter picks the frames; -r on its own keeps a few extra ones at the
+                # start of the file, which then runs longer than its audio. The frame grid starts
+                # on the first frame, which sits after the file's start when the audio leads.
+                filters += f",setpts=PTS-STARTPTS,fps={rate}"
+                codecs += ["-r", rate]
+            codecs += encoder_args(stream) + ["-vf", filters]
+            time_base = stream.get("time_base") or ""
+            if "mp4" in (reference.info.format_name or "") and time_base.startswith("1/"):
+                # MP4 picks its track timescale from the frame rate, which need not be the reference's
+                codecs += ["-video_track_timescale", time_base[2:]]
+
+    for number, signature in enumerate(reference.audio):
+        stream = reference.info.audio_streams[number]
+        if number < len(part.audio):
+            maps += ["-map", f"0:a:{number}"]
+            if part.audio[number] == signature:
+                codecs += [f"-c:a:{number}", "copy"]
+                continue
+        else:
+            # Silence where this file has fewer audio tracks than the rest
+            layout = stream.get("channel_layout") or "stereo"
+            args += ["-f", "lavfi", "-i", f"anullsrc=r={stream.get('sample_rate')}:cl={layout}"]
+            maps += ["-map", f"{args.count('-i') - 1}:a"]
+        codec = stream.get("codec_name")
+        encoder = AUDIO_ENCODERS.get(codec) or (codec if codec and codec.startswith("pcm_") else None)
+        if encoder is None:
+            raise ValueError(f"Cannot re-encode {codec} audio")
+        codecs += [f"-c:a:{number}", encoder, f"-ar:a:{number}", str(stream.get("sample_rate")), f"-ac:a:{number}", str(stream.get("channels"))]
+        if stream.get("bit_rate") and not encoder.startswith(("pcm_", "flac", "alac")):
+            codecs += [f"-b:a:{number}", str(stream["bit_rate"])]
+    if len(reference.audio) > len(part.audio):
+        args += ["-shortest"]
+    return args + maps + codecs + ["-sn", "-dn"] + thread_args(options) + [output_file]
+
+
+def join_files(input_files, output_file, progress=None, cancel=None, options=None):
+    # Plays the files one after the other in a single output. Files that match the rest are
+    # stream copied by the concat demuxer; only the streams of files that do not are
+    # re-encoded first, to the format most of the join is already in.
+    options = check_options(options)
+    if len(input_files) < 2:
+        raise ValueError("Give at least two files to join")
+    if os.path.abspath(output_file) in (os.path.abspath(path) for path in input_files):
+        raise ValueError("The joined file cannot be one of the files being joined")
+
+    parts = [read_part(path, options.streams) for path in input_files]
+    reference = reference_part(parts)
+    if reference.video is None and not reference.audio:
+        raise ValueError("Nothing to join: the files have no audio or video")
+    mismatched = [part for part in parts if compatibility(part) != compatibility(reference)]
+    total = sum(part.duration or 0.0 for part in parts)
+    # Progress counts media seconds: every conformed file, then the join itself
+    reporter = ProgressReporter(total + sum(part.duration or 0.0 for part in mismatched), progress) if progress else None
+
+    work_dir = tempfile.mkdtemp(prefix="vc4u_", dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        paths = []
+        for number, part in enumerate(parts):
+            if part in mismatched:
+                # The reference's own container, so the concat demuxer lines its timestamps up the same way
+                path = os.path.join(work_dir, f"conform{number}" + os.path.splitext(reference.path)[1])
+                run_ffmpeg(conform_args(part, reference, path, options), progress=track(reporter, part.duration or 0.0), cancel=cancel)
+                paths.append(path)
+            else:
+                paths.append(os.path.abspath(part.path))
+
+        concat_list = os.path.join(work_dir, "join.txt")
+        write_concat_list(concat_list, paths, [part.duration for part in parts])
+        run_ffmpeg(
+            ["-f", "concat", "-safe", "0", "-i", concat_list]
+            + stream_args(options, STREAMS_AUDIO_VIDEO)
+            + ["-c", "copy"]
+            + muxer_args(options)
+            + [output_file],
+            progress=track(reporter, total),
+            cancel=cancel,
+        )
+    except (CutCancelled, KeyboardInterrupt):
+        remove_partial_output(output_file)
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def join_ranges(input_file, ranges, output_file, video_mode, audio_mode, progress=None, cancel=None, options=None, engine=None):
+    # ranges is a list of (start_seconds, end_seconds), joined in the order given. Each
+    # range is cut on its own (all in one pass where the cut allows), then the cuts,
+    # which share the source's format, are joined without another encode.
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        cut_media(input_file, output_file, start, end, video_mode=video_mode, audio_mode=audio_mode, progress=progress, cancel=cancel, options=options, engine=engine)
+        return
+
+    def phase_progress(phase):
+        # Cutting and joining each count for half
+        if not progress:
+            return None
+        return lambda update: progress(update._replace(fraction=(phase + update.fraction) / 2, eta_seconds=None))
+
+    extension = os.path.splitext(input_file)[1]
+    work_dir = tempfile.mkdtemp(prefix="vc4u_", dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        segments = [(start, end, os.path.join(work_dir, f"range{number}{extension}")) for number, (start, end) in enumerate(ranges)]
+        cut_segments(
+            input_file, segments,
+            video_mode=video_mode, audio_mode=audio_mode, progress=phase_progress(0), cancel=cancel,
+            options=options, engine=engine,
+        )
+        join_files([path for _, _, path in segments], output_file, progress=phase_progress(1), cancel=cancel, options=options)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,160 @@
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+from disk_cache import DiskCache, LRUCache, cached_index, file_cache_key
+from ffmpeg_utils import iter_ffprobe_entries
+
+INDEX_MAGIC = b"VC4UKFI4"
+INDEX_HEADER = struct.Struct("<8sQQQd")
+
+# Keyframe indexes are compact binary arrays, so a few hundred MB holds thousands of inputs
+KEYFRAME_CACHE_MAX_BYTES = 256 * 1024 * 1024
+MEMORY_CACHE_ENTRIES = 8
+
+# How far before a keyframe the output start may fall when its decode time is unknown
+MAX_REORDER_DELAY = 0.5
+
+_disk_cache = DiskCache("keyframes", KEYFRAME_CACHE_MAX_BYTES)
+_memory_cache = LRUCache(MEMORY_CACHE_ENTRIES)
+
+
+class KeyframeIndex:
+    # Sorted presentation times of every video packet, plus the keyframes with their
+    # decode timestamps (NaN when the container does not store them) and byte offsets.
+    # Times count from the container's start time, the same zero ffmpeg's -ss seeks from;
+    # start_time is where that zero sits on the file's own timestamps. closed_keyframes are
+    # the keyframes no later packet is shown before, so decoding can start on them without
+    # anything from the GOP before (HEVC open GOPs start on CRA frames that fail this).
+    def __init__(self, packets, keyframes, keyframe_dts, keyframe_positions, start_time=0.0, closed_keyframes=None):
+        self.packets = packets
+        self.keyframes = keyframes
+        self.closed_keyframes = keyframes if closed_keyframes is None else closed_keyframes
+        self.keyframe_dts = keyframe_dts
+        self.keyframe_positions = keyframe_positions
+        self.start_time = start_time
+
+    def keyframe_at_or_before(self, seconds, tolerance=0.001, closed=False):
+        keyframes = self.closed_keyframes if closed else self.keyframes
+        i = bisect_right(keyframes, seconds + tolerance)
+        return keyframes[i - 1] if i else None
+
+    def keyframe_at_or_after(self, seconds, tolerance=0.001, closed=False):
+        keyframes = self.closed_keyframes if closed else self.keyframes
+        i = bisect_left(keyframes, seconds - tolerance)
+        return keyframes[i] if i < len(keyframes) else None
+
+    def keyframe_after(self, seconds, tolerance=0.001):
+        i = bisect_right(self.keyframes, seconds + tolerance)
+        return self.keyframes[i] if i < len(self.keyframes) else None
+
+    def decode_time(self, keyframe, tolerance=0.001):
+        i = bisect_left(self.keyframes, keyframe - tolerance)
+        if i < len(self.keyframes) and abs(self.keyframes[i] - keyframe) <= tolerance:
+            dts = self.keyframe_dts[i]
+            if dts == dts:
+                return dts
+        return None
+
+    def frame_at_or_after(self, seconds, tolerance=0.001):
+        i = bisect_left(self.packets, seconds - tolerance)
+        return self.packets[i] if i < len(self.packets) else None
+
+    def frame_count(self, start, end, tolerance=0.001):
+        # Number of frames presented in [start, end)
+        return bisect_left(self.packets, end - tolerance) - bisect_left(self.packets, start - tolerance)
+
+    def to_bytes(self):
+        header = INDEX_HEADER.pack(INDEX_MAGIC, len(self.packets), len(self.keyframes), len(self.closed_keyframes), self.start_time)
+        return (
+            header
+            + self.packets.tobytes()
+            + self.keyframes.tobytes()
+            + self.keyframe_dts.tobytes()
+            + self.keyframe_positions.tobytes()
+            + self.closed_keyframes.tobytes()
+        )
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, packet_count, keyframe_count, closed_count, start_time = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a keyframe index")
+        offset = INDEX_HEADER.size
+        arrays = []
+        for typecode, count in (("d", packet_count), ("d", keyframe_count), ("d", keyframe_count), ("q", keyframe_count), ("d", closed_count)):
+            values = array(typecode)
+            end = offset + values.itemsize * count
+            values.frombytes(data[offset:end])
+            if len(values) != count:
+                raise ValueError("Truncated keyframe index")
+            arrays.append(values)
+            offset = end
+        packets, keyframes, keyframe_dts, keyframe_positions, closed_keyframes = arrays
+        return cls(packets, keyframes, keyframe_dts, keyframe_positions, start_time, closed_keyframes)
+
+
+def copy_start_time(index, start_seconds):
+    # Stream copy can only start on a keyframe, and ffmpeg checks the keyframe's decode
+    # timestamp against the output start. Starting exactly at that decode timestamp keeps
+    # the keyframe at or before the requested start, like a single input-seeking copy cut.
+    keyframe = index.keyframe_at_or_before(start_seconds) if index else None
+    if keyframe is None:
+        return start_seconds
+    dts = index.decode_time(keyframe)
+    if dts is not None:
+        return dts
+    previous = index.keyframe_at_or_before(keyframe - 0.002)
+    gap = keyframe - previous if previous is not None else MAX_REORDER_DELAY * 2
+    return keyframe - min(gap / 2, MAX_REORDER_DELAY)
+
+
+def build_keyframe_index(input_file):
+    # Reading packet flags only walks the demuxer, it never decodes a frame
+    packets = []
+    keyframes = []
+    # Keyframes followed in decode order by a frame shown before them (leading pictures)
+    open_keyframes = set()
+    start_time = 0.0
+    for packet in iter_ffprobe_entries([
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,dts_time,pos,flags:format=start_time",
+        input_file,
+    ]):
+        if "start_time" in packet:
+            # The format section comes after the packets
+            if packet["start_time"] not in ("", "N/A"):
+                start_time = float(packet["start_time"])
+            continue
+        if packet.get("pts_time") in (None, "N/A"):
+            continue
+        pts = float(packet["pts_time"])
+        packets.append(pts)
+        if keyframes and "K" not in packet.get("flags", "") and pts < keyframes[-1][0]:
+            open_keyframes.add(keyframes[-1][0])
+        if "K" in packet.get("flags", ""):
+            dts = packet.get("dts_time")
+            pos = packet.get("pos")
+            keyframes.append((
+                pts,
+                float(dts) if dts not in (None, "N/A") else float("nan"),
+                int(pos) if pos not in (None, "N/A") else -1,
+            ))
+
+    # Packets come in decode order, so the leading pictures were spotted before sorting
+    keyframes.sort()
+    return KeyframeIndex(
+        array("d", sorted(pts - start_time for pts in packets)),
+        array("d", (pts - start_time for pts, _, _ in keyframes)),
+        array("d", (dts - start_time for _, dts, _ in keyframes)),
+        array("q", (pos for _, _, pos in keyframes)),
+        start_time,
+        array("d", (pts - start_time for pts, _, _ in keyframes if pts not in open_keyframes)),
+    )
+
+
+def get_keyframe_index(input_file):
+    return cached_index(
+        file_cache_key(input_file), _memory_cache, _disk_cache,
+        lambda: build_keyframe_index(input_file), KeyframeIndex.to_bytes, KeyframeIndex.from_bytes,
+    )
@@ -0,0 +1,290 @@
+import codecs
+import csv
+import json
+import os
+import re
+import sys
+from collections import OrderedDict
+from itertools import islice
+
+from audio_cutter import AUDIO_MODE_REENCODE, AUDIO_MODES
+from cutter import probe_or_none, parse_time
+from job_queue import CutJob, SegmentsJob
+from video_cutter import VIDEO_MODE_COPY, VIDEO_MODES
+
+MANIFEST_EXTENSIONS = ['.csv', '.json', '.edl']
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_JSON_RECORD_SIZE = 1024 * 1024
+
+# How many manifest rows are grouped per input at a time
+GROUP_WINDOW = 1024
+
+# Frame rate assumed for EDL timecodes when the source cannot be probed
+DEFAULT_EDL_FRAME_RATE = 25.0
+
+# CMX3600 event: number, reel, track, transition (with an optional length), then source in/out and record in/out
+EDL_EVENT_PATTERN = re.compile(
+    r"^(\d+)\s+(\S+)\s+(\S+)\s+(\S+)(?:\s+(\d+))?"
+    r"\s+(\d{2}:\d{2}:\d{2}[:;.,]\d{2})\s+(\d{2}:\d{2}:\d{2}[:;.,]\d{2})"
+    r"\s+\d{2}:\d{2}:\d{2}[:;.,]\d{2}\s+\d{2}:\d{2}:\d{2}[:;.,]\d{2}\s*$"
+)
+EDL_SOURCE_PATTERN = re.compile(r"^\*\s*(?:FROM CLIP NAME|SOURCE FILE):\s*(.+?)\s*$", re.IGNORECASE)
+
+JSON_LIST_START = re.compile(r'\s*(?:\[|\{\s*"jobs"\s*:\s*\[)')
+
+
+def timecode_to_seconds(timecode, frame_rate, drop_frame=False):
+    hours, minutes, seconds, frames = (int(part) for part in re.split(r"[:;.,]", timecode))
+    nominal_rate = int(round(frame_rate))
+    total_frames = ((hours * 60 + minutes) * 60 + seconds) * nominal_rate + frames
+    if drop_frame:
+        # Drop-frame timecode skips two frame numbers (four at 59.94) every minute except every tenth
+        total_minutes = hours * 60 + minutes
+        dropped = 2 * nominal_rate // 30
+        total_frames -= dropped * (total_minutes - total_minutes // 10)
+    return total_frames / frame_rate
+
+
+def probe_source(input_file):
+    return probe_or_none(input_file) if os.path.isfile(input_file) else None
+
+
+def source_frame_rate(media_info):
+    video = media_info.video_stream if media_info else None
+    if video:
+        numerator, _, denominator = (video.get("r_frame_rate") or "").partition("/")
+        try:
+            return float(numerator) / float(denominator or 1)
+        except (ValueError, ZeroDivisionError):
+            pass
+    return DEFAULT_EDL_FRAME_RATE
+
+
+def source_start_timecode(media_info, frame_rate):
+    # Source timecode of the file's first frame, in seconds: its timecode tag, else its start time
+    if media_info is None:
+        return 0.0
+    timecode = media_info.timecode
+    if timecode:
+        try:
+            return timecode_to_seconds(timecode, frame_rate, ";" in timecode)
+        except ValueError:
+            pass
+    return media_info.start_time
+
+
+def resolve_path(path, base_dir):
+    path = os.path.expanduser(path.strip())
+    return path if os.path.isabs(path) else os.path.normpath(os.path.join(base_dir, path))
+
+
+def default_output(input_file, number, output_dir):
+    stem, extension = os.path.splitext(os.path.basename(input_file))
+    return os.path.join(output_dir, f"{stem}_{number:03d}{extension}")
+
+
+def parse_seconds(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    return parse_time(str(value))
+
+
+def make_job(record, number, base_dir, output_dir, where, video_mode=VIDEO_MODE_COPY, audio_mode=AUDIO_MODE_REENCODE, options=None):
+    # record is a dict with input, start, end and optionally output, video_mode and audio_mode
+    record = {str(key).strip().lower(): value for key, value in record.items() if key is not None}
+    try:
+        # Thousands of rows usually share a handful of inputs, let them share one string too
+        input_file = sys.intern(resolve_path(str(record["input"]), base_dir))
+        start_seconds = parse_seconds(record["start"])
+        end_seconds = parse_seconds(record["end"])
+    except KeyError as e:
+        raise ValueError(f"{where}: missing {e.args[0]!r}")
+    except ValueError as e:
+        raise ValueError(f"{where}: {e}")
+    if end_seconds <= start_seconds:
+        raise ValueError(f"{where}: end time must be after start time")
+
+    output_file = record.get("output")
+    output_file = resolve_path(str(output_file), base_dir) if output_file else default_output(input_file, number, output_dir)
+    video_mode = record.get("video_mode") or video_mode
+    audio_mode = record.get("audio_mode") or audio_mode
+    if video_mode not in VIDEO_MODES:
+        raise ValueError(f"{where}: unknown video mode {video_mode!r}")
+    if audio_mode not in AUDIO_MODES:
+        raise ValueError(f"{where}: unknown audio mode {audio_mode!r}")
+    return CutJob(input_file, output_file, start_seconds, end_seconds, video_mode=video_mode, audio_mode=audio_mode, options=options)
+
+
+class ManifestReader:
+    # Iterates a manifest one job at a time, so even huge cut lists never sit in memory.
+    # bytes_read and rows_read can be polled from another thread for progress.
+    def __init__(self, path, output_dir=None, source=None, frame_rate=None, video_mode=VIDEO_MODE_COPY, audio_mode=AUDIO_MODE_REENCODE, options=None):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        # Rows without an output name land next to the manifest, rows without modes use these;
+        # options (ffmpeg_command.FFmpegOptions) apply to every job
+        self.output_dir = output_dir or self.base_dir
+        self.source = source
+        self.frame_rate = frame_rate
+        self.modes = {"video_mode": video_mode, "audio_mode": audio_mode, "options": options}
+        self.extension = os.path.splitext(path)[1].lower()
+        if self.extension not in MANIFEST_EXTENSIONS:
+            raise ValueError(f"Unsupported manifest type: {self.extension or path}")
+        self.total_bytes = os.path.getsize(path)
+        self.bytes_read = 0
+        self.rows_read = 0
+
+    @property
+    def fraction(self):
+        return min(self.bytes_read / self.total_bytes, 1.0) if self.total_bytes else 1.0
+
+    def __iter__(self):
+        if self.extension == ".csv":
+            return self.read_csv()
+        if self.extension == ".json":
+            return self.read_json()
+        return self.read_edl()
+
+    def chunks(self):
+        decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        with open(self.path, "rb") as f:
+            while True:
+                data = f.read(READ_CHUNK_SIZE)
+                self.bytes_read += len(data)
+                text = decoder.decode(data, final=not data)
+                if text:
+                    yield text
+                if not data:
+                    return
+
+    def lines(self):
+        pending = ""
+        for text in self.chunks():
+            lines = (pending + text).splitlines(keepends=True)
+            pending = lines.pop() if not lines[-1].endswith(("\n", "\r")) else ""
+            yield from lines
+        if pending:
+            yield pending
+
+    def read_csv(self):
+        reader = csv.reader(self.lines())
+        header = [name.strip().lower() for name in next(reader, [])]
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue
+            self.rows_read += 1
+            yield make_job(dict(zip(header, row)), self.rows_read, self.base_dir, self.output_dir, f"{self.path}:{reader.line_num}", **self.modes)
+
+    def read_json(self):
+        # Decodes one job object at a time out of a top-level list (or a {"jobs": [...]} object)
+        decoder = json.JSONDecoder()
+        buffer = ""
+        started = False
+        for text in self.chunks():
+            buffer += text
+            if not started:
+                match = JSON_LIST_START.match(buffer)
+                if not match:
+                    if len(buffer) < READ_CHUNK_SIZE:
+                        continue
+                    break
+                buffer = buffer[match.end():]
+                started = True
+            while True:
+                buffer = buffer.lstrip().lstrip(",").lstrip()
+                if buffer.startswith("]"):
+                    return
+                try:
+                    record, end = decoder.raw_decode(buffer)
+                except ValueError as e:
+                    # Most likely the object continues in the next chunk, unless it is absurdly long
+                    if len(buffer) > MAX_JSON_RECORD_SIZE:
+                        raise ValueError(f"{self.path}: job {self.rows_read + 1}: {e}")
+                    break
+                buffer = buffer[end:]
+                self.rows_read += 1
+                if not isinstance(record, dict):
+                    raise ValueError(f"{self.path}: job {self.rows_read} is not an object")
+                yield make_job(record, self.rows_read, self.base_dir, self.output_dir, f"{self.path}: job {self.rows_read}", **self.modes)
+        if not started:
+            raise ValueError(f"{self.path}: expected a list of jobs or an object whose first key is \"jobs\"")
+        # Whatever is left is a broken record, or nothing at all when only the closing "]" is missing
+        if buffer.strip():
+            try:
+                decoder.raw_decode(buffer.strip())
+            except ValueError as e:
+                raise ValueError(f"{self.path}: job {self.rows_read + 1}: {e}")
+        raise ValueError(f"{self.path}: unexpected end of the job list")
+
+    def read_edl(self):
+        drop_frame = False
+        event = None
+        for line_number, line in enumerate(self.lines(), 1):
+            line = line.strip()
+            if line.upper().startswith("FCM:"):
+                drop_frame = "NON" not in line.upper()
+                continue
+            match = EDL_EVENT_PATTERN.match(line)
+            if match:
+                number, reel, _, _, _, source_in, source_out = match.groups()
+                # A dissolve repeats its event number, the last line is the clip being cut to
+                if event is not None and event["number"] != int(number):
+                    yield from self.edl_job(event)
+                event = {
+                    "number": int(number),
+                    "reel": reel,
+                    "source_in": source_in,
+                    "source_out": source_out,
+                    "drop_frame": drop_frame or ";" in source_in,
+                    "source": None,
+                    "where": f"{self.path}:{line_number}",
+                }
+                continue
+            match = EDL_SOURCE_PATTERN.match(line)
+            if match and event is not None:
+                event["source"] = match.group(1)
+        if event is not None:
+            yield from self.edl_job(event)
+
+    def edl_job(self, event):
+        if event["reel"].upper() in ("BL", "BLACK"):
+            return
+        self.rows_read += 1
+        if self.source:
+            input_file = self.source
+        elif event["source"]:
+            input_file = sys.intern(resolve_path(event["source"], self.base_dir))
+        else:
+            raise ValueError(f"{event['where']}: no clip name for reel {event['reel']!r}, give the source file explicitly")
+        media_info = probe_source(input_file)
+        rate = self.frame_rate or source_frame_rate(media_info)
+        start_seconds = timecode_to_seconds(event["source_in"], rate, event["drop_frame"])
+        end_seconds = timecode_to_seconds(event["source_out"], rate, event["drop_frame"])
+        # Source times are timecodes, e.g. from 01:00:00:00, while cuts count from the file's start.
+        # Events before the first timecode were written as file positions and are kept as they are.
+        source_start = source_start_timecode(media_info, rate)
+        if start_seconds >= source_start:
+            start_seconds -= source_start
+            end_seconds -= source_start
+        if end_seconds > start_seconds:
+            yield CutJob(input_file, default_output(input_file, event["number"], self.output_dir), start_seconds, end_seconds, **self.modes)
+
+
+def group_jobs(jobs, window=GROUP_WINDOW):
+    # One job per input (and mode pair) so each source is read once, its ranges in file order.
+    # Jobs are grouped a window at a time, which keeps memory flat on endless manifests.
+    jobs = iter(jobs)
+    while True:
+        groups = OrderedDict()
+        for job in islice(jobs, window):
+            groups.setdefault((job.input_file, job.video_mode, job.audio_mode), []).append(job)
+        if not groups:
+            return
+        for (input_file, video_mode, audio_mode), group in sorted(groups.items(), key=lambda item: item[0]):
+            group.sort(key=lambda job: (job.start_seconds, job.end_seconds))
+            if len(group) == 1:
+                yield group[0]
+            else:
+                segments = [(job.start_seconds, job.end_seconds, job.output_file) for job in group]
+                yield SegmentsJob(input_file, segments, video_mode=video_mode, audio_mode=audio_mode, options=group[0].options)
@@ -0,0 +1,100 @@
+import json
+
+from disk_cache import DiskCache, LRUCache, cached_index, file_cache_key
+from ffmpeg_utils import run_ffprobe
+
+PROBE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+MEMORY_CACHE_ENTRIES = 256
+
+PROBE_ENTRIES = (
+    "format=format_name,duration,bit_rate,size,start_time"
+    ":format_tags=timecode"
+    ":stream=index,codec_type,codec_name,profile,width,height,pix_fmt,r_frame_rate,avg_frame_rate,"
+    "time_base,bit_rate,sample_rate,channels,channel_layout,duration"
+    ":stream_tags=timecode"
+    ":stream_disposition=attached_pic"
+)
+
+# Named after the entries it holds; probes cached with fewer fields would read as missing ones
+_disk_cache = DiskCache("probe2", PROBE_CACHE_MAX_BYTES)
+_memory_cache = LRUCache(MEMORY_CACHE_ENTRIES)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class MediaInfo:
+    def __init__(self, data):
+        self.data = data
+        fmt = data.get("format") or {}
+        self.format_name = fmt.get("format_name")
+        self.bit_rate = _to_int(fmt.get("bit_rate"))
+        self.size = _to_int(fmt.get("size"))
+        self.streams = data.get("streams") or []
+        self.start_time = _to_float(fmt.get("start_time")) or 0.0
+        self.duration = _to_float(fmt.get("duration"))
+        if self.duration is None:
+            durations = [_to_float(stream.get("duration")) for stream in self.streams]
+            self.duration = max((d for d in durations if d is not None), default=None)
+
+    @property
+    def video_stream(self):
+        # Cover art in audio files shows up as a single-frame video stream, skip it
+        for stream in self.streams:
+            if stream.get("codec_type") == "video" and not (stream.get("disposition") or {}).get("attached_pic"):
+                return stream
+        return None
+
+    @property
+    def timecode(self):
+        # Timecode of the first frame, from the container or a stream (MOV keeps it on a tmcd
+        # track); Matroska spells the tag TIMECODE
+        for holder in [self.data.get("format") or {}] + self.streams:
+            for name, value in (holder.get("tags") or {}).items():
+                if name.lower() == "timecode" and value:
+                    return value
+        return None
+
+    @property
+    def audio_streams(self):
+        return [stream for stream in self.streams if stream.get("codec_type") == "audio"]
+
+    @property
+    def has_video(self):
+        return self.video_stream is not None
+
+    def describe(self):
+        parts = []
+        if self.duration is not None:
+            hours, rest = divmod(self.duration, 3600)
+            minutes, seconds = divmod(rest, 60)
+            parts.append(f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}")
+        video = self.video_stream
+        if video:
+            parts.append(f"{video.get('codec_name')} {video.get('width')}x{video.get('height')}")
+        for audio in self.audio_streams[:1]:
+            parts.append(f"{audio.get('codec_name')} {audio.get('sample_rate')} Hz")
+        if self.bit_rate:
+            parts.append(f"{self.bit_rate / 1000:.0f} kb/s")
+        return ", ".join(parts)
+
+
+def probe_media(input_file):
+    # The disk keeps ffprobe's JSON, memory the MediaInfo made from it
+    return cached_index(
+        file_cache_key(input_file), _memory_cache, _disk_cache,
+        lambda: MediaInfo(run_ffprobe(["-show_entries", PROBE_ENTRIES, input_file])),
+        lambda info: json.dumps(info.data, separators=(",", ":")).encode("utf-8"),
+        lambda data: MediaInfo(json.loads(data)),
+    )
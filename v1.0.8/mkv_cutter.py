@@ -0,0 +1,632 @@
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+
+from disk_cache import DiskCache, LRUCache, cached_index, file_cache_key
+from file_copy import copy_range, write_all
+from progress import ProgressReporter
+
+EBML_HEADER = 0x1A45DFA3
+DOC_TYPE = 0x4282
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TIMESTAMP_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_NUMBER = 0xD7
+TRACK_TYPE = 0x83
+DEFAULT_DURATION = 0x23E383
+CODEC_DELAY = 0x56AA
+CLUSTER = 0x1F43B675
+CLUSTER_TIMESTAMP = 0xE7
+SIMPLE_BLOCK = 0xA3
+BLOCK_GROUP = 0xA0
+BLOCK = 0xA1
+REFERENCE_BLOCK = 0xFB
+CUES = 0x1C53BB6B
+CUE_POINT = 0xBB
+CUE_TIME = 0xB3
+CUE_TRACK_POSITIONS = 0xB7
+CUE_TRACK = 0xF7
+CUE_CLUSTER_POSITION = 0xF1
+CUE_RELATIVE_POSITION = 0xF0
+CHAPTERS = 0x1043A770
+TAGS = 0x1254C367
+TAG = 0x7373
+SIMPLE_TAG = 0x67C8
+TAG_NAME = 0x45A3
+ATTACHMENTS = 0x1941A469
+VOID = 0xEC
+CRC_32 = 0xBF
+
+TRACK_TYPE_VIDEO = 1
+
+# Elements that can follow a cluster at the top of the segment; one of them ends a cluster of unknown size
+SEGMENT_CHILDREN = {SEEK_HEAD, INFO, TRACKS, CUES, CHAPTERS, TAGS, ATTACHMENTS, CLUSTER, EBML_HEADER, SEGMENT}
+
+# Copied into cuts as they are. Chapters are left out: their times describe the whole file.
+KEPT_ELEMENTS = (ATTACHMENTS, TAGS)
+
+# Per-track statistics that ffmpeg and mkvmerge write as tags; they'd describe the whole file
+STATISTICS_TAGS = {
+    b"DURATION", b"NUMBER_OF_FRAMES", b"NUMBER_OF_BYTES", b"BPS",
+    b"_STATISTICS_TAGS", b"_STATISTICS_WRITING_APP", b"_STATISTICS_WRITING_DATE_UTC",
+}
+
+# How far past the end a frame that is decoded before one shown in the range can be stamped
+REORDER_SECONDS = 1.0
+
+START_TOLERANCE = 0.0005
+
+INDEX_MAGIC = b"VC4UMKC1"
+INDEX_HEADER = struct.Struct("<8sQ")
+CUE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_disk_cache = DiskCache("mkv_cues", CUE_CACHE_MAX_BYTES)
+_memory_cache = LRUCache(8)
+
+# reference_track is the track cuts start on: the first video track, else the first track.
+# elements maps the top-level IDs to (offset, total size) of the first element of each kind.
+MkvInfo = namedtuple(
+    "MkvInfo",
+    ["ebml_header", "segment_data", "segment_end", "timestamp_scale", "tracks", "reference_track", "default_durations", "codec_delays", "elements", "first_cluster"],
+)
+
+# A block or block group in a cluster: its element bytes, track, timestamp relative to the
+# cluster, whether it's a keyframe, and where its relative timestamp is stored
+Block = namedtuple("Block", ["offset", "size", "track", "timestamp", "keyframe", "timestamp_offset"])
+
+
+def read_element_id(data, offset):
+    first = data[offset]
+    length = 9 - first.bit_length()
+    if not first or length > 4:
+        raise ValueError(f"Broken Matroska element at byte {offset}")
+    return int.from_bytes(data[offset:offset + length], "big"), length
+
+
+def read_vint(data, offset):
+    # (value, length); the value is None for the reserved "unknown size"
+    first = data[offset]
+    if not first:
+        raise ValueError(f"Broken Matroska size at byte {offset}")
+    length = 9 - first.bit_length()
+    value = int.from_bytes(data[offset:offset + length], "big") & ((1 << 7 * length) - 1)
+    if value == (1 << 7 * length) - 1:
+        return None, length
+    return value, length
+
+
+def read_element(data, offset):
+    # (id, header size, data size or None)
+    first = data[offset]
+    if first & 0x80 and data[offset + 1] & 0x80 and data[offset + 1] != 0xFF:
+        # One-byte ID and size: the Timestamp, SimpleBlock and BlockGroup elements of small frames
+        return first, 2, data[offset + 1] & 0x7F
+    element_id, id_length = read_element_id(data, offset)
+    size, size_length = read_vint(data, offset + id_length)
+    return element_id, id_length + size_length, size
+
+
+def iter_elements(data, start, end):
+    # Yields (id, offset, header size, data size) of the elements in data[start:end]
+    offset = start
+    while offset < end:
+        element_id, header, size = read_element(data, offset)
+        if size is None:
+            raise ValueError("Unknown-size element inside a Matroska master element")
+        yield element_id, offset, header, size
+        offset += header + size
+
+
+def read_uint(data, offset, size):
+    return int.from_bytes(data[offset:offset + size], "big")
+
+
+def encode_size(value, length=None):
+    if length is None:
+        length = 1
+        while value >= (1 << 7 * length) - 1:
+            length += 1
+    return ((1 << 7 * length) | value).to_bytes(length, "big")
+
+
+def element(element_id, payload):
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big") + encode_size(len(payload)) + payload
+
+
+def uint_element(element_id, value):
+    return element(element_id, value.to_bytes(max((value.bit_length() + 7) // 8, 1), "big"))
+
+
+def parse_mkv(data):
+    # Reads the headers of a Matroska or WebM file; raises ValueError for anything else
+    if len(data) < 4 or read_uint(data, 0, 4) != EBML_HEADER:
+        raise ValueError("Not a Matroska file")
+    _, header, size = read_element(data, 0)
+    ebml_end = header + size
+    doc_type = None
+    for element_id, offset, child_header, child_size in iter_elements(data, header, ebml_end):
+        if element_id == DOC_TYPE:
+            doc_type = bytes(data[offset + child_header:offset + child_header + child_size]).rstrip(b"\0")
+    if doc_type not in (b"matroska", b"webm"):
+        raise ValueError("Not a Matroska file")
+
+    segment_id, segment_header, segment_size = read_element(data, ebml_end)
+    if segment_id != SEGMENT:
+        raise ValueError("Matroska file has no segment")
+    segment_data = ebml_end + segment_header
+    segment_end = len(data) if segment_size is None else min(segment_data + segment_size, len(data))
+
+    # Level 1 elements up to the first cluster, plus the ones the seek head points past it
+    elements = {}
+    seek_positions = []
+    first_cluster = None
+    offset = segment_data
+    while offset < segment_end:
+        element_id, header, size = read_element(data, offset)
+        if element_id == CLUSTER:
+            first_cluster = offset
+            break
+        if size is None:
+            raise ValueError("Unknown-size Matroska header element")
+        elements.setdefault(element_id, (offset, header + size))
+        if element_id == SEEK_HEAD:
+            for seek_id, seek, seek_header, seek_size in iter_elements(data, offset + header, offset + header + size):
+                if seek_id != SEEK:
+                    continue
+                target = position = None
+                for child_id, child, child_header, child_size in iter_elements(data, seek + seek_header, seek + seek_header + seek_size):
+                    if child_id == SEEK_ID:
+                        target = read_uint(data, child + child_header, child_size)
+                    elif child_id == SEEK_POSITION:
+                        position = read_uint(data, child + child_header, child_size)
+                if target is not None and position is not None:
+                    seek_positions.append((target, segment_data + position))
+        offset += header + size
+    if first_cluster is None:
+        raise ValueError("Matroska file has no clusters")
+    for target, position in seek_positions:
+        if target in elements or target == CLUSTER or position >= segment_end:
+            continue
+        try:
+            element_id, header, size = read_element(data, position)
+        except (ValueError, IndexError):
+            continue
+        if element_id == target and size is not None and position + header + size <= segment_end:
+            elements[element_id] = (position, header + size)
+
+    if INFO not in elements or TRACKS not in elements:
+        raise ValueError("Matroska file has no track headers")
+    timestamp_scale = 1000000
+    offset, size = elements[INFO]
+    _, header, _ = read_element(data, offset)
+    for element_id, child, child_header, child_size in iter_elements(data, offset + header, offset + size):
+        if element_id == TIMESTAMP_SCALE:
+            timestamp_scale = read_uint(data, child + child_header, child_size) or timestamp_scale
+
+    tracks = []
+    default_durations = {}
+    codec_delays = {}
+    offset, size = elements[TRACKS]
+    _, header, _ = read_element(data, offset)
+    for entry_id, entry, entry_header, entry_size in iter_elements(data, offset + header, offset + size):
+        if entry_id != TRACK_ENTRY:
+            continue
+        number = track_type = None
+        for element_id, child, child_header, child_size in iter_elements(data, entry + entry_header, entry + entry_header + entry_size):
+            value = read_uint(data, child + child_header, child_size) if child_size <= 8 else None
+            if element_id == TRACK_NUMBER:
+                number = value
+            elif element_id == TRACK_TYPE:
+                track_type = value
+            elif element_id == DEFAULT_DURATION and value:
+                default_durations[number] = value
+            elif element_id == CODEC_DELAY and value:
+                codec_delays[number] = value
+        if number is not None:
+            tracks.append((number, track_type))
+    if not tracks:
+        raise ValueError("Matroska file has no tracks")
+    # DefaultDuration and CodecDelay are in nanoseconds; keep them in timestamp ticks
+    default_durations = {number: duration / timestamp_scale for number, duration in default_durations.items() if number is not None}
+    codec_delays = {number: delay / timestamp_scale for number, delay in codec_delays.items() if number is not None}
+    reference_track = next((number for number, track_type in tracks if track_type == TRACK_TYPE_VIDEO), tracks[0][0])
+    return MkvInfo(bytes(data[:ebml_end]), segment_data, segment_end, timestamp_scale, tracks, reference_track, default_durations, codec_delays, elements, first_cluster)
+
+
+def read_mkv_info(input_file):
+    with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return parse_mkv(data)
+
+
+def _parse_block(data, offset, size):
+    # (track, relative timestamp, flags, offset of the timestamp) of a Block or SimpleBlock body
+    first = data[offset]
+    if first & 0x80:
+        # Track numbers below 127, which is nearly every file, take the one byte
+        track, length = first & 0x7F, 1
+    else:
+        track, length = read_vint(data, offset)
+    if track is None or length + 3 > size:
+        raise ValueError(f"Broken Matroska block at byte {offset}")
+    return track, struct.unpack_from(">h", data, offset + length)[0], data[offset + length + 2], offset + length
+
+
+def read_cluster(data, offset, segment_end):
+    # (end offset, timestamp, blocks) of the cluster at offset. Clusters written live may have
+    # an unknown size; those end where the next top-level element starts.
+    _, header, size = read_element(data, offset)
+    end = segment_end if size is None else min(offset + header + size, segment_end)
+    timestamp = 0
+    blocks = []
+    child = offset + header
+    while child < end:
+        try:
+            element_id, child_header, child_size = read_element(data, child)
+        except IndexError:
+            break
+        if size is None and element_id in SEGMENT_CHILDREN:
+            end = child
+            break
+        if child_size is None or child + child_header + child_size > end:
+            # A recording cut off mid-cluster; keep what's complete
+            end = child
+            break
+        body = child + child_header
+        if element_id == CLUSTER_TIMESTAMP:
+            timestamp = read_uint(data, body, child_size)
+        elif element_id == SIMPLE_BLOCK:
+            track, relative, flags, timestamp_offset = _parse_block(data, body, child_size)
+            blocks.append(Block(child, child_header + child_size, track, relative, bool(flags & 0x80), timestamp_offset))
+        elif element_id == BLOCK_GROUP:
+            block = None
+            referenced = False
+            for group_id, group_child, group_header, group_size in iter_elements(data, body, body + child_size):
+                if group_id == BLOCK:
+                    block = _parse_block(data, group_child + group_header, group_size)
+                elif group_id == REFERENCE_BLOCK:
+                    referenced = True
+            if block is not None:
+                track, relative, _, timestamp_offset = block
+                blocks.append(Block(child, child_header + child_size, track, relative, not referenced, timestamp_offset))
+        child = body + child_size
+    return end, timestamp, blocks
+
+
+def iter_clusters(data, info, offset):
+    # Yields (offset, end, timestamp, blocks) of the clusters from offset on, skipping other elements
+    while offset < info.segment_end:
+        try:
+            element_id, header, size = read_element(data, offset)
+        except (ValueError, IndexError):
+            return
+        if element_id != CLUSTER:
+            if size is None:
+                return
+            offset += header + size
+            continue
+        end, timestamp, blocks = read_cluster(data, offset, info.segment_end)
+        yield offset, end, timestamp, blocks
+        if end <= offset:
+            return
+        offset = end
+
+
+class CueIndex:
+    # Keyframe times of the reference track (in timestamp ticks) and the offsets of their clusters
+    def __init__(self, times, clusters):
+        self.times = times
+        self.clusters = clusters
+
+    def cluster_at_or_before(self, ticks):
+        i = bisect_right(self.times, ticks)
+        return self.clusters[i - 1] if i else None
+
+    def to_bytes(self):
+        return INDEX_HEADER.pack(INDEX_MAGIC, len(self.times)) + self.times.tobytes() + self.clusters.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, count = INDEX_HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a Matroska cue index")
+        times, clusters = array("q"), array("q")
+        offset = INDEX_HEADER.size
+        times.frombytes(data[offset:offset + 8 * count])
+        clusters.frombytes(data[offset + 8 * count:offset + 16 * count])
+        if len(times) != count or len(clusters) != count:
+            raise ValueError("Truncated Matroska cue index")
+        return cls(times, clusters)
+
+
+def read_cues(data, info):
+    # The file's own Cues for the reference track, or None
+    if CUES not in info.elements:
+        return None
+    offset, size = info.elements[CUES]
+    _, header, _ = read_element(data, offset)
+    points = []
+    for point_id, point, point_header, point_size in iter_elements(data, offset + header, offset + size):
+        if point_id != CUE_POINT:
+            continue
+        time = None
+        positions = []
+        for element_id, child, child_header, child_size in iter_elements(data, point + point_header, point + point_header + point_size):
+            if element_id == CUE_TIME:
+                time = read_uint(data, child + child_header, child_size)
+            elif element_id == CUE_TRACK_POSITIONS:
+                track = cluster = None
+                for position_id, value, value_header, value_size in iter_elements(data, child + child_header, child + child_header + child_size):
+                    if position_id == CUE_TRACK:
+                        track = read_uint(data, value + value_header, value_size)
+                    elif position_id == CUE_CLUSTER_POSITION:
+                        cluster = read_uint(data, value + value_header, value_size)
+                positions.append((track, cluster))
+        for track, cluster in positions:
+            if time is not None and track == info.reference_track and cluster is not None:
+                points.append((time, info.segment_data + cluster))
+    if not points:
+        return None
+    points.sort()
+    return CueIndex(array("q", (time for time, _ in points)), array("q", (cluster for _, cluster in points)))
+
+
+def scan_cues(data, info):
+    # Builds the index from the clusters for files written without Cues, e.g. by a live recorder
+    times, clusters = array("q"), array("q")
+    for offset, _, timestamp, blocks in iter_clusters(data, info, info.first_cluster):
+        for block in blocks:
+            if block.track == info.reference_track and block.keyframe:
+                times.append(timestamp + block.timestamp)
+                clusters.append(offset)
+    return CueIndex(times, clusters)
+
+
+def get_cue_index(input_file, data, info):
+    index = read_cues(data, info)
+    if index is not None:
+        return index
+    return cached_index(
+        file_cache_key(input_file), _memory_cache, _disk_cache,
+        lambda: scan_cues(data, info), CueIndex.to_bytes, CueIndex.from_bytes,
+    )
+
+
+def first_timestamp(data, info):
+    # Earliest block time of the first cluster with blocks, less the codec delay ffmpeg takes off
+    # audio like AAC's priming; that is ffmpeg's start time for the file
+    for _, _, timestamp, blocks in iter_clusters(data, info, info.first_cluster):
+        if blocks:
+            return timestamp + min(block.timestamp - info.codec_delays.get(block.track, 0) for block in blocks)
+    return 0
+
+
+def find_start_keyframe(data, info, cluster, start_ticks):
+    # (cluster offset, block offset, timestamp) of the last reference keyframe at or before start_ticks
+    found = None
+    for offset, _, timestamp, blocks in iter_clusters(data, info, cluster):
+        for block in blocks:
+            if block.track != info.reference_track or not block.keyframe:
+                continue
+            time = timestamp + block.timestamp
+            if time > start_ticks:
+                return found or (offset, block.offset, time)
+            found = (offset, block.offset, time)
+    return found
+
+
+def filtered_tags(data, offset, size):
+    # The Tags element without the whole-file statistics tags
+    _, header, _ = read_element(data, offset)
+    tags = []
+    for tag_id, tag, tag_header, tag_size in iter_elements(data, offset + header, offset + size):
+        if tag_id != TAG:
+            continue
+        children = []
+        simple_tags = 0
+        for child_id, child, child_header, child_size in iter_elements(data, tag + tag_header, tag + tag_header + tag_size):
+            if child_id == SIMPLE_TAG:
+                name = None
+                for name_id, name_offset, name_header, name_size in iter_elements(data, child + child_header, child + child_header + child_size):
+                    if name_id == TAG_NAME:
+                        name = bytes(data[name_offset + name_header:name_offset + name_header + name_size]).rstrip(b"\0").upper()
+                if name in STATISTICS_TAGS:
+                    continue
+                simple_tags += 1
+            children.append(bytes(data[child:child + child_header + child_size]))
+        if simple_tags:
+            tags.append(element(TAG, b"".join(children)))
+    return element(TAGS, b"".join(tags)) if tags else b""
+
+
+def segment_info(data, info, duration_ticks):
+    # The Info element with the cut's duration
+    offset, size = info.elements[INFO]
+    _, header, _ = read_element(data, offset)
+    children = [
+        bytes(data[child:child + child_header + child_size])
+        for element_id, child, child_header, child_size in iter_elements(data, offset + header, offset + size)
+        if element_id not in (DURATION, VOID, CRC_32)
+    ]
+    children.append(element(DURATION, struct.pack(">d", float(duration_ticks))))
+    return element(INFO, b"".join(children))
+
+
+class OutputCluster:
+    # A cluster of the cut: its rebased timestamp, the source ranges and patched blocks it is
+    # made of, and the cue points (time, position in the cluster body) of its keyframes
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+        self.head = uint_element(CLUSTER_TIMESTAMP, timestamp)
+        self.pieces = []
+        self.cues = []
+        self.size = len(self.head)
+
+    def add(self, data, block, shift):
+        if shift:
+            patched = bytearray(data[block.offset:block.offset + block.size])
+            struct.pack_into(">h", patched, block.timestamp_offset - block.offset, block.timestamp + shift)
+            self.pieces.append(bytes(patched))
+        elif self.pieces and isinstance(self.pieces[-1], list) and self.pieces[-1][0] + self.pieces[-1][1] == block.offset:
+            self.pieces[-1][1] += block.size
+        else:
+            self.pieces.append([block.offset, block.size])
+        self.size += block.size
+
+    def element_size(self):
+        return len(encode_size(self.size)) + 4 + self.size
+
+
+def select_clusters(data, info, keyframe, end_ticks):
+    # Walks the clusters from the start keyframe and keeps the blocks of the cut, rebased to it.
+    # Reference blocks stamped past the end are kept when a later block in decode order still
+    # falls in the range, since that one may be predicted from them.
+    cluster_offset, keyframe_offset, start_ticks = keyframe
+    reorder_ticks = REORDER_SECONDS * 1e9 / info.timestamp_scale
+    reference = info.reference_track
+    clusters = []
+    pending = []
+    started = False
+    content_end = start_ticks
+    for offset, _, timestamp, blocks in iter_clusters(data, info, cluster_offset):
+        if timestamp >= end_ticks + reorder_ticks:
+            break
+        new_timestamp = max(timestamp - start_ticks, 0)
+        shift = timestamp - start_ticks - new_timestamp
+        cluster = OutputCluster(new_timestamp)
+        clusters.append(cluster)
+        stop = False
+        for block in blocks:
+            time = timestamp + block.timestamp
+            if block.track != reference:
+                if start_ticks <= time < end_ticks:
+                    cluster.add(data, block, shift)
+                    content_end = max(content_end, time + info.default_durations.get(block.track, 0))
+                continue
+            if not started:
+                if block.offset != keyframe_offset:
+                    continue
+                started = True
+            if time < start_ticks:
+                # Leading frames of an open GOP refer to the one before the cut
+                continue
+            if time >= end_ticks:
+                if block.keyframe or time >= end_ticks + reorder_ticks:
+                    stop = True
+                    break
+                pending.append((cluster, block, shift, time))
+                continue
+            for held_cluster, held, held_shift, held_time in pending:
+                held_cluster.add(data, held, held_shift)
+                content_end = max(content_end, held_time + info.default_durations.get(reference, 0))
+            pending = []
+            if block.keyframe:
+                cluster.cues.append((time - start_ticks, cluster.size))
+            cluster.add(data, block, shift)
+            content_end = max(content_end, time + info.default_durations.get(reference, 0))
+        if stop:
+            break
+    # Blocks held back for a reference frame that never came are dropped in order, so the
+    # pieces of every cluster stay in file order
+    clusters = [cluster for cluster in clusters if cluster.pieces]
+    return clusters, content_end - start_ticks
+
+
+def cues_element(clusters, cue_track, positions):
+    points = []
+    for cluster, position in zip(clusters, positions):
+        for time, relative in cluster.cues:
+            track_positions = uint_element(CUE_TRACK, cue_track) + uint_element(CUE_CLUSTER_POSITION, position) + uint_element(CUE_RELATIVE_POSITION, relative)
+            points.append(element(CUE_POINT, uint_element(CUE_TIME, time) + element(CUE_TRACK_POSITIONS, track_positions)))
+    return element(CUES, b"".join(points)) if points else b""
+
+
+def seek_head(entries):
+    # SeekPosition is always 8 bytes so the seek head's size doesn't depend on where things land
+    seeks = b"".join(
+        element(SEEK, element(SEEK_ID, element_id.to_bytes(4, "big")) + element(SEEK_POSITION, position.to_bytes(8, "big")))
+        for element_id, position in entries
+    )
+    return element(SEEK_HEAD, seeks)
+
+
+def cut_mkv(input_file, output_file, start_seconds, end_seconds, progress=None, cancel=None):
+    # Jumps to the start through the Cues and copies the blocks of the range into new clusters
+    # rebased to the keyframe the cut starts on, followed by new Cues. Nothing is demuxed
+    # outside the range and the output is written in one pass.
+    if end_seconds <= start_seconds:
+        raise ValueError("End time must be after start time")
+
+    with open(input_file, "rb") as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        info = parse_mkv(data)
+        ticks_per_second = 1e9 / info.timestamp_scale
+        # Times count from the file's start time like ffmpeg's -ss, not from timestamp zero
+        start_time = first_timestamp(data, info)
+        start_ticks = (start_seconds + START_TOLERANCE) * ticks_per_second + start_time
+        end_ticks = end_seconds * ticks_per_second + start_time
+        index = get_cue_index(input_file, data, info)
+        keyframe = find_start_keyframe(data, info, index.cluster_at_or_before(start_ticks) or info.first_cluster, start_ticks)
+        if keyframe is None or keyframe[2] >= end_ticks:
+            raise ValueError("Nothing to cut in the requested range")
+        clusters, duration_ticks = select_clusters(data, info, keyframe, end_ticks)
+        if not clusters:
+            raise ValueError("Nothing to cut in the requested range")
+
+        # Everything's size is known up front, so the seek head and cues can point forward
+        header_elements = [(INFO, segment_info(data, info, duration_ticks))]
+        header_elements.append((TRACKS, bytes(data[info.elements[TRACKS][0]:sum(info.elements[TRACKS])])))
+        for element_id in KEPT_ELEMENTS:
+            if element_id in info.elements:
+                offset, size = info.elements[element_id]
+                body = filtered_tags(data, offset, size) if element_id == TAGS else bytes(data[offset:offset + size])
+                if body:
+                    header_elements.append((element_id, body))
+        entries = [(element_id, 0) for element_id, _ in header_elements]
+        if any(cluster.cues for cluster in clusters):
+            entries.append((CUES, 0))
+        position = len(seek_head(entries))
+        entries = []
+        for element_id, body in header_elements:
+            entries.append((element_id, position))
+            position += len(body)
+        cluster_positions = []
+        for cluster in clusters:
+            cluster_positions.append(position)
+            position += cluster.element_size()
+        cues = cues_element(clusters, info.reference_track, cluster_positions)
+        if cues:
+            entries.append((CUES, position))
+        head = seek_head(entries) + b"".join(body for _, body in header_elements)
+        segment_size = len(head) + sum(cluster.element_size() for cluster in clusters) + len(cues)
+
+        duration = duration_ticks / ticks_per_second
+        total = sum(cluster.size for cluster in clusters)
+        reporter = ProgressReporter(duration, progress) if progress else None
+        if reporter:
+            reporter.track(duration)
+
+        with open(output_file, "wb", buffering=0) as target:
+            write_all(target, info.ebml_header + SEGMENT.to_bytes(4, "big") + encode_size(segment_size, 8) + head)
+            written = 0
+            for cluster in clusters:
+                write_all(target, CLUSTER.to_bytes(4, "big") + encode_size(cluster.size) + cluster.head)
+                for piece in cluster.pieces:
+                    if isinstance(piece, bytes):
+                        write_all(target, piece)
+                    else:
+                        copy_range(source, data, target, piece[0], piece[1], cancel=cancel)
+                written += cluster.size
+                if reporter:
+                    reporter.advance(duration * written / total, written)
+            write_all(target, cues)
+
+    if reporter:
+        reporter.report(force=True)
@@ -0,0 +1,387 @@
+import mmap
+import struct
+from array import array
+from collections import namedtuple
+
+from disk_cache import DiskCache, LRUCache, cached_index, file_cache_key
+from file_copy import copy_range, write_all
+from progress import ProgressReporter
+
+# Layer III bit rates in kbit/s by header index, for MPEG-1 and for MPEG-2/2.5
+MPEG1_BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+MPEG2_BITRATES = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+
+# Sample rates by version bits (0: MPEG-2.5, 2: MPEG-2, 3: MPEG-1) and header index
+SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+
+# Every Layer III decoder outputs this many samples of its own delay before the first encoded one
+DECODER_DELAY = 529
+
+# Encoder delay and padding share three bytes of the LAME tag
+MAX_DELAY = 4095
+
+# A decoder's output only matches the source's once this many samples have gone through its
+# overlap-add and synthesis filter bank: one MPEG-1 frame, or two MPEG-2/2.5 frames
+PREROLL_SAMPLES = 1152
+
+# Demuxers (ffmpeg's among them) only take a stream for MP3 after two frames in a row
+MIN_FRAMES = 2
+
+# The furthest back main_data_begin can point (MPEG-1; MPEG-2 stops at 255)
+MAX_RESERVOIR = 511
+
+# Tags that say the LAME extension after the Xing header carries delay and padding
+LAME_ENCODERS = (b"LAME", b"Lavf", b"Lavc")
+DEFAULT_ENCODER = b"LAME3.100"
+XING_SIZE = 120
+LAME_SIZE = 36
+
+# Frame indexes are compact offset arrays, a few hundred kB per hour of audio
+FRAME_CACHE_MAX_BYTES = 64 * 1024 * 1024
+INDEX_MAGIC = b"VC4UMPI1"
+INDEX_HEADER = struct.Struct("<8sQ")
+
+_disk_cache = DiskCache("mp3_frames", FRAME_CACHE_MAX_BYTES)
+_memory_cache = LRUCache(8)
+
+# size is the whole frame; side_info_offset/size locate the side info, whose first bits are main_data_begin
+FrameHeader = namedtuple("FrameHeader", ["size", "mpeg1", "sample_rate", "bitrate_index", "side_info_offset", "side_info_size"])
+
+# delay/padding are the encoder delay and padding from the LAME tag (None without one); lame is its 36 bytes
+Mp3Info = namedtuple("Mp3Info", ["id3v2_size", "first_frame", "audio_end", "header", "delay", "padding", "quality", "lame"])
+
+
+def lame_crc16(data):
+    # CRC-16/ARC, as used for the LAME tag checksum
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = crc >> 1 ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+
+def parse_frame_header(data, offset):
+    # Layer III headers only; None for anything else, including free-format frames
+    header = data[offset:offset + 4]
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = header[1] >> 3 & 3
+    if version == 1 or header[1] >> 1 & 3 != 1:
+        return None
+    bitrate_index = header[2] >> 4
+    rate_index = header[2] >> 2 & 3
+    if bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = (MPEG1_BITRATES if mpeg1 else MPEG2_BITRATES)[bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    size = (144 if mpeg1 else 72) * bitrate // sample_rate + (header[2] >> 1 & 1)
+    mono = header[3] >> 6 == 3
+    side_info_size = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+    # A cleared protection bit means a 16-bit CRC follows the header
+    side_info_offset = 4 if header[1] & 1 else 6
+    return FrameHeader(size, mpeg1, sample_rate, bitrate_index, side_info_offset, side_info_size)
+
+
+def samples_per_frame(header):
+    return 1152 if header.mpeg1 else 576
+
+
+def main_data_begin(data, offset, header):
+    # How many bytes of earlier frames' data this frame borrows from the bit reservoir
+    side = offset + header.side_info_offset
+    if header.mpeg1:
+        return data[side] << 1 | data[side + 1] >> 7
+    return data[side]
+
+
+def main_data_size(header):
+    return header.size - header.side_info_offset - header.side_info_size
+
+
+def main_data(data, offset, header):
+    return data[offset + header.side_info_offset + header.side_info_size:offset + header.size]
+
+
+def empty_frame(first_frame, header, payload_size):
+    # A frame of silence (all side info zero) like first_frame, at the lowest bit rate that
+    # leaves payload_size bytes after the side info. Without a CRC, so the payload is free to use.
+    table = MPEG1_BITRATES if header.mpeg1 else MPEG2_BITRATES
+    for bitrate_index in [header.bitrate_index] + list(range(1, 15)):
+        size = (144 if header.mpeg1 else 72) * table[bitrate_index] * 1000 // header.sample_rate
+        if size >= 4 + header.side_info_size + payload_size:
+            break
+    frame = bytearray(size)
+    frame[0] = 0xFF
+    frame[1] = first_frame[1] | 1
+    frame[2] = bitrate_index << 4 | first_frame[2] & 0x0D
+    frame[3] = first_frame[3]
+    return frame, bitrate_index
+
+
+def id3v2_size(data):
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = 0
+        for byte in data[6:10]:
+            size = size << 7 | byte & 0x7F
+        return 10 + size + (10 if data[5] & 0x10 else 0)
+    return 0
+
+
+def _audio_end(data):
+    # Leaves out an ID3v1 tag and an APEv2 tag in front of it
+    end = len(data)
+    if end >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    if end >= 32 and data[end - 32:end - 24] == b"APETAGEX":
+        size = struct.unpack_from("<I", data, end - 20)[0]
+        flags = struct.unpack_from("<I", data, end - 12)[0]
+        end -= size + (32 if flags & 0x80000000 else 0)
+    return end
+
+
+def _find_frame(data, offset, end):
+    # The next offset where two valid frames follow each other, so sync-like bytes in tags don't count
+    while offset < end:
+        header = parse_frame_header(data, offset)
+        if header is not None:
+            following = offset + header.size
+            if following >= end or parse_frame_header(data, following) is not None:
+                return offset, header
+        offset = data.find(b"\xff", offset + 1, end)
+        if offset < 0:
+            break
+    raise ValueError("No MP3 frames found")
+
+
+def _lame_tag(data, offset, header):
+    # (delay, padding, quality, 36 LAME bytes) from a Xing/Info frame, or None if this frame is audio
+    tag = offset + header.side_info_offset + header.side_info_size
+    if data[tag:tag + 4] not in (b"Xing", b"Info"):
+        return None
+    flags = struct.unpack_from(">I", data, tag + 4)[0]
+    position = tag + 8
+    quality = 0
+    for flag, size in ((1, 4), (2, 4), (4, 100), (8, 4)):
+        if flags & flag:
+            if flag == 8:
+                quality = struct.unpack_from(">I", data, position)[0]
+            position += size
+    lame = bytes(data[position:position + LAME_SIZE])
+    if len(lame) < LAME_SIZE or lame[:4] not in LAME_ENCODERS:
+        return None, None, quality, None
+    delay_padding = int.from_bytes(lame[21:24], "big")
+    return delay_padding >> 12, delay_padding & 0xFFF, quality, lame
+
+
+def parse_mp3(data):
+    # Raises ValueError for anything that isn't Layer III audio
+    start = id3v2_size(data)
+    end = _audio_end(data)
+    first, header = _find_frame(data, start, end)
+    delay = padding = lame = None
+    quality = 0
+    tag = _lame_tag(data, first, header)
+    if tag is not None:
+        delay, padding, quality, lame = tag
+        first += header.size
+    elif data[first + 36:first + 40] == b"VBRI":
+        first += header.size
+    return Mp3Info(start, first, end, header, delay, padding, quality, lame)
+
+
+def read_mp3_info(input_file):
+    with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return parse_mp3(data)
+
+
+def scan_frames(data, info):
+    # Offsets of every audio frame. Frames follow each other back to back; after junk the
+    # scan picks up at the next frame with the same version, layer and sample rate.
+    offsets = array("q")
+    key = (info.header.mpeg1, info.header.sample_rate)
+    offset = info.first_frame
+    while offset + 4 <= info.audio_end:
+        header = parse_frame_header(data, offset)
+        if header is None or (header.mpeg1, header.sample_rate) != key:
+            try:
+                offset, header = _find_frame(data, offset + 1, info.audio_end)
+            except ValueError:
+                break
+            if (header.mpeg1, header.sample_rate) != key:
+                offset += 1
+                continue
+        if offset + header.size > info.audio_end:
+            break
+        offsets.append(offset)
+        offset += header.size
+    return offsets
+
+
+def get_frame_offsets(input_file, data, info):
+    return cached_index(
+        file_cache_key(input_file), _memory_cache, _disk_cache,
+        lambda: scan_frames(data, info), dump_frame_offsets, load_frame_offsets,
+    )
+
+
+def dump_frame_offsets(offsets):
+    return INDEX_HEADER.pack(INDEX_MAGIC, len(offsets)) + offsets.tobytes()
+
+
+def load_frame_offsets(data):
+    magic, count = INDEX_HEADER.unpack_from(data)
+    if magic != INDEX_MAGIC:
+        raise ValueError("Not an MP3 frame index")
+    offsets = array("q")
+    offsets.frombytes(data[INDEX_HEADER.size:INDEX_HEADER.size + offsets.itemsize * count])
+    if len(offsets) != count:
+        raise ValueError("Truncated MP3 frame index")
+    return offsets
+
+
+def info_frame(info, first_header, first_frame, frame_sizes, bitrates, delay, padding):
+    # A Xing/Info frame of silence that tells gapless decoders the frame count, a seek TOC and,
+    # in the LAME tag, how many samples to drop at either end
+    frame, _ = empty_frame(first_frame, first_header, XING_SIZE + LAME_SIZE)
+    size = len(frame)
+    total_bytes = size + sum(frame_sizes)
+    toc = bytearray(100)
+    position = size
+    positions = []
+    for frame_size in frame_sizes:
+        positions.append(position)
+        position += frame_size
+    for i in range(100):
+        toc[i] = min(255, 256 * positions[i * len(positions) // 100] // total_bytes)
+
+    tag = 4 + first_header.side_info_size
+    frame[tag:tag + 4] = b"Xing" if len(bitrates) > 1 else b"Info"
+    struct.pack_into(">III", frame, tag + 4, 0x0F, len(frame_sizes), total_bytes)
+    frame[tag + 16:tag + 116] = toc
+    struct.pack_into(">I", frame, tag + 116, info.quality)
+
+    lame = bytearray(info.lame or DEFAULT_ENCODER.ljust(LAME_SIZE, b"\0"))
+    lame[11:19] = bytes(8)  # replay gain was measured over the whole input
+    lame[21:24] = (delay << 12 | padding).to_bytes(3, "big")
+    lame[28:32] = total_bytes.to_bytes(4, "big")
+    lame[32:34] = bytes(2)  # the music CRC would need a pass over every byte
+    frame[tag + XING_SIZE:tag + XING_SIZE + LAME_SIZE] = lame
+    crc_end = tag + XING_SIZE + LAME_SIZE - 2
+    frame[crc_end:crc_end + 2] = lame_crc16(frame[:crc_end]).to_bytes(2, "big")
+    return bytes(frame)
+
+
+def trim_fits(info, start_sample, end_sample):
+    # ffmpeg gives every frame the end trim touches a start trim of its own, of nothing, which
+    # cuts short a start trim still running on from the frames before. So both trims only
+    # share a frame when the start trim is over within the first one.
+    spf = samples_per_frame(info.header)
+    decoded_start = start_sample + (info.delay + DECODER_DELAY if info.delay is not None else 0)
+    if DECODER_DELAY <= decoded_start < spf:
+        return True
+    return decoded_start % spf + end_sample - start_sample >= spf
+
+
+def cut_mp3(input_file, output_file, start_seconds, end_seconds, progress=None, cancel=None):
+    # Copies whole frames and lets the LAME tag trim the result to the exact samples in
+    # gapless decoders
+    if end_seconds <= start_seconds:
+        raise ValueError("End time must be after start time")
+
+    with open(input_file, "rb") as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        info = parse_mp3(data)
+        offsets = get_frame_offsets(input_file, data, info)
+        if not offsets:
+            raise ValueError("No MP3 frames found")
+        spf = samples_per_frame(info.header)
+        sample_rate = info.header.sample_rate
+        count = len(offsets)
+
+        # Positions in the decoder's output, which starts with the original encoder and decoder delay
+        lead = 0
+        total = count * spf
+        if info.delay is not None:
+            lead = info.delay + DECODER_DELAY
+            total -= info.delay + info.padding
+        start_sample = int(round(start_seconds * sample_rate))
+        end_sample = min(int(round(end_seconds * sample_rate)), total)
+        if end_sample <= start_sample:
+            raise ValueError("Nothing to cut in the requested range")
+        if not trim_fits(info, start_sample, end_sample):
+            raise ValueError("The range is too short to cut from this MP3 without re-encoding")
+
+        # The frames before the first wanted one are kept too, since its output overlaps them.
+        # Whatever these frames borrow from the bit reservoir goes into one silent frame in
+        # front of them, so the preroll stays short enough for the delay field.
+        decoded_start = start_sample + lead
+        keep = max((decoded_start - PREROLL_SAMPLES) // spf, 0)
+        borrowed = 0
+        available = 0
+        j = keep
+        while j < count and available < MAX_RESERVOIR:
+            header = parse_frame_header(data, offsets[j])
+            borrowed = max(borrowed, main_data_begin(data, offsets[j], header) - available)
+            available += main_data_size(header)
+            j += 1
+        reservoir = b""
+        j = keep
+        while len(reservoir) < borrowed and j > 0:
+            j -= 1
+            reservoir = main_data(data, offsets[j], parse_frame_header(data, offsets[j])) + reservoir
+        reservoir = reservoir[len(reservoir) - borrowed:].rjust(borrowed, b"\0")
+
+        first_header = parse_frame_header(data, offsets[keep])
+        first_frame = data[offsets[keep]:offsets[keep] + 4]
+        leading = []
+        if borrowed:
+            frame, bitrate_index = empty_frame(first_frame, first_header, borrowed)
+            frame[len(frame) - borrowed:] = reservoir
+            leading.append((bytes(frame), bitrate_index))
+
+        # Gapless decoders always drop the decoder delay. A source without a LAME tag plays it,
+        # so a cut from its first frames gets silent frames in front to have a delay to drop.
+        # They leave the decoder exactly as a fresh one would be.
+        gap = decoded_start - (keep - len(leading)) * spf
+        if gap < DECODER_DELAY:
+            frame, bitrate_index = empty_frame(first_frame, first_header, 0)
+            leading[:0] = [(bytes(frame), bitrate_index)] * -(-(DECODER_DELAY - gap) // spf)
+
+        output_start = (keep - len(leading)) * spf
+        delay = min(decoded_start - output_start - DECODER_DELAY, MAX_DELAY)
+        # Past the end of the source, silent frames make up the minimum
+        wanted = max(-(-(delay + DECODER_DELAY + end_sample - start_sample) // spf), MIN_FRAMES)
+        last = min(keep + wanted - len(leading), count)
+        trailing = []
+        if keep + wanted - len(leading) > last:
+            frame, bitrate_index = empty_frame(first_frame, first_header, 0)
+            trailing = [(bytes(frame), bitrate_index)] * (keep + wanted - len(leading) - last)
+        padding = min(wanted * spf - delay - (end_sample - start_sample), MAX_DELAY)
+
+        last_size = parse_frame_header(data, offsets[last - 1]).size
+        copy_start = offsets[keep]
+        copy_size = offsets[last - 1] + last_size - copy_start
+        frame_sizes = [len(frame) for frame, _ in leading]
+        frame_sizes += [offsets[i + 1] - offsets[i] for i in range(keep, last - 1)] + [last_size]
+        frame_sizes += [len(frame) for frame, _ in trailing]
+        bitrates = {bitrate_index for _, bitrate_index in leading + trailing}
+        bitrates.update(data[offsets[i] + 2] >> 4 for i in range(keep, last))
+
+        duration = (end_sample - start_sample) / sample_rate
+        reporter = ProgressReporter(duration, progress) if progress else None
+        if reporter:
+            reporter.track(duration)
+
+        with open(output_file, "wb", buffering=0) as target:
+            write_all(target, data[:info.id3v2_size])
+            write_all(target, info_frame(info, first_header, first_frame, frame_sizes, bitrates, delay, padding))
+            for frame, _ in leading:
+                write_all(target, frame)
+            on_copied = (lambda copied: reporter.advance(duration * copied / copy_size, copied)) if reporter else None
+            copy_range(source, data, target, copy_start, copy_size, cancel=cancel, on_copied=on_copied)
+            for frame, _ in trailing:
+                write_all(target, frame)
+
+    if reporter:
+        reporter.report(force=True)
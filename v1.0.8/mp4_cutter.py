@@ -0,0 +1,549 @@
+import heapq
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from file_copy import copy_range, write_all
+from progress import ProgressReporter
+
+# Handler types kept by each stream selection; None keeps every track
+TRACK_HANDLERS = {
+    "all": None,
+    "av": (b"vide", b"soun"),
+    "video": (b"vide",),
+    "audio": (b"soun",),
+}
+
+# Sample table boxes rebuilt for the cut; other stbl children are copied as they are
+SAMPLE_TABLE_BOXES = {b"stts", b"ctts", b"stss", b"stsc", b"stsz", b"stz2", b"stco", b"co64", b"sdtp"}
+
+# Per-sample side tables that would need rewriting too; the cut leaves them out
+DROPPED_BOXES = {b"sbgp", b"sgpd", b"subs", b"saiz", b"saio", b"stps", b"padb", b"cslg"}
+
+# Boxes an MP4 file can start with
+TOP_LEVEL_BOXES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pdin", b"uuid"}
+
+ENCRYPTED_ENTRIES = {b"encv", b"enca", b"encs", b"enct"}
+
+MAX_32BIT = 0xFFFFFFFF
+
+AUDIO_PREROLL_SAMPLES = 1
+
+# Half a frame at 1000 fps, so a start given in rounded seconds still finds its keyframe
+START_TOLERANCE = 0.0005
+
+
+def iter_boxes(data, start=0, end=None):
+    # Yields (type, offset, header size, total size) of the boxes in data[start:end]
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise ValueError(f"Broken {box_type.decode('latin-1')} box at byte {offset}")
+        yield box_type, offset, header, size
+        offset += size
+
+
+def find_box(data, start, end, path):
+    # (offset, header size, size) of the first box along path, e.g. [b"mdia", b"minf"], or None
+    for box_type, offset, header, size in iter_boxes(data, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return offset, header, size
+            return find_box(data, offset + header, offset + size, path[1:])
+    return None
+
+
+def box(box_type, payload):
+    if len(payload) + 8 > MAX_32BIT:
+        return struct.pack(">I4sQ", 1, box_type, len(payload) + 16) + payload
+    return struct.pack(">I4s", len(payload) + 8, box_type) + payload
+
+
+def full_box(box_type, version, flags, payload):
+    return box(box_type, struct.pack(">I", version << 24 | flags) + payload)
+
+
+def _big_endian(typecode, data):
+    values = array(typecode, data)
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values
+
+
+def _box_payload(data, found):
+    offset, header, size = found
+    return data[offset + header:offset + size]
+
+
+class Track:
+    # One trak with its sample timing and sizes expanded to per-sample arrays in decode order
+    def __init__(self, moov, offset, header, size, movie_timescale):
+        self.box = (offset, header, size)
+        start, end = offset + header, offset + size
+        hdlr = find_box(moov, start, end, [b"mdia", b"hdlr"])
+        mdhd = find_box(moov, start, end, [b"mdia", b"mdhd"])
+        if hdlr is None or mdhd is None:
+            raise ValueError("Track without a media header")
+        self.handler = _box_payload(moov, hdlr)[8:12]
+        mdhd = _box_payload(moov, mdhd)
+        self.timescale = struct.unpack_from(">I", mdhd, 20 if mdhd[0] == 1 else 12)[0]
+        if not self.timescale:
+            raise ValueError("Track without a timescale")
+
+        # Presentation time of media time t is empty_seconds + (t - media_time) / timescale
+        self.empty_seconds = 0.0
+        self.media_time = 0
+        elst = find_box(moov, start, end, [b"edts", b"elst"])
+        if elst:
+            payload = _box_payload(moov, elst)
+            version = payload[0]
+            count = struct.unpack_from(">I", payload, 4)[0]
+            entry = ">Qq" if version == 1 else ">Ii"
+            step = 20 if version == 1 else 12
+            for i in range(count):
+                duration, media_time = struct.unpack_from(entry, payload, 8 + i * step)
+                if media_time == -1:
+                    self.empty_seconds += duration / movie_timescale
+                else:
+                    self.media_time = media_time
+                    break
+
+        stbl_box = find_box(moov, start, end, [b"mdia", b"minf", b"stbl"])
+        if stbl_box is None:
+            raise ValueError("Track without a sample table")
+        stbl_start = stbl_box[0] + stbl_box[1]
+        stbl_end = stbl_box[0] + stbl_box[2]
+        tables = {box_type: moov[child + child_header:child + child_size] for box_type, child, child_header, child_size in iter_boxes(moov, stbl_start, stbl_end)}
+        if b"stsd" not in tables:
+            raise ValueError("Track without sample descriptions")
+        for entry_type, _, _, _ in iter_boxes(tables[b"stsd"], 8):
+            if entry_type in ENCRYPTED_ENTRIES:
+                raise ValueError("Encrypted MP4 tracks can't be cut without ffmpeg")
+        self.parse_samples(tables)
+
+    def parse_samples(self, tables):
+        if b"stsz" in tables:
+            stsz = tables[b"stsz"]
+            sample_size, count = struct.unpack_from(">II", stsz, 4)
+            self.sizes = array("q", [sample_size] * count) if sample_size else array("q", _big_endian("I", stsz[12:12 + 4 * count]))
+        elif b"stz2" in tables:
+            stz2 = tables[b"stz2"]
+            field_size, count = stz2[7], struct.unpack_from(">I", stz2, 8)[0]
+            raw = stz2[12:]
+            if field_size == 4:
+                values = [byte >> shift & 0x0F for byte in raw for shift in (4, 0)][:count]
+            elif field_size == 8:
+                values = list(raw[:count])
+            else:
+                values = _big_endian("H", raw[:2 * count])
+            self.sizes = array("q", values)
+        else:
+            raise ValueError("Track without sample sizes")
+        count = len(self.sizes)
+
+        durations = array("q")
+        stts = tables.get(b"stts", bytes(8))
+        for i in range(struct.unpack_from(">I", stts, 4)[0]):
+            run, delta = struct.unpack_from(">II", stts, 8 + i * 8)
+            durations.extend([delta] * run)
+        if len(durations) < count:
+            durations.extend([durations[-1] if durations else 0] * (count - len(durations)))
+        self.durations = durations[:count]
+        self.dts = array("q", accumulate(self.durations, initial=0))
+
+        self.ctts_version = None
+        self.composition = None
+        if b"ctts" in tables:
+            ctts = tables[b"ctts"]
+            self.ctts_version = ctts[0]
+            entry = ">Ii" if ctts[0] == 1 else ">II"
+            composition = array("q")
+            for i in range(struct.unpack_from(">I", ctts, 4)[0]):
+                run, offset = struct.unpack_from(entry, ctts, 8 + i * 8)
+                composition.extend([offset] * run)
+            composition.extend([0] * (count - len(composition)))
+            self.composition = composition[:count]
+
+        # stss lists 1-based sample numbers; without it every sample is a sync sample
+        self.sync = None
+        if b"stss" in tables:
+            stss = tables[b"stss"]
+            entries = struct.unpack_from(">I", stss, 4)[0]
+            self.sync = array("q", (number - 1 for number in _big_endian("I", stss[8:8 + 4 * entries])))
+
+        self.dependencies = tables[b"sdtp"][4:4 + count] if b"sdtp" in tables else None
+
+        if b"stco" in tables:
+            stco = tables[b"stco"]
+            chunk_offsets = _big_endian("I", stco[8:8 + 4 * struct.unpack_from(">I", stco, 4)[0]])
+        elif b"co64" in tables:
+            co64 = tables[b"co64"]
+            chunk_offsets = _big_endian("Q", co64[8:8 + 8 * struct.unpack_from(">I", co64, 4)[0]])
+        else:
+            raise ValueError("Track without chunk offsets")
+        stsc = tables.get(b"stsc", bytes(8))
+        runs = [struct.unpack_from(">III", stsc, 8 + i * 12) for i in range(struct.unpack_from(">I", stsc, 4)[0])]
+
+        # Chunk runs as (first sample, first chunk, samples per chunk, description); sample
+        # offsets are worked out only for the samples a cut keeps
+        self.chunk_offsets = chunk_offsets
+        self.chunk_runs = []
+        sample = 0
+        for i, (first_chunk, per_chunk, description) in enumerate(runs):
+            last_chunk = runs[i + 1][0] - 1 if i + 1 < len(runs) else len(chunk_offsets)
+            self.chunk_runs.append((sample, first_chunk - 1, per_chunk, description))
+            sample += max(min(last_chunk, len(chunk_offsets)) - first_chunk + 1, 0) * per_chunk
+        if sample < count:
+            raise ValueError("MP4 sample table lists more samples than its chunks hold")
+        self.run_starts = [run[0] for run in self.chunk_runs]
+
+    def iter_samples(self, first, last):
+        # (file offset, sample description index) of each sample in first..last
+        run = bisect_right(self.run_starts, first) - 1
+        while self.chunk_runs[run][2] == 0:
+            run += 1
+        run_sample, run_chunk, per_chunk, description = self.chunk_runs[run]
+        chunk = run_chunk + (first - run_sample) // per_chunk
+        left = per_chunk - (first - run_sample) % per_chunk
+        position = self.chunk_offsets[chunk] + sum(self.sizes[first - per_chunk + left:first])
+        next_run = self.run_starts[run + 1] if run + 1 < len(self.run_starts) else None
+        for index in range(first, last + 1):
+            if not left:
+                if index == next_run:
+                    while run + 1 < len(self.run_starts) and self.run_starts[run + 1] == index:
+                        run += 1
+                    _, chunk, per_chunk, description = self.chunk_runs[run]
+                    next_run = self.run_starts[run + 1] if run + 1 < len(self.run_starts) else None
+                else:
+                    chunk += 1
+                left = per_chunk
+                position = self.chunk_offsets[chunk]
+            yield position, description
+            position += self.sizes[index]
+            left -= 1
+
+    def presentation_time(self, index):
+        return self.dts[index] + (self.composition[index] if self.composition is not None else 0)
+
+    def to_seconds(self, media_time):
+        return self.empty_seconds + (media_time - self.media_time) / self.timescale
+
+    def to_media_time(self, seconds):
+        return self.media_time + (seconds - self.empty_seconds) * self.timescale
+
+    def start_seconds(self):
+        # Where the track's first shown sample lands, which is ffmpeg's start_time for the stream
+        count = len(self.sizes)
+        if not count:
+            return None
+        first = min(self.presentation_time(index) for index in range(min(count, 16)))
+        return self.to_seconds(max(first, self.media_time))
+
+    def keyframe_range(self, start_seconds, end_seconds):
+        # Decode-order range from the sync sample at or before the start through the last
+        # sample shown before the end; the frames decoded after that one are left out
+        count = len(self.sizes)
+        if not count or self.to_seconds(self.dts[-1]) <= start_seconds:
+            return None
+        syncs = self.sync if self.sync is not None else range(count)
+        if not syncs:
+            return None
+        target = self.to_media_time(start_seconds + START_TOLERANCE)
+        first = syncs[0]
+        for index in syncs:
+            if self.presentation_time(index) > target:
+                break
+            first = index
+        end = self.to_media_time(end_seconds)
+        stop = bisect_left(self.dts, end, first, count)
+        last = None
+        for index in range(first, stop):
+            if self.presentation_time(index) < end:
+                last = index
+        return (first, last) if last is not None else None
+
+    def time_range(self, start_seconds, end_seconds):
+        # Decode-order range of the samples that overlap [start, end)
+        count = len(self.sizes)
+        first = bisect_right(self.dts, self.to_media_time(start_seconds), 1, count + 1) - 1
+        last = bisect_left(self.dts, self.to_media_time(end_seconds), 0, count) - 1
+        if first > last:
+            return None
+        if self.handler == b"soun":
+            # AAC and MP3 frames overlap their neighbours; the one before is decoded and dropped by the edit list
+            first = max(first - AUDIO_PREROLL_SAMPLES, 0)
+        return first, last
+
+
+def read_mp4_layout(data):
+    # (ftyp, moov) boxes of an unfragmented MP4, or ValueError
+    if len(data) < 8 or data[4:8] not in TOP_LEVEL_BOXES:
+        raise ValueError("Not an MP4 file")
+    ftyp = moov = None
+    for box_type, offset, header, size in iter_boxes(data):
+        if box_type == b"ftyp":
+            ftyp = bytes(data[offset:offset + size])
+        elif box_type == b"moov":
+            moov = bytes(data[offset:offset + size])
+        elif box_type == b"moof":
+            raise ValueError("Fragmented MP4 can't be cut natively")
+    if moov is None:
+        raise ValueError("MP4 file has no moov box")
+    if find_box(moov, 8, len(moov), [b"mvex"]):
+        raise ValueError("Fragmented MP4 can't be cut natively")
+    return ftyp, moov
+
+
+def read_moov_size(input_file):
+    # Size of the moov box a cut has to parse; ValueError for MP4s that can't be cut here
+    with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return len(read_mp4_layout(data)[1])
+
+
+def _run_length(values):
+    runs = []
+    for value in values:
+        if runs and runs[-1][1] == value:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, value])
+    return runs
+
+
+def _with_duration(payload, offset, version, duration):
+    # Replaces the duration field of an mvhd/tkhd/mdhd payload
+    payload = bytearray(payload)
+    if version == 1:
+        struct.pack_into(">Q", payload, offset, duration)
+    else:
+        struct.pack_into(">I", payload, offset, min(duration, MAX_32BIT))
+    return bytes(payload)
+
+
+class TrackCut:
+    # What one kept track contributes to the cut: its sample range and edit list
+    def __init__(self, track, first, last, edits, head_trim=0):
+        self.track = track
+        self.first = first
+        self.last = last
+        self.edits = edits
+        self.head_trim = head_trim
+        self.chunk_offsets = array("q")
+        self.chunk_samples = []
+        self.chunk_descriptions = []
+
+    def media_duration(self):
+        return self.track.dts[self.last + 1] - self.track.dts[self.first] - self.head_trim
+
+    def sample_table(self, base):
+        track, first, last = self.track, self.first, self.last
+        tables = []
+        durations = track.durations[first:last + 1]
+        durations[0] -= self.head_trim
+        stts = _run_length(durations)
+        tables.append(full_box(b"stts", 0, 0, struct.pack(">I", len(stts)) + b"".join(struct.pack(">II", *run) for run in stts)))
+        if track.composition is not None:
+            ctts = _run_length(track.composition[first:last + 1])
+            entry = ">Ii" if track.ctts_version == 1 else ">II"
+            tables.append(full_box(b"ctts", track.ctts_version, 0, struct.pack(">I", len(ctts)) + b"".join(struct.pack(entry, *run) for run in ctts)))
+        if track.sync is not None:
+            syncs = [index - first + 1 for index in track.sync if first <= index <= last]
+            tables.append(full_box(b"stss", 0, 0, struct.pack(">I", len(syncs)) + struct.pack(f">{len(syncs)}I", *syncs)))
+        if track.dependencies is not None:
+            tables.append(full_box(b"sdtp", 0, 0, bytes(track.dependencies[first:last + 1])))
+
+        stsc = []
+        for chunk, (samples, description) in enumerate(zip(self.chunk_samples, self.chunk_descriptions), 1):
+            if not stsc or stsc[-1][1:] != (samples, description):
+                stsc.append((chunk, samples, description))
+        tables.append(full_box(b"stsc", 0, 0, struct.pack(">I", len(stsc)) + b"".join(struct.pack(">III", *entry) for entry in stsc)))
+
+        sizes = track.sizes[first:last + 1]
+        if len(set(sizes)) == 1:
+            tables.append(full_box(b"stsz", 0, 0, struct.pack(">II", sizes[0], len(sizes))))
+        else:
+            tables.append(full_box(b"stsz", 0, 0, struct.pack(">II", 0, len(sizes)) + struct.pack(f">{len(sizes)}I", *sizes)))
+
+        offsets = [offset + base for offset in self.chunk_offsets]
+        if offsets and offsets[-1] > MAX_32BIT:
+            tables.append(full_box(b"co64", 0, 0, struct.pack(">I", len(offsets)) + struct.pack(f">{len(offsets)}Q", *offsets)))
+        else:
+            tables.append(full_box(b"stco", 0, 0, struct.pack(">I", len(offsets)) + struct.pack(f">{len(offsets)}I", *offsets)))
+        return b"".join(tables)
+
+    def edit_box(self):
+        version = 1 if any(duration > MAX_32BIT or media_time > 0x7FFFFFFF for duration, media_time in self.edits) else 0
+        entry = ">Qqhh" if version == 1 else ">Iihh"
+        entries = b"".join(struct.pack(entry, duration, media_time, 1, 0) for duration, media_time in self.edits)
+        return box(b"edts", full_box(b"elst", version, 0, struct.pack(">I", len(self.edits)) + entries))
+
+
+def rebuild_children(data, start, end, replace):
+    # Concatenates the child boxes of data[start:end], each passed through replace(type, offset, header, size)
+    return b"".join(replace(box_type, offset, header, size) for box_type, offset, header, size in iter_boxes(data, start, end))
+
+
+def build_moov(moov, cuts, movie_timescale, base):
+    by_box = {cut.track.box[0]: cut for cut in cuts}
+    movie_duration = max(sum(duration for duration, _ in cut.edits) for cut in cuts)
+
+    def stbl_child(box_type, offset, header, size):
+        if box_type in SAMPLE_TABLE_BOXES or box_type in DROPPED_BOXES:
+            return b""
+        return moov[offset:offset + size]
+
+    def trak_child(cut):
+        def replace(box_type, offset, header, size):
+            payload = moov[offset + header:offset + size]
+            if box_type == b"tkhd":
+                duration = sum(duration for duration, _ in cut.edits)
+                return box(b"tkhd", _with_duration(payload, 28 if payload[0] == 1 else 20, payload[0], duration)) + cut.edit_box()
+            if box_type == b"edts":
+                return b""
+            if box_type == b"mdia":
+                return box(b"mdia", rebuild_children(moov, offset + header, offset + size, replace))
+            if box_type == b"mdhd":
+                return box(b"mdhd", _with_duration(payload, 24 if payload[0] == 1 else 16, payload[0], cut.media_duration()))
+            if box_type == b"minf":
+                return box(b"minf", rebuild_children(moov, offset + header, offset + size, replace))
+            if box_type == b"stbl":
+                children = rebuild_children(moov, offset + header, offset + size, stbl_child)
+                return box(b"stbl", children + cut.sample_table(base))
+            return moov[offset:offset + size]
+        return replace
+
+    def moov_child(box_type, offset, header, size):
+        if box_type == b"mvhd":
+            payload = moov[offset + header:offset + size]
+            return box(b"mvhd", _with_duration(payload, 24 if payload[0] == 1 else 16, payload[0], movie_duration))
+        if box_type == b"trak":
+            cut = by_box.get(offset)
+            if cut is None:
+                return b""
+            return box(b"trak", rebuild_children(moov, offset + header, offset + size, trak_child(cut)))
+        return moov[offset:offset + size]
+
+    return box(b"moov", rebuild_children(moov, 8, len(moov), moov_child))
+
+
+def cut_mp4(input_file, output_file, start_seconds, end_seconds, streams="all", progress=None, cancel=None):
+    # Rewrites the sample tables for the range and copies the samples after a new moov, so the
+    # output is faststart from the one write pass. Video starts on the sync sample at or before
+    # the start, like a stream copy cut; the edit lists start every track at that frame.
+    if end_seconds <= start_seconds:
+        raise ValueError("End time must be after start time")
+
+    with open(input_file, "rb") as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        ftyp, moov = read_mp4_layout(data)
+        mvhd = _box_payload(moov, find_box(moov, 8, len(moov), [b"mvhd"]))
+        movie_timescale = struct.unpack_from(">I", mvhd, 20 if mvhd[0] == 1 else 12)[0]
+        handlers = TRACK_HANDLERS[streams or "all"]
+        tracks = [
+            Track(moov, offset, header, size, movie_timescale)
+            for box_type, offset, header, size in iter_boxes(moov, 8, len(moov))
+            if box_type == b"trak"
+        ]
+        # Times count from the file's start time like ffmpeg's -ss, not from the movie's zero
+        offset = min((start for start in (track.start_seconds() for track in tracks) if start is not None), default=0.0)
+        start_seconds += offset
+        end_seconds += offset
+        tracks = [track for track in tracks if handlers is None or track.handler in handlers]
+        if handlers is not None:
+            # Like ffmpeg's stream maps, a selection takes only the first video track
+            videos = [track for track in tracks if track.handler == b"vide"]
+            tracks = [track for track in tracks if track.handler != b"vide" or track is videos[0]]
+
+        # The first video track decides where the cut really starts
+        video = next((track for track in tracks if track.handler == b"vide"), None)
+        cut_start = start_seconds
+        video_range = None
+        if video is not None:
+            video_range = video.keyframe_range(start_seconds, end_seconds)
+            if video_range is None:
+                raise ValueError("Nothing to cut in the requested range")
+            cut_start = min(start_seconds, video.to_seconds(video.presentation_time(video_range[0])))
+
+        cuts = []
+        for track in tracks:
+            found = video_range if track is video else track.time_range(cut_start, end_seconds)
+            if found is None:
+                continue
+            first, last = found
+            shown_end = max(track.presentation_time(index) + track.durations[index] for index in range(max(first, last - 16), last + 1))
+            cut_end = min(end_seconds, track.to_seconds(shown_end))
+            edits = []
+            if track.empty_seconds > cut_start:
+                edits.append((round((track.empty_seconds - cut_start) * movie_timescale), -1))
+            media_start = max(int(round(track.to_media_time(cut_start))), track.media_time) - track.dts[first]
+            head_trim = 0
+            if track.handler not in (b"vide", b"soun") and media_start > 0:
+                # Subtitle and timecode samples are shortened instead; players handle edit lists
+                # that start inside one of those badly
+                head_trim = min(media_start, track.durations[first] - 1)
+                media_start -= head_trim
+            duration = round((cut_end - max(cut_start, track.empty_seconds)) * movie_timescale)
+            if duration > 0:
+                edits.append((duration, max(media_start, 0)))
+                cuts.append(TrackCut(track, first, last, edits, head_trim))
+        if not cuts:
+            raise ValueError("Nothing to cut in the requested range")
+
+        # Samples go out in their original file order, which keeps the source's interleaving.
+        # Runs of one track become chunks; runs that were contiguous in the source become one copy.
+        def samples(number, cut):
+            found = cut.track.iter_samples(cut.first, cut.last)
+            return ((offset, number, index, description) for index, (offset, description) in enumerate(found, cut.first))
+
+        position = 0
+        copies = []
+        previous = None
+        for offset, number, index, description in heapq.merge(*(samples(number, cut) for number, cut in enumerate(cuts))):
+            cut = cuts[number]
+            size = cut.track.sizes[index]
+            if previous == (number, description):
+                cut.chunk_samples[-1] += 1
+            else:
+                cut.chunk_offsets.append(position)
+                cut.chunk_samples.append(1)
+                cut.chunk_descriptions.append(description)
+                previous = (number, description)
+            if copies and copies[-1][0] + copies[-1][1] == offset:
+                copies[-1][1] += size
+            else:
+                copies.append([offset, size])
+            position += size
+        mdat_header = struct.pack(">I4s", position + 8, b"mdat") if position + 8 <= MAX_32BIT else struct.pack(">I4sQ", 1, b"mdat", position + 16)
+
+        # Chunk offsets depend on the size of the moov they are written into
+        head = (ftyp or b"") + build_moov(moov, cuts, movie_timescale, 0)
+        new_moov = build_moov(moov, cuts, movie_timescale, len(head) + len(mdat_header))
+        if len((ftyp or b"") + new_moov) != len(head):
+            new_moov = build_moov(moov, cuts, movie_timescale, len(ftyp or b"") + len(new_moov) + len(mdat_header))
+
+        duration = end_seconds - cut_start
+        reporter = ProgressReporter(duration, progress) if progress else None
+        if reporter:
+            reporter.track(duration)
+
+        with open(output_file, "wb", buffering=0) as target:
+            write_all(target, (ftyp or b"") + new_moov + mdat_header)
+            copied = 0
+            for offset, size in copies:
+                copy_range(source, data, target, offset, size, cancel=cancel)
+                copied += size
+                if reporter:
+                    reporter.advance(duration * copied / position, copied)
+
+    if reporter:
+        reporter.report(force=True)
@@ -0,0 +1,134 @@
+import os
+
+from audio_cutter import AUDIO_MODE_COPY, AUDIO_MODE_REENCODE
+from cutter import AUDIO_EXTENSIONS, VIDEO_EXTENSIONS, cut_media, probe_or_error
+from engines import CutRequest, FFmpegEngine, choose_engine, forced_engine_name
+from ffmpeg_command import STREAMS_AUDIO, check_options, muxer_args, stream_args, thread_args
+from ffmpeg_utils import CutCancelled, remove_partial_output, run_ffmpeg
+from keyframe_index import copy_start_time, get_keyframe_index
+from progress import ProgressReporter, track
+from video_cutter import SEEK_MARGIN, VIDEO_MODE_COPY
+
+# Every output costs ffmpeg a muxer (and an encoder when re-encoding), so very long
+# range lists are split into groups that each make one sequential pass over their span
+MAX_OUTPUTS_PER_PASS = 32
+
+
+def cut_segments(
+    input_file,
+    segments,
+    video_mode=VIDEO_MODE_COPY,
+    audio_mode=AUDIO_MODE_REENCODE,
+    progress=None,
+    cancel=None,
+    options=None,
+    engine=None,
+):
+    # segments is a list of (start_seconds, end_seconds, output_file). Every output shares
+    # one read of the input, so the seek mode in options does not apply here.
+    options = check_options(options)
+    if not os.path.isfile(input_file):
+        raise FileNotFoundError(f"Input file not found: {input_file}")
+    for start, end, _ in segments:
+        if end <= start:
+            raise ValueError("End time must be after start time")
+
+    file_extension = os.path.splitext(input_file)[1].lower()
+    is_video = file_extension in VIDEO_EXTENSIONS
+    if not is_video and file_extension not in AUDIO_EXTENSIONS:
+        raise ValueError("Unsupported file type")
+
+    forced = forced_engine_name(engine)
+    media_info, probe_error = probe_or_error(input_file)
+    duration = media_info.duration if media_info else None
+    if (is_video and video_mode != VIDEO_MODE_COPY) or forced not in (None, FFmpegEngine.name):
+        # Smart cuts need several encoder runs per range, so they cannot share one pass,
+        # and the single pass is an ffmpeg feature other engines go range by range
+        separate, segments = sorted(segments), []
+    elif not is_video and audio_mode == AUDIO_MODE_COPY:
+        # A stream copy in the shared pass cuts on packet boundaries, thousands of samples
+        # apart for PCM; ranges an engine can cut exactly without ffmpeg go through it instead
+        separate, shared = [], []
+        for segment in sorted(segments):
+            start, end, output_file = segment
+            if duration is not None:
+                if start >= duration:
+                    # Left for the shared pass to report
+                    shared.append(segment)
+                    continue
+                end = min(end, duration)
+            request = CutRequest(
+                input_file, output_file, start, end, is_video=False, video_mode=video_mode, audio_mode=audio_mode,
+                options=options, media_info=media_info, probe_error=probe_error,
+            )
+            (separate if choose_engine(request).name != FFmpegEngine.name else shared).append(segment)
+        segments = shared
+    else:
+        separate = []
+
+    count = len(separate) + len(segments)
+    for i, (start, end, output_file) in enumerate(separate):
+        segment_progress = None
+        if progress:
+            def segment_progress(update, i=i):
+                progress(update._replace(fraction=(i + update.fraction) / count, eta_seconds=None))
+        cut_media(
+            input_file, output_file, start, end,
+            video_mode=video_mode, audio_mode=audio_mode, progress=segment_progress, cancel=cancel,
+            options=options, engine=engine,
+        )
+    if not segments:
+        return
+    if separate and progress:
+        def pass_progress(update, outer=progress):
+            outer(update._replace(fraction=(len(separate) + update.fraction * len(segments)) / count))
+        progress = pass_progress
+
+    index = get_keyframe_index(input_file) if is_video else None
+
+    # Work out where each output really starts reading, then walk the source front to back
+    jobs = []
+    for start, end, output_file in segments:
+        if duration is not None:
+            if start >= duration:
+                raise ValueError(f"Start time {start:.3f}s is beyond the end of the file")
+            end = min(end, duration)
+        read_start = max(copy_start_time(index, start), 0.0) if is_video else start
+        jobs.append((read_start, start, end, output_file))
+    jobs.sort()
+
+    groups = [jobs[i:i + MAX_OUTPUTS_PER_PASS] for i in range(0, len(jobs), MAX_OUTPUTS_PER_PASS)]
+    spans = []
+    for group in groups:
+        base = max(min(job[0] for job in group) - SEEK_MARGIN, 0.0)
+        spans.append((base, max(job[2] for job in group)))
+    reporter = ProgressReporter(sum(end - base for base, end in spans), progress) if progress else None
+
+    written = []
+    try:
+        for group, (base, read_end) in zip(groups, spans):
+            # Input seeking shifts timestamps so that base becomes zero; every output then
+            # trims its own range out of the single demuxed stream
+            args = ["-ss", repr(base), "-to", repr(read_end), "-i", input_file]
+            for read_start, start, end, output_file in group:
+                if is_video:
+                    args += stream_args(options) + ["-c", "copy"]
+                    if read_start > base:
+                        # Leave the very first keyframe alone: its decode time may be negative
+                        args += ["-ss", repr(read_start - base)]
+                    args += ["-to", repr(end - base)] + muxer_args(options) + [output_file]
+                else:
+                    args += stream_args(options, STREAMS_AUDIO) + [
+                        "-map_metadata", "0",
+                        "-ss", repr(start - base),
+                        "-to", repr(end - base),
+                    ]
+                    if audio_mode == AUDIO_MODE_COPY:
+                        args += ["-c:a", "copy"]
+                    args += thread_args(options) + muxer_args(options) + ["-f", file_extension[1:], output_file]
+                written.append(output_file)
+            run_ffmpeg(args, progress=track(reporter, read_end - base), cancel=cancel)
+    except (CutCancelled, KeyboardInterrupt):
+        for output_file in written:
+            remove_partial_output(output_file)
+        raise
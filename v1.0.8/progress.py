@@ -0,0 +1,92 @@
+import time
+from collections import namedtuple
+
+ProgressUpdate = namedtuple(
+    "ProgressUpdate",
+    ["fraction", "processed_seconds", "bytes_written", "mb_per_second", "realtime_factor", "eta_seconds"],
+)
+
+# Coalesce ffmpeg's progress blocks to a few updates per second
+DEFAULT_REPORT_INTERVAL = 0.25
+
+
+def _to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ProgressReporter:
+    # Turns the key=value blocks of one or more "ffmpeg -progress" runs into overall progress.
+    # Each run covers a span of media seconds; track() is called once per run in order.
+    def __init__(self, total_seconds, callback, interval=DEFAULT_REPORT_INTERVAL):
+        self.total_seconds = max(total_seconds, 1e-6)
+        self.callback = callback
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = None
+        self.done_seconds = 0.0
+        self.done_bytes = 0
+        self.span_seconds = 0.0
+        self.span_processed = 0.0
+        self.span_bytes = 0
+        self.speed = None
+
+    def track(self, span_seconds):
+        self._finish_span()
+        self.span_seconds = max(span_seconds, 0.0)
+        return self.handle_block
+
+    def _finish_span(self):
+        self.done_seconds += self.span_seconds
+        self.done_bytes += self.span_bytes
+        self.span_seconds = 0.0
+        self.span_processed = 0.0
+        self.span_bytes = 0
+
+    def handle_block(self, block):
+        out_time_us = _to_number(block.get("out_time_us"))
+        if out_time_us is not None and out_time_us >= 0:
+            self.span_processed = min(out_time_us / 1000000.0, self.span_seconds)
+        total_size = _to_number(block.get("total_size"))
+        if total_size is not None:
+            self.span_bytes = int(total_size)
+        speed = _to_number((block.get("speed") or "").rstrip("x"))
+        if speed is not None:
+            self.speed = speed
+        if block.get("progress") == "end":
+            self.span_processed = self.span_seconds
+        self.report(force=block.get("progress") == "end")
+
+    def advance(self, processed_seconds, bytes_written=0):
+        # For pipelines that do not run ffmpeg, e.g. native container rewriters
+        self.span_processed = min(processed_seconds, self.span_seconds)
+        self.span_bytes = bytes_written
+        self.report()
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and self.last_report is not None and now - self.last_report < self.interval:
+            return
+        self.last_report = now
+
+        elapsed = max(now - self.started, 1e-6)
+        processed = self.done_seconds + self.span_processed
+        written = self.done_bytes + self.span_bytes
+        fraction = min(processed / self.total_seconds, 1.0)
+        realtime_factor = self.speed if self.speed is not None else processed / elapsed
+        eta = (self.total_seconds - processed) * elapsed / processed if processed > 0 else None
+        self.callback(ProgressUpdate(
+            fraction=fraction,
+            processed_seconds=processed,
+            bytes_written=written,
+            mb_per_second=written / elapsed / (1024 * 1024),
+            realtime_factor=realtime_factor,
+            eta_seconds=eta,
+        ))
+
+
+def track(progress, span_seconds):
+    # Lets callers pass either a reporter or None through to run_ffmpeg
+    return progress.track(span_seconds) if progress is not None else None
@@ -0,0 +1,148 @@
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+
+from disk_cache import file_cache_key
+from ffmpeg_utils import CutCancelled
+from progress import ProgressReporter
+
+# Inputs kept open between cuts, so a batch of clips from one source demuxes its header once
+MAX_OPEN_INPUTS = 4
+
+# Packets muxed between cancel checks and progress reports
+CHECK_INTERVAL = 256
+
+STREAM_TYPES = {
+    "all": ("video", "audio", "subtitle"),
+    "av": ("video", "audio"),
+    "video": ("video",),
+    "audio": ("audio",),
+}
+
+_open_inputs = OrderedDict()
+_open_inputs_lock = threading.Lock()
+
+
+def pyav_available():
+    # Looks for the package without loading it; importing av takes longer than most cuts
+    return importlib.util.find_spec("av") is not None
+
+
+def open_input(input_file):
+    # Hands out a cached container; the caller holds the returned lock while using it
+    import av
+
+    key = file_cache_key(input_file)
+    with _open_inputs_lock:
+        entry = _open_inputs.get(key)
+        if entry is not None:
+            _open_inputs.move_to_end(key)
+            return entry
+        entry = (av.open(input_file), threading.Lock())
+        _open_inputs[key] = entry
+        while len(_open_inputs) > MAX_OPEN_INPUTS:
+            _, (container, lock) = _open_inputs.popitem(last=False)
+            with lock:
+                container.close()
+        return entry
+
+
+def close_inputs():
+    with _open_inputs_lock:
+        while _open_inputs:
+            _, (container, lock) = _open_inputs.popitem(last=False)
+            with lock:
+                container.close()
+
+
+def remux_cut(input_file, output_file, start_seconds, end_seconds, streams="all", muxer_options=(), output_format=None, progress=None, cancel=None):
+    # Stream copy inside this process: seek, then hand packets straight from the demuxer to the
+    # muxer. Like ffmpeg's copy cut, video starts on the keyframe at or before the start.
+    try:
+        import av
+    except ImportError:
+        raise RuntimeError("PyAV is not installed")
+    if end_seconds <= start_seconds:
+        raise ValueError("End time must be after start time")
+
+    container, lock = open_input(input_file)
+    with lock:
+        wanted = STREAM_TYPES[streams or "all"]
+        inputs = [stream for stream in container.streams if stream.type in wanted]
+        if not inputs:
+            raise ValueError("No streams to cut")
+        video = next((stream for stream in inputs if stream.type == "video"), None)
+
+        # Times count from the file's start time like ffmpeg's -ss, packet times from zero
+        start_time = (container.start_time or 0) / 1000000
+        start_seconds += start_time
+        end_seconds += start_time
+
+        # Offsets are in microseconds when no stream is given; backward lands on the keyframe before
+        container.seek(int(start_seconds * 1000000), backward=True, any_frame=False)
+
+        duration = end_seconds - start_seconds
+        reporter = ProgressReporter(duration, progress) if progress else None
+        if reporter:
+            reporter.track(duration)
+
+        output = av.open(output_file, "w", format=output_format, options={key: str(value) for key, value in muxer_options})
+        try:
+            output.metadata.update(container.metadata)
+            outputs = {stream.index: output.add_stream_from_template(stream) for stream in inputs}
+            # first_pts: where the cut really begins (the video keyframe); offset: the decode time
+            # mapped to zero, so reordered frames never get negative timestamps
+            first_pts = None
+            offset = None
+            finished = set()
+            bytes_written = 0
+            for count, packet in enumerate(container.demux(inputs), 1):
+                if packet.pts is None:
+                    continue
+                stream = packet.stream
+                time_base = packet.time_base
+                pts = float(packet.pts * time_base)
+                # Matroska leaves the decode time out wherever it can be worked out again
+                dts = pts if packet.dts is None else float(packet.dts * time_base)
+
+                if first_pts is None:
+                    if video is not None:
+                        if stream.index != video.index or not packet.is_keyframe:
+                            continue
+                    elif pts + float((packet.duration or 0) * time_base) <= start_seconds:
+                        continue
+                    first_pts = pts
+                    offset = min(pts, dts)
+
+                # Video stops on decode order so every kept frame has its references, other streams on display time
+                if (dts if stream.type == "video" else pts) >= end_seconds:
+                    finished.add(stream.index)
+                    if len(finished) == len(inputs):
+                        break
+                    continue
+                if pts < first_pts:
+                    continue
+
+                shift = round(offset / time_base)
+                packet.pts -= shift
+                if packet.dts is not None:
+                    packet.dts -= shift
+                packet.stream = outputs[stream.index]
+                bytes_written += packet.size
+                output.mux(packet)
+
+                if count % CHECK_INTERVAL == 0:
+                    if cancel is not None and cancel.is_set():
+                        raise CutCancelled()
+                    if reporter:
+                        reporter.advance(max(pts - start_seconds, 0.0), bytes_written)
+        finally:
+            output.close()
+
+    if first_pts is None:
+        os.remove(output_file)
+        raise ValueError("Nothing to cut in the requested range")
+    if reporter:
+        reporter.advance(duration, bytes_written)
+        reporter.report(force=True)
@@ -0,0 +1,165 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+from cutter import AUDIO_EXTENSIONS, VIDEO_EXTENSIONS, probe_or_none
+from ffmpeg_command import STREAMS_ALL, STREAMS_AUDIO, check_options, stream_args, thread_args
+from ffmpeg_utils import CutCancelled, remove_partial_output, run_ffmpeg
+from keyframe_index import get_keyframe_index
+from mp4_cutter import read_moov_size
+from progress import ProgressReporter, track
+from video_cutter import KEYFRAME_TOLERANCE
+
+SIZE_PATTERN = re.compile(r"^(\d+(?:\.\d*)?)\s*([KMGT]?)i?B?$", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+# Part of the byte budget kept free for each part's own headers and sample index
+SIZE_MARGIN = 0.02
+
+
+def parse_size(value):
+    # Accepts plain bytes ("734003200") or a number with a binary unit ("700M", "2G", "1.5GiB")
+    match = SIZE_PATTERN.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}. Use bytes or a number with K, M, G or T")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def part_pattern(output_file):
+    # "stream.mp4" becomes "stream_%03d.mp4"; a name that already has a %d pattern is kept
+    if re.search(r"%0?\d*d", output_file):
+        return output_file
+    root, extension = os.path.splitext(output_file)
+    return root.replace("%", "%%") + "_%03d" + extension.replace("%", "%%")
+
+
+def plan_split_times(index, file_size, part_seconds=None, part_bytes=None, index_bytes=0):
+    # Picks the keyframes the parts start on. A part ends on the keyframe before the one that
+    # would take it past the byte budget, or on the first keyframe at or after every multiple
+    # of part_seconds, the way ffmpeg's segment muxer places its splits. A single GOP bigger
+    # than the budget cannot be split without re-encoding, so it becomes a part of its own.
+    # Returns split times for the segment muxer, which splits on the first keyframe at or
+    # after each: halfway back to the keyframe before, so shifted output timestamps (ffmpeg
+    # moves them to start at zero) still land each split on the keyframe planned.
+    # index_bytes is the source's own sample index (an MP4 moov), which the keyframe positions
+    # leave out; every part gets one about as big a share of the part as it is of the source.
+    keyframes = index.keyframes
+    positions = index.keyframe_positions
+    if part_bytes and any(position < 0 for position in positions):
+        raise ValueError("This file's keyframes have no byte positions, split it by duration instead")
+    budget = part_bytes * (1 - SIZE_MARGIN) * (1 - index_bytes / file_size) if part_bytes else None
+
+    starts = []
+    start, start_position = 0, 0
+    next_boundary = part_seconds
+    oversized = 0
+    # One step past the last keyframe, so the final part is held to the budget as well
+    for i in range(1, len(keyframes) + 1):
+        position = positions[i] if i < len(keyframes) else file_size
+        if i < len(keyframes) and next_boundary and keyframes[i] >= next_boundary - KEYFRAME_TOLERANCE:
+            starts.append(i)
+            start, start_position = i, position
+            while next_boundary <= keyframes[i] + KEYFRAME_TOLERANCE:
+                next_boundary += part_seconds
+            continue
+        if budget is None or position - start_position <= budget:
+            continue
+        if i - 1 > start:
+            starts.append(i - 1)
+            start, start_position = i - 1, positions[i - 1]
+        if position - start_position > budget:
+            oversized += 1
+            if i < len(keyframes):
+                starts.append(i)
+                start, start_position = i, position
+    if oversized:
+        logging.warning("%d part(s) are over the size limit: their GOPs alone are bigger than it", oversized)
+    return [(keyframes[i - 1] + keyframes[i]) / 2 for i in starts]
+
+
+def segment_format_args(options):
+    # Muxer options apply to every part, not to the segment muxer itself
+    if not options.muxer_options:
+        return []
+    return ["-segment_format_options", ":".join(f"{option.lstrip('-')}={value}" for option, value in options.muxer_options)]
+
+
+def split_media(input_file, output_file, part_seconds=None, part_bytes=None, progress=None, cancel=None, options=None):
+    # Splits the whole input into parts of at most part_bytes each and/or about part_seconds
+    # long, stream copying it in one pass through ffmpeg's segment muxer. Parts always start
+    # on a keyframe. Returns the paths of the parts, numbered from 1 as output_file_001, ...
+    options = check_options(options)
+    if not part_seconds and not part_bytes:
+        raise ValueError("Give a part length or a part size")
+    if (part_seconds is not None and part_seconds <= 0) or (part_bytes is not None and part_bytes <= 0):
+        raise ValueError("Part length and size must be positive")
+    if not os.path.isfile(input_file):
+        raise FileNotFoundError(f"Input file not found: {input_file}")
+    file_extension = os.path.splitext(input_file)[1].lower()
+    is_video = file_extension in VIDEO_EXTENSIONS
+    if not is_video and file_extension not in AUDIO_EXTENSIONS:
+        raise ValueError("Unsupported file type")
+
+    media_info = probe_or_none(input_file)
+    duration = media_info.duration if media_info else None
+    pattern = part_pattern(output_file)
+
+    split_args = ["-f", "segment", "-reset_timestamps", "1", "-segment_start_number", "1"]
+    if part_bytes and is_video:
+        index_bytes = 0
+        if file_extension == ".mp4":
+            try:
+                index_bytes = read_moov_size(input_file)
+            except (OSError, ValueError):
+                pass
+        times = plan_split_times(get_keyframe_index(input_file), os.path.getsize(input_file), part_seconds, part_bytes, index_bytes)
+        # With nothing to split, a single boundary past the end keeps the input in one part
+        split_args += ["-segment_times", ",".join(repr(t) for t in times or [(duration or 0.0) + 1.0])]
+    else:
+        if part_bytes:
+            # Every audio frame is a keyframe, so the average bit rate is all a size needs
+            bit_rate = media_info.bit_rate if media_info else None
+            if not bit_rate:
+                raise ValueError("This file's bit rate is unknown, split it by duration instead")
+            budget_seconds = part_bytes * (1 - SIZE_MARGIN) * 8 / bit_rate
+            part_seconds = min(part_seconds or budget_seconds, budget_seconds)
+        split_args += ["-segment_time", repr(part_seconds)]
+
+    reporter = ProgressReporter(duration, progress) if progress and duration else None
+    work_dir = tempfile.mkdtemp(prefix="vc4u_", dir=os.path.dirname(os.path.abspath(output_file)))
+    part_list = os.path.join(work_dir, "parts.txt")
+    try:
+        run_ffmpeg(
+            ["-i", input_file]
+            + stream_args(options, STREAMS_ALL if is_video else STREAMS_AUDIO)
+            + ["-c", "copy", "-map_metadata", "0"]
+            + split_args
+            + ["-segment_list", part_list, "-segment_list_type", "flat"]
+            + segment_format_args(options)
+            + thread_args(options)
+            + [pattern],
+            progress=track(reporter, duration),
+            cancel=cancel,
+        )
+        return read_part_list(part_list, pattern)
+    except (CutCancelled, KeyboardInterrupt):
+        # The list only names finished parts, the one being written is the next number
+        parts = read_part_list(part_list, pattern)
+        for path in parts + [pattern % (len(parts) + 1)]:
+            remove_partial_output(path)
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def read_part_list(part_list, pattern):
+    # The segment muxer lists each part by its file name only
+    directory = os.path.dirname(pattern)
+    try:
+        with open(part_list, encoding="utf-8") as f:
+            return [os.path.join(directory, os.path.basename(line.strip())) for line in f if line.strip()]
+    except OSError:
+        return []
@@ -0,0 +1,21 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+# The modules sit flat in the application folder, next to this one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Probe and index caches are created on import, so point them at a throwaway folder first
+CACHE_DIR = tempfile.mkdtemp(prefix="vc4u_test_cache_")
+os.environ["VC4U_CACHE_DIR"] = CACHE_DIR
+atexit.register(shutil.rmtree, CACHE_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def media_dir(tmp_path_factory):
+    # Generated sources are shared by every test, outputs go to each test's own tmp_path
+    return tmp_path_factory.mktemp("media")
@@ -0,0 +1,128 @@
+import subprocess
+from array import array
+
+import pytest
+
+from ffmpeg_utils import get_ffmpeg_binary, get_ffprobe_binary
+
+# Test videos show their own frame number as this many black or white bars, lowest bit first
+FRAME_NUMBER_BITS = 12
+BAR_WIDTH = 16
+
+# Half a millisecond, well under any frame or sample a test looks at
+TIME_TOLERANCE = 0.0005
+
+
+def _runs(binary):
+    try:
+        subprocess.run([binary, "-version"], stdin=subprocess.DEVNULL, capture_output=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+requires_ffmpeg = pytest.mark.skipif(
+    not (_runs(get_ffmpeg_binary()) and _runs(get_ffprobe_binary())),
+    reason="ffmpeg and ffprobe are needed to make and check media",
+)
+
+
+def encoder_available(name):
+    result = subprocess.run([get_ffmpeg_binary(), "-hide_banner", "-encoders"], stdin=subprocess.DEVNULL, capture_output=True)
+    return any(line.split()[1:2] == [name] for line in result.stdout.decode(errors="replace").splitlines())
+
+
+def ffmpeg(*args):
+    subprocess.run([get_ffmpeg_binary(), "-hide_banner", "-v", "error", "-y", *args], stdin=subprocess.DEVNULL, capture_output=True, check=True)
+
+
+def ffprobe(*args):
+    result = subprocess.run(
+        [get_ffprobe_binary(), "-hide_banner", "-v", "error", "-of", "csv=p=0", *args],
+        stdin=subprocess.DEVNULL, capture_output=True, check=True,
+    )
+    # First field of each line: frames can carry a side data section after their own
+    return [line.split(",")[0] for line in result.stdout.decode().split()]
+
+
+def make_video(path, seconds, rate=25, gop=50, bframes=2, start_time=0.0, audio=True, codec=("-c:v", "libx264", "-preset", "ultrafast"), audio_codec=("-c:a", "aac"), timecode=None):
+    # H.264 (by default) with a fixed GOP, optionally shifted so the file starts at start_time
+    # or tagged with the timecode of its first frame
+    width = FRAME_NUMBER_BITS * BAR_WIDTH
+    bars = f"if(mod(floor(N/pow(2\\,floor(X/{BAR_WIDTH})))\\,2)\\,235\\,16)"
+    args = ["-f", "lavfi", "-i", f"color=c=gray:s={width}x32:r={rate}:d={seconds},geq=lum='{bars}':cb=128:cr=128"]
+    if audio:
+        args += ["-f", "lavfi", "-i", f"anoisesrc=d={seconds}:c=pink:r=48000:a=0.3:seed=1", *audio_codec]
+    args += list(codec) + ["-g", str(gop), "-bf", str(bframes)]
+    if start_time:
+        args += ["-output_ts_offset", repr(start_time)]
+    if timecode:
+        args += ["-timecode", timecode]
+    ffmpeg(*args, str(path))
+    return str(path)
+
+
+def frame_numbers(path):
+    # Every decoded frame, in presentation order, as the number drawn on it
+    raw = subprocess.run(
+        [
+            get_ffmpeg_binary(), "-v", "error", "-i", str(path), "-map", "0:v:0", "-fps_mode", "passthrough",
+            "-vf", f"scale={FRAME_NUMBER_BITS}:1:flags=area,format=gray", "-f", "rawvideo", "-",
+        ],
+        stdin=subprocess.DEVNULL, capture_output=True, check=True,
+    ).stdout
+    return [
+        sum(1 << bit for bit, level in enumerate(raw[i:i + FRAME_NUMBER_BITS]) if level >= 128)
+        for i in range(0, len(raw), FRAME_NUMBER_BITS)
+    ]
+
+
+def frame_times(path):
+    # Presentation time of every frame, counted from the file's start time like ffmpeg's -ss
+    start_time = float(ffprobe("-show_entries", "format=start_time", str(path))[0])
+    return [float(pts) - start_time for pts in ffprobe("-select_streams", "v:0", "-show_entries", "frame=pts_time", str(path))]
+
+
+def frames_between(path, start, end):
+    # The frame numbers a frame-accurate cut of [start, end) has to contain
+    return [number for number, time in enumerate(frame_times(path)) if start - TIME_TOLERANCE <= time < end - TIME_TOLERANCE]
+
+
+def copied_frames_between(path, start, end, trailing_references=False):
+    # What a stream copy of [start, end) has to contain: it can only start on the keyframe at or
+    # before start. Without an edit list to hide them it also shows the reference frames past the
+    # end that frames before it are decoded from.
+    start_time = float(ffprobe("-show_entries", "format=start_time", str(path))[0])
+    packets = [line.split("|") for line in ffprobe("-select_streams", "v:0", "-show_entries", "packet=pts_time,flags", "-of", "compact=p=0:nk=1", str(path))]
+    packets = [(float(pts) - start_time, "K" in flags) for pts, flags in packets]
+    keyframes = [time for time, keyframe in packets if keyframe]
+    first = max((time for time in keyframes if time <= start + TIME_TOLERANCE), default=min(keyframes))
+    if not trailing_references:
+        return frames_between(path, first, end)
+    # Packets come in decode order; the copy carries them up to the last one shown before the end
+    last = max(i for i, (time, _) in enumerate(packets) if time < end - TIME_TOLERANCE)
+    carried = [time for time, _ in packets[:last + 1] if time >= first - TIME_TOLERANCE]
+    return [number for number, time in enumerate(frame_times(path)) if any(abs(time - shown) <= TIME_TOLERANCE for shown in carried)]
+
+
+def make_audio(path, seconds, sample_rate=44100, channels=2, codec=()):
+    # Pink noise never repeats, so any shift in a cut shows up as a mismatch
+    ffmpeg(
+        "-f", "lavfi", "-i", f"anoisesrc=d={seconds}:c=pink:r={sample_rate}:a=0.3:seed=1",
+        "-ac", str(channels), *codec, str(path),
+    )
+    return str(path)
+
+
+def decode_samples(path):
+    # Interleaved 16-bit samples, decoded the way any player would (gapless info applied)
+    raw = subprocess.run(
+        [get_ffmpeg_binary(), "-v", "error", "-i", str(path), "-map", "0:a:0", "-f", "s16le", "-c:a", "pcm_s16le", "-"],
+        stdin=subprocess.DEVNULL, capture_output=True, check=True,
+    ).stdout
+    return array("h", raw)
+
+
+def samples_between(path, start, end, sample_rate, channels):
+    samples = decode_samples(path)
+    return samples[round(start * sample_rate) * channels:round(end * sample_rate) * channels]
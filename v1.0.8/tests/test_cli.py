@@ -0,0 +1,148 @@
+import pytest
+
+import vc4u_cli
+from audio_cutter import AUDIO_MODE_COPY, AUDIO_MODE_REENCODE
+from ffmpeg_command import SEEK_HYBRID, SEEK_INPUT, STREAMS_AUDIO, FFmpegOptions
+from ffmpeg_utils import CutCancelled
+from helpers import decode_samples, make_audio, requires_ffmpeg, samples_between
+from video_cutter import VIDEO_MODE_COPY, VIDEO_MODE_SMART
+
+
+@pytest.fixture
+def cuts(monkeypatch):
+    # (function name, positional arguments, keyword arguments) of every cut main() starts;
+    # each writes its outputs so the sizes can be reported
+    calls = []
+
+    def recorder(name):
+        def run(*args, **kwargs):
+            calls.append((name, args, kwargs))
+            if name == "cut_media":
+                outputs = [args[1]]
+            else:
+                outputs = [output for _, _, output in args[1]]
+            for output in outputs:
+                with open(output, "wb") as f:
+                    f.write(b"cut")
+
+        return run
+
+    for name in ("cut_media", "cut_segments"):
+        monkeypatch.setattr(vc4u_cli, name, recorder(name))
+    return calls
+
+
+@pytest.mark.parametrize("value, seconds", [("90.5", 90.5), ("01:02.5", 62.5), ("1:00:01.250", 3601.25)])
+def test_times_are_parsed(value, seconds):
+    args = vc4u_cli.build_parser().parse_args(["in.mp4", "out.mp4", "-s", value, "-e", value])
+    assert args.start == seconds and args.end == seconds
+
+
+def test_defaults():
+    args = vc4u_cli.build_parser().parse_args(["in.mp4", "out.mp4", "-e", "5"])
+    assert (args.start, args.video_mode, args.audio_mode, args.seek_mode) == (0.0, VIDEO_MODE_COPY, AUDIO_MODE_REENCODE, SEEK_INPUT)
+    assert args.streams is None and args.muxer_option == [] and args.ranges is None
+
+
+@pytest.mark.parametrize(
+    "argv",
+    [
+        ["in.mp4", "out.mp4", "-e", "1:xx"],
+        ["in.mp4", "out.mp4", "-e", "5", "--video-mode", "fast"],
+        ["in.mp4", "out.mp4", "-e", "5", "--streams", "subtitles"],
+        ["in.mp4", "out.mp4", "-e", "5", "--muxer-option", "faststart"],
+        ["in.mp4", "out.mp4"],
+        ["in.mp4", "-r", "1", "later", "out.mp4"],
+        ["in.mp4"],
+        [],
+    ],
+)
+def test_bad_arguments_exit_with_usage_error(argv, cuts, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        vc4u_cli.main(argv)
+    assert exit_info.value.code == 2
+    assert "vc4u: error:" in capsys.readouterr().err
+    assert cuts == []
+
+
+def test_single_cut(tmp_path, cuts, capsys):
+    output = str(tmp_path / "out.mp4")
+    assert vc4u_cli.main(["in.mp4", output, "-s", "00:01:02.5", "-e", "70"]) == 0
+    assert cuts == [(
+        "cut_media",
+        ("in.mp4", output, 62.5, 70.0),
+        {"video_mode": VIDEO_MODE_COPY, "audio_mode": AUDIO_MODE_REENCODE, "options": FFmpegOptions(), "progress": None},
+    )]
+    assert capsys.readouterr().out == f"{output} (3 bytes)\n"
+
+
+def test_ranges_are_cut_in_one_pass(tmp_path, cuts):
+    first, second, third = (str(tmp_path / f"{name}.mp4") for name in ("first", "second", "third"))
+    assert vc4u_cli.main(["in.mp4", first, "-e", "4", "-r", "10", "1:00", second, "--range", "5.5", "6", third, "-q"]) == 0
+    [(name, args, _)] = cuts
+    assert name == "cut_segments"
+    assert args == ("in.mp4", [(0.0, 4.0, first), (10.0, 60.0, second), (5.5, 6.0, third)])
+
+
+def test_mode_and_stream_flags_reach_the_cut(tmp_path, cuts):
+    output = str(tmp_path / "out.mp4")
+    argv = [
+        "in.mp4", output, "-e", "5", "--video-mode", VIDEO_MODE_SMART, "--audio-mode", AUDIO_MODE_COPY,
+        "--seek-mode", SEEK_HYBRID, "--streams", STREAMS_AUDIO, "--threads", "2",
+        "--muxer-option", "movflags=+faststart", "--muxer-option", "brand=isom", "-q",
+    ]
+    assert vc4u_cli.main(argv) == 0
+    [(_, _, kwargs)] = cuts
+    assert (kwargs["video_mode"], kwargs["audio_mode"]) == (VIDEO_MODE_SMART, AUDIO_MODE_COPY)
+    assert kwargs["options"] == FFmpegOptions(SEEK_HYBRID, STREAMS_AUDIO, 2, (("movflags", "+faststart"), ("brand", "isom")))
+
+
+def test_failed_cut_exits_with_1(tmp_path, capsys):
+    missing = str(tmp_path / "missing.wav")
+    assert vc4u_cli.main([missing, str(tmp_path / "out.wav"), "-e", "1"]) == 1
+    assert "missing.wav" in capsys.readouterr().err
+
+
+def test_cancelled_cut_exits_with_130(tmp_path, monkeypatch, capsys):
+    def cancelled(*args, **kwargs):
+        raise CutCancelled()
+
+    monkeypatch.setattr(vc4u_cli, "cut_media", cancelled)
+    assert vc4u_cli.main(["in.mp4", str(tmp_path / "out.mp4"), "-e", "1"]) == 130
+    assert capsys.readouterr().err == "vc4u: cancelled\n"
+
+
+def test_manifest_is_run_instead_of_a_cut(tmp_path, monkeypatch, cuts):
+    runs = []
+    monkeypatch.setattr(vc4u_cli, "run_manifest", lambda args: runs.append(args.manifest) or 0)
+    assert vc4u_cli.main(["--manifest", "cuts.csv", "in.mp4", "out.mp4", "-e", "1"]) == 0
+    assert runs == ["cuts.csv"] and cuts == []
+
+
+def test_missing_manifest_exits_with_1(tmp_path, capsys):
+    assert vc4u_cli.main(["--manifest", str(tmp_path / "cuts.csv")]) == 1
+    assert "cuts.csv" in capsys.readouterr().err
+
+
+@requires_ffmpeg
+def test_cut_end_to_end(tmp_path, capsys):
+    source = make_audio(tmp_path / "source.wav", 10, 44100, 2, ["-c:a", "pcm_s16le"])
+    output = tmp_path / "cut.wav"
+    assert vc4u_cli.main([source, str(output), "-s", "2.5", "-e", "00:04.25", "--audio-mode", AUDIO_MODE_COPY]) == 0
+    assert capsys.readouterr().out.startswith(f"{output} (")
+    assert decode_samples(output) == samples_between(source, 2.5, 4.25, 44100, 2)
+
+
+@requires_ffmpeg
+def test_manifest_end_to_end(tmp_path, capsys):
+    source = make_audio(tmp_path / "source.wav", 10, 44100, 2, ["-c:a", "pcm_s16le"])
+    manifest = tmp_path / "cuts.csv"
+    manifest.write_text("input,start,end\nsource.wav,1,2\nsource.wav,3,4.5\nmissing.wav,0,1\n")
+    argv = ["--manifest", str(manifest), "--audio-mode", AUDIO_MODE_COPY, "--copy-workers", "1"]
+    # The missing input fails its job and the exit code, the other rows are still cut
+    assert vc4u_cli.main(argv) == 1
+    captured = capsys.readouterr()
+    assert captured.out == "1 jobs done, 1 failed, 3 manifest rows\n"
+    assert "missing.wav" in captured.err
+    assert decode_samples(tmp_path / "source_001.wav") == samples_between(source, 1, 2, 44100, 2)
+    assert decode_samples(tmp_path / "source_002.wav") == samples_between(source, 3, 4.5, 44100, 2)
@@ -0,0 +1,57 @@
+import errno
+import os
+
+import disk_cache
+from disk_cache import DiskCache, LRUCache, cached_index
+
+
+def test_put_and_get(tmp_path, monkeypatch):
+    monkeypatch.setenv("VC4U_CACHE_DIR", str(tmp_path))
+    cache = DiskCache("entries", 1024)
+    cache.put("key", b"value")
+    assert cache.get("key") == b"value"
+    assert cache.get("other") is None
+
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("VC4U_CACHE_DIR", str(tmp_path))
+    cache = DiskCache("entries", 1024)
+    fdopen = os.fdopen
+
+    class FullDisk:
+        # Takes the file over from mkstemp and fails the write the way a full disk does
+        def __init__(self, fd, mode):
+            self.file = fdopen(fd, mode)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            self.file.close()
+
+        def write(self, data):
+            raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(disk_cache.os, "fdopen", FullDisk)
+    cache.put("key", b"value")
+    assert cache.get("key") is None
+    assert os.listdir(tmp_path / "entries") == []
+
+
+def test_cached_index_builds_once(tmp_path, monkeypatch):
+    monkeypatch.setenv("VC4U_CACHE_DIR", str(tmp_path))
+    disk = DiskCache("entries", 1024)
+    builds = []
+
+    def lookup(memory):
+        return cached_index("key", memory, disk, lambda: builds.append(1) or 42, lambda value: str(value).encode(), int)
+
+    memory = LRUCache(4)
+    assert lookup(memory) == 42 and lookup(memory) == 42
+    # A new process starts with an empty memory cache but finds the entry on disk
+    assert lookup(LRUCache(4)) == 42
+    assert len(builds) == 1
+    # An entry that no longer loads is rebuilt and replaced
+    disk.put("key", b"not a number")
+    assert lookup(LRUCache(4)) == 42 and len(builds) == 2
+    assert disk.get("key") == b"42"
@@ -0,0 +1,23 @@
+import pytest
+
+from cutter import cut_media
+from ffmpeg_utils import run_ffprobe
+from helpers import make_video, requires_ffmpeg
+
+
+def test_missing_ffprobe_is_named(tmp_path, monkeypatch):
+    monkeypatch.setenv("VC4U_FFPROBE", str(tmp_path / "ffprobe"))
+    with pytest.raises(RuntimeError, match="ffprobe is required but was not found"):
+        run_ffprobe(["-show_format", str(tmp_path / "any.mkv")])
+
+
+@requires_ffmpeg
+def test_forced_engine_reports_the_failed_probe(tmp_path, monkeypatch):
+    pytest.importorskip("av")
+    source = make_video(tmp_path / "source.mkv", 4)
+    monkeypatch.setenv("VC4U_FFPROBE", str(tmp_path / "ffprobe"))
+    with pytest.raises(ValueError, match="needs the input probed first: ffprobe is required"):
+        cut_media(source, str(tmp_path / "cut.mkv"), 1.0, 3.0, engine="pyav")
+    # Engines that read the container themselves still cut without it
+    cut_media(source, str(tmp_path / "cut.mkv"), 1.0, 3.0, engine="mkv")
+    assert (tmp_path / "cut.mkv").stat().st_size > 0
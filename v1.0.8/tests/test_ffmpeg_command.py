@@ -0,0 +1,98 @@
+import pytest
+
+from ffmpeg_command import (
+    HYBRID_SEEK_PREROLL, SEEK_HYBRID, SEEK_INPUT, SEEK_OUTPUT, STREAMS_ALL, STREAMS_AUDIO, STREAMS_AUDIO_VIDEO,
+    STREAMS_VIDEO, FFmpegOptions, check_options, cut_args, muxer_args, seek_args, stream_args, thread_args,
+)
+from ffmpeg_utils import run_ffmpeg
+from helpers import frame_numbers, frames_between, make_video, requires_ffmpeg
+
+
+@pytest.mark.parametrize(
+    "start, duration, seek_mode, input_seek, output_seek",
+    [
+        (12.5, 4.0, SEEK_INPUT, ["-ss", "12.5"], ["-t", "4.0"]),
+        (12.5, 4.0, SEEK_OUTPUT, [], ["-ss", "12.5", "-t", "4.0"]),
+        # Jump to start - preroll, then read the preroll back up to the start
+        (12.5, 4.0, SEEK_HYBRID, ["-ss", "7.5"], ["-ss", "5.0", "-t", "4.0"]),
+        (HYBRID_SEEK_PREROLL, 1.0, SEEK_HYBRID, ["-ss", "0.0"], ["-ss", "5.0", "-t", "1.0"]),
+        # Closer to the file's start than the preroll: everything before the start is read
+        (3.25, 1.5, SEEK_HYBRID, ["-ss", "0.0"], ["-ss", "3.25", "-t", "1.5"]),
+        (0.0, 2.0, SEEK_HYBRID, ["-ss", "0.0"], ["-ss", "0.0", "-t", "2.0"]),
+        # Times are written out exactly, never rounded
+        (0.1 + 0.2, 1 / 3, SEEK_INPUT, ["-ss", "0.30000000000000004"], ["-t", "0.3333333333333333"]),
+    ],
+)
+def test_seek_args(start, duration, seek_mode, input_seek, output_seek):
+    assert seek_args(start, duration, seek_mode) == (input_seek, output_seek)
+
+
+@pytest.mark.parametrize(
+    "streams, default, expected",
+    [
+        (None, STREAMS_ALL, ["-map", "0"]),
+        (None, STREAMS_AUDIO, ["-map", "0:a"]),
+        (STREAMS_ALL, STREAMS_AUDIO, ["-map", "0"]),
+        (STREAMS_AUDIO_VIDEO, STREAMS_ALL, ["-map", "0:v:0?", "-map", "0:a?"]),
+        (STREAMS_VIDEO, STREAMS_ALL, ["-map", "0:v:0"]),
+        (STREAMS_AUDIO, STREAMS_ALL, ["-map", "0:a"]),
+    ],
+)
+def test_stream_args(streams, default, expected):
+    args = stream_args(FFmpegOptions(streams=streams), default)
+    assert args == expected
+    # Callers may extend what they get back
+    args.append("-sn")
+    assert stream_args(FFmpegOptions(streams=streams), default) == expected
+
+
+@pytest.mark.parametrize(
+    "muxer_options, expected",
+    [
+        ((), []),
+        ((("movflags", "+faststart"),), ["-movflags", "+faststart"]),
+        ((("-movflags", "+faststart"), ("--brand", "isom")), ["-movflags", "+faststart", "-brand", "isom"]),
+        ((("max_interleave_delta", 0), ("metadata", "")), ["-max_interleave_delta", "0", "-metadata", ""]),
+    ],
+)
+def test_muxer_args(muxer_options, expected):
+    assert muxer_args(FFmpegOptions(muxer_options=muxer_options)) == expected
+
+
+@pytest.mark.parametrize("threads, expected", [(None, []), (0, []), (4, ["-threads", "4"])])
+def test_thread_args(threads, expected):
+    assert thread_args(FFmpegOptions(threads=threads)) == expected
+
+
+@pytest.mark.parametrize(
+    "options, message",
+    [(FFmpegOptions(seek_mode="fast"), "Unknown seek mode: fast"), (FFmpegOptions(streams="subtitles"), "Unknown stream selection: subtitles")],
+)
+def test_bad_options(options, message):
+    with pytest.raises(ValueError, match=message):
+        check_options(options)
+
+
+def test_cut_args_order():
+    options = FFmpegOptions(SEEK_HYBRID, STREAMS_VIDEO, 2, (("movflags", "+faststart"),))
+    args = cut_args("in.mp4", "out.mp4", 20.0, 30.0, ["-c", "copy"], options=options, output_format="mp4")
+    assert args == [
+        "-ss", "15.0", "-i", "in.mp4", "-ss", "5.0", "-t", "10.0",
+        "-map", "0:v:0", "-c", "copy", "-threads", "2", "-movflags", "+faststart", "-f", "mp4", "out.mp4",
+    ]
+    assert cut_args("in.mp4", "out.mp4", 20.0, 30.0, ["-c", "copy"]) == ["-ss", "20.0", "-i", "in.mp4", "-t", "10.0", "-map", "0", "-c", "copy", "out.mp4"]
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("start, end", [(7.3, 9.0), (2.04, 3.0)])
+def test_hybrid_seek_reads_the_same_frames_as_an_output_seek(tmp_path, start, end):
+    source = make_video(tmp_path / "source.mkv", 12)
+    numbers = {}
+    for seek_mode in (SEEK_OUTPUT, SEEK_HYBRID):
+        output = tmp_path / f"{seek_mode}.mkv"
+        encode = ["-c:v", "libx264", "-preset", "ultrafast", "-an"]
+        run_ffmpeg(cut_args(source, str(output), start, end, encode, options=FFmpegOptions(seek_mode=seek_mode)))
+        numbers[seek_mode] = frame_numbers(output)
+    assert numbers[SEEK_HYBRID] == numbers[SEEK_OUTPUT]
+    # Decoding starts on a keyframe before the preroll, yet nothing before start is kept
+    assert numbers[SEEK_HYBRID][0] == frames_between(source, start, end)[0]
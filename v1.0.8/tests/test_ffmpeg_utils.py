@@ -0,0 +1,87 @@
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+
+import ffmpeg_utils
+from cutter import cut_media
+from ffmpeg_utils import CutCancelled, remove_partial_output, run_ffmpeg
+from helpers import make_video, requires_ffmpeg
+from video_cutter import VIDEO_MODE_REENCODE
+
+pytestmark = requires_ffmpeg
+
+# Real time ffmpeg takes to write its slow output, far longer than a cancel may take
+SLOW_SECONDS = 60
+
+
+@pytest.fixture
+def children(monkeypatch):
+    # Every process run_ffmpeg starts
+    processes = []
+    popen = subprocess.Popen
+
+    def recording_popen(*args, **kwargs):
+        processes.append(popen(*args, **kwargs))
+        return processes[-1]
+
+    monkeypatch.setattr(ffmpeg_utils.subprocess, "Popen", recording_popen)
+    return processes
+
+
+def cancel_once_written(path, cancel):
+    # Cancels as soon as ffmpeg has put something in path
+    def watch():
+        while not os.path.exists(path) or not os.path.getsize(path):
+            time.sleep(0.01)
+        cancel.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+@pytest.mark.parametrize("with_progress", [False, True])
+def test_cancel_stops_ffmpeg(tmp_path, monkeypatch, children, with_progress):
+    # ffmpeg ignores the request to stop while -re holds it back, so it has to be killed
+    monkeypatch.setattr(ffmpeg_utils, "TERMINATE_TIMEOUT", 0.5)
+    output = str(tmp_path / "slow.wav")
+    cancel = threading.Event()
+    cancel_once_written(output, cancel)
+    started = time.monotonic()
+    with pytest.raises(CutCancelled):
+        # -re reads the input at its own speed, so ffmpeg is still busy when the cancel comes
+        run_ffmpeg(
+            ["-re", "-f", "lavfi", "-i", f"sine=d={SLOW_SECONDS}", "-c:a", "pcm_s16le", output],
+            progress=(lambda block: None) if with_progress else None,
+            cancel=cancel,
+        )
+    assert time.monotonic() - started < SLOW_SECONDS / 4
+    [process] = children
+    assert process.poll() is not None
+    # What ffmpeg wrote so far is left for the caller to remove
+    assert os.path.getsize(output) > 0
+    remove_partial_output(output)
+    assert not os.path.exists(output)
+    remove_partial_output(output)
+
+
+def test_cancel_before_the_start_runs_nothing(tmp_path, children):
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(CutCancelled):
+        run_ffmpeg(["-f", "lavfi", "-i", "sine=d=1", str(tmp_path / "out.wav")], cancel=cancel)
+    assert children == []
+
+
+def test_cancelled_cut_leaves_no_output(tmp_path, children):
+    source = make_video(tmp_path / "source.mkv", 12)
+    output = tmp_path / "cut.mkv"
+    cancel = threading.Event()
+    with pytest.raises(CutCancelled):
+        cut_media(
+            source, str(output), 1.0, 11.0, video_mode=VIDEO_MODE_REENCODE,
+            progress=lambda update: cancel.set(), cancel=cancel, engine="ffmpeg",
+        )
+    assert children and all(process.poll() is not None for process in children)
+    assert not output.exists()
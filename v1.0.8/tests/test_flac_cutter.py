@@ -0,0 +1,44 @@
+import pytest
+
+from flac_cutter import cut_flac
+from helpers import decode_samples, ffmpeg, ffprobe, make_audio, requires_ffmpeg, samples_between
+
+pytestmark = requires_ffmpeg
+
+RANGES = [(0.0, 20.0), (1.23457, 7.5), (5.0, 5.01), (19.99, 25.0), (3.0, 3.00002), (0.5, 12.345)]
+
+
+@pytest.fixture(scope="module", params=[(44100, 2, "s16", ()), (48000, 1, "s32", ("-frame_size", "1152")), (96000, 2, "s32", ())], ids=["16bit-stereo", "24bit-mono-1152", "24bit-96k"])
+def source(request, media_dir):
+    sample_rate, channels, sample_format, frame_size = request.param
+    path = media_dir / f"{sample_rate}_{channels}_{sample_format}.flac"
+    codec = ["-c:a", "flac", "-sample_fmt", sample_format, *frame_size] + (["-bits_per_raw_sample", "24"] if sample_format == "s32" else [])
+    return make_audio(path, 20, sample_rate, channels, codec), sample_rate, channels
+
+
+def check_frames(path):
+    # Fails on any frame whose header or CRC-16 doesn't check out
+    ffmpeg("-err_detect", "crccheck+explode", "-xerror", "-i", str(path), "-f", "null", "-")
+
+
+@pytest.mark.parametrize("start, end", RANGES)
+def test_exact_cut_is_sample_exact(source, tmp_path, start, end):
+    path, sample_rate, channels = source
+    output = tmp_path / "cut.flac"
+    cut_flac(path, str(output), start, end)
+    check_frames(output)
+    assert decode_samples(output) == samples_between(path, start, end, sample_rate, channels)
+
+
+@pytest.mark.parametrize("start, end", RANGES)
+def test_copy_keeps_the_frames_around_the_range(source, tmp_path, start, end):
+    path, sample_rate, channels = source
+    output = tmp_path / "cut.flac"
+    cut_flac(path, str(output), start, end, exact=False)
+    check_frames(output)
+    # Frame boundaries in samples, first frame to end of stream
+    starts = [round(float(pts) * sample_rate) for pts in ffprobe("-show_entries", "packet=pts_time", path)]
+    total = len(decode_samples(path)) // channels
+    first = max(sample for sample in starts if sample <= round(start * sample_rate))
+    last = min([sample for sample in starts if sample >= round(end * sample_rate)] + [total])
+    assert decode_samples(output) == samples_between(path, first / sample_rate, last / sample_rate, sample_rate, channels)
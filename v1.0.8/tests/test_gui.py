@@ -0,0 +1,89 @@
+import os
+import time
+
+import pytest
+
+from helpers import make_video, requires_ffmpeg
+from job_queue import JOB_DONE
+
+pytestmark = requires_ffmpeg
+
+# How long the stand-in keyframe index takes to build, far longer than any GUI handler may block
+INDEX_SECONDS = 1.0
+
+
+@pytest.fixture(scope="module")
+def qt_app():
+    pytest.importorskip("PyQt5")
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def window(qt_app, monkeypatch):
+    import keyframe_index
+    import VC4U
+
+    def slow_keyframe_index(input_file):
+        time.sleep(INDEX_SECONDS)
+        return keyframe_index.get_keyframe_index(input_file)
+
+    # The stylesheet goes on the application __main__ creates
+    monkeypatch.setattr(VC4U, "app", qt_app, raising=False)
+    monkeypatch.setattr(VC4U, "get_keyframe_index", slow_keyframe_index)
+    window = VC4U.VideoCutterApp()
+    yield window
+    window.job_queue.shutdown()
+
+
+def process_events_until(qt_app, condition, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the GUI"
+        qt_app.processEvents()
+        time.sleep(0.01)
+
+
+def set_times(window, start, end):
+    window.time_edit_start.setTime(window.seconds_to_time(start))
+    window.time_edit_end.setTime(window.seconds_to_time(end))
+
+
+def shown_times(window):
+    return [window.time_to_seconds(edit.time().toString("HH:mm:ss.zzz")) for edit in (window.time_edit_start, window.time_edit_end)]
+
+
+def test_snapping_waits_for_the_index_off_the_gui_thread(qt_app, window, tmp_path):
+    source = make_video(tmp_path / "source.mkv", 12)
+    window.input_entry.setText(source)
+    set_times(window, 5.3, 7.1)
+    started = time.monotonic()
+    window.snap_checkbox.setChecked(True)
+    assert time.monotonic() - started < INDEX_SECONDS / 2
+    assert shown_times(window) == [5.3, 7.1]
+
+    process_events_until(qt_app, lambda: window.snap_pending is None)
+    index = window.keyframe_index[1]
+    assert shown_times(window) == [round(index.keyframe_at_or_before(5.3), 3), round(index.keyframe_at_or_after(7.1), 3)]
+    # Once indexed, later edits snap straight away
+    set_times(window, 2.5, 3.0)
+    window.snap_times_to_keyframes()
+    assert shown_times(window) == [round(index.keyframe_at_or_before(2.5), 3), round(index.keyframe_at_or_after(3.0), 3)]
+
+
+def test_cut_on_an_input_being_prefetched_waits_for_it(qt_app, window, tmp_path):
+    source = make_video(tmp_path / "source.mkv", 12)
+    output = tmp_path / "cut.mkv"
+    window.input_entry.setText(source)
+    window.prefetch_input()
+    window.output_entry.setText(str(output))
+    set_times(window, 2.0, 6.0)
+    started = time.monotonic()
+    window.cut_file()
+    assert time.monotonic() - started < INDEX_SECONDS / 2
+    assert not window.job_queue.status and len(window.pending_jobs) == 1
+
+    process_events_until(qt_app, lambda: window.job_queue.counts[JOB_DONE] == 1)
+    assert not window.pending_jobs and output.stat().st_size > 0
@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from audio_cutter import AUDIO_MODE_COPY
+from helpers import decode_samples, frame_numbers, frames_between, make_audio, make_video, requires_ffmpeg, samples_between
+from job_queue import FINISHED_STATES, JOB_CANCELLED, JOB_DONE, JOB_QUEUED, CutJob, JobQueue
+from video_cutter import VIDEO_MODE_SMART
+
+pytestmark = requires_ffmpeg
+
+
+@pytest.fixture(scope="module")
+def video(media_dir):
+    return make_video(media_dir / "queued.mkv", 20)
+
+
+@pytest.fixture(scope="module")
+def audio(media_dir):
+    return make_audio(media_dir / "queued.wav", 20, 44100, 2, ["-c:a", "pcm_s16le"])
+
+
+class Recorder:
+    # on_update callback keeping every status each job went through
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.updates = {}
+
+    def __call__(self, job_id, status, detail):
+        with self.lock:
+            self.updates.setdefault(job_id, []).append(status)
+
+
+@pytest.fixture
+def queue():
+    recorder = Recorder()
+    queue = JobQueue(copy_workers=2, encode_workers=1, on_update=recorder)
+    queue.recorder = recorder
+    yield queue
+    queue.shutdown()
+
+
+def test_jobs_run_on_both_pools_and_cut_exactly(queue, video, audio, tmp_path):
+    jobs = {
+        "smart.mkv": CutJob(video, str(tmp_path / "smart.mkv"), 3.0, 9.9, video_mode=VIDEO_MODE_SMART),
+        "copy.wav": CutJob(audio, str(tmp_path / "copy.wav"), 1.23457, 7.5, audio_mode=AUDIO_MODE_COPY),
+    }
+    ids = {name: queue.submit(job) for name, job in jobs.items()}
+    queue.wait()
+    for job_id in ids.values():
+        statuses = queue.recorder.updates[job_id]
+        assert statuses[0] == JOB_QUEUED and statuses[-1] == JOB_DONE
+        assert not set(statuses[1:-1]) & set(FINISHED_STATES + (JOB_QUEUED,))
+    assert queue.counts[JOB_DONE] == 2 and queue.active_count() == 0
+    assert frame_numbers(tmp_path / "smart.mkv") == frames_between(video, 3.0, 9.9)
+    assert decode_samples(tmp_path / "copy.wav") == samples_between(audio, 1.23457, 7.5, 44100, 2)
+
+
+def test_cancelled_jobs_waiting_for_a_worker_never_run(queue, video, tmp_path):
+    # One encoder and its one queued-ahead call leave the later jobs waiting
+    jobs = [CutJob(video, str(tmp_path / f"cut{i}.mkv"), 0.0, 12.0, video_mode=VIDEO_MODE_SMART) for i in range(4)]
+    ids = [queue.submit(job) for job in jobs]
+    queue.cancel(ids[-1])
+    queue.wait()
+    assert queue.recorder.updates[ids[-1]] == [JOB_QUEUED, JOB_CANCELLED]
+    assert not (tmp_path / "cut3.mkv").exists()
+    assert queue.counts == {**dict.fromkeys(FINISHED_STATES, 0), JOB_DONE: 3, JOB_CANCELLED: 1}
+
+
+def test_submit_all_keeps_few_jobs_pending(queue, audio, tmp_path):
+    pending = []
+    jobs = (CutJob(audio, str(tmp_path / f"part{i}.wav"), i, i + 1.5, audio_mode=AUDIO_MODE_COPY) for i in range(6))
+    queue.submit_all(jobs, max_pending=2, submitted=lambda: pending.append(queue.active_count()))
+    queue.wait()
+    assert len(pending) == 6 and max(pending) <= 2
+    for i in range(6):
+        assert decode_samples(tmp_path / f"part{i}.wav") == samples_between(audio, i, i + 1.5, 44100, 2)
@@ -0,0 +1,77 @@
+import pytest
+
+import joiner
+from audio_cutter import AUDIO_MODE_COPY
+from helpers import decode_samples, ffprobe, frame_numbers, frames_between, make_audio, make_video, requires_ffmpeg, samples_between
+from video_cutter import VIDEO_MODE_SMART
+
+pytestmark = requires_ffmpeg
+
+# make_video's audio
+SAMPLE_RATE = 48000
+
+
+@pytest.fixture
+def ffmpeg_runs(monkeypatch):
+    # The output file of every ffmpeg run, in order
+    outputs = []
+    run_ffmpeg = joiner.run_ffmpeg
+
+    def recording_run_ffmpeg(args, progress=None, cancel=None):
+        outputs.append(args[-1])
+        return run_ffmpeg(args, progress=progress, cancel=cancel)
+
+    monkeypatch.setattr(joiner, "run_ffmpeg", recording_run_ffmpeg)
+    return outputs
+
+
+def test_matching_files_are_copied(tmp_path, ffmpeg_runs):
+    first = make_video(tmp_path / "first.mkv", 6)
+    second = make_video(tmp_path / "second.mkv", 4)
+    output = tmp_path / "joined.mkv"
+    joiner.join_files([first, second], str(output))
+    assert ffmpeg_runs == [str(output)]
+    assert frame_numbers(output) == list(range(150)) + list(range(100))
+
+
+@pytest.mark.parametrize("extension", [".mp4", ".mkv"])
+def test_other_frame_rate_is_conformed(tmp_path, ffmpeg_runs, extension):
+    first = make_video(tmp_path / f"first{extension}", 6)
+    second = make_video(tmp_path / f"second{extension}", 3, rate=30)
+    output = tmp_path / f"joined{extension}"
+    joiner.join_files([first, second], str(output))
+    assert len(ffmpeg_runs) == 2
+    # Every 25 fps frame shows the 30 fps frame nearest to it
+    numbers = frame_numbers(output)
+    assert numbers == list(range(150)) + [round(number * 30 / 25) for number in range(75)]
+    assert ffprobe("-select_streams", "v:0", "-show_entries", "stream=r_frame_rate", str(output)) == ["25/1"]
+    assert len(decode_samples(output)) / SAMPLE_RATE == pytest.approx(len(numbers) / 25, abs=0.1)
+
+
+def test_missing_audio_is_filled_with_silence(tmp_path):
+    first = make_video(tmp_path / "first.mkv", 6)
+    second = make_video(tmp_path / "second.mkv", 3, audio=False)
+    output = tmp_path / "joined.mkv"
+    joiner.join_files([first, second], str(output))
+    assert frame_numbers(output) == list(range(150)) + list(range(75))
+    samples = decode_samples(output)
+    assert len(samples) / SAMPLE_RATE == pytest.approx(9.0, abs=0.1)
+    # Leave an AAC frame either side of the join for the codec's overlap
+    assert any(samples[:6 * SAMPLE_RATE]) and not any(samples[int(6.1 * SAMPLE_RATE):])
+
+
+def test_video_ranges_join_in_the_order_given(tmp_path):
+    source = make_video(tmp_path / "source.mkv", 24)
+    output = tmp_path / "joined.mkv"
+    ranges = [(10.0, 14.0), (2.3, 5.5)]
+    joiner.join_ranges(source, ranges, str(output), VIDEO_MODE_SMART, AUDIO_MODE_COPY)
+    assert frame_numbers(output) == [number for start, end in ranges for number in frames_between(source, start, end)]
+
+
+def test_audio_ranges_join_sample_exact(tmp_path):
+    source = make_audio(tmp_path / "source.wav", 20, 44100, 2, ["-c:a", "pcm_s16le"])
+    output = tmp_path / "joined.wav"
+    ranges = [(12.5, 13.25), (0.1, 2.0), (7.0, 9.123)]
+    joiner.join_ranges(source, ranges, str(output), VIDEO_MODE_SMART, AUDIO_MODE_COPY)
+    expected = [sample for start, end in ranges for sample in samples_between(source, start, end, 44100, 2)]
+    assert list(decode_samples(output)) == expected
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from helpers import frame_numbers, frames_between, make_video, requires_ffmpeg
+from job_queue import CutJob, SegmentsJob
+from manifest import ManifestReader, group_jobs, timecode_to_seconds
+from video_cutter import VIDEO_MODE_SMART
+
+EDL = """TITLE: TEST
+FCM: NON-DROP FRAME
+
+001  AX       V     C        {0}:00:03:00 {0}:00:07:12 00:00:00:00 00:00:04:12
+* FROM CLIP NAME: {1}
+
+002  BL       V     C        00:00:00:00 00:00:01:00 00:00:04:12 00:00:05:12
+
+003  AX       V     C        {0}:00:01:00 {0}:00:02:00 00:00:05:12 00:00:06:12
+003  AX       V     D 012    {0}:00:09:00 {0}:00:10:05 00:00:05:12 00:00:06:17
+* FROM CLIP NAME: {1}
+"""
+
+
+def test_csv_rows_become_jobs(tmp_path):
+    manifest = tmp_path / "cuts.csv"
+    manifest.write_text("Input,Start,End,Output\nclip.mkv,1.5,00:00:04.25,\nclip.mkv,10,1:02,out/named.mkv\n")
+    jobs = list(ManifestReader(str(manifest)))
+    assert [(job.input_file, job.start_seconds, job.end_seconds, job.output_file) for job in jobs] == [
+        (str(tmp_path / "clip.mkv"), 1.5, 4.25, str(tmp_path / "clip_001.mkv")),
+        (str(tmp_path / "clip.mkv"), 10.0, 62.0, str(tmp_path / "out" / "named.mkv")),
+    ]
+
+
+@pytest.mark.parametrize("wrapped", [False, True])
+def test_json_jobs_keep_their_modes(tmp_path, wrapped):
+    records = [
+        {"input": "a.mkv", "start": 0, "end": 2.5, "video_mode": VIDEO_MODE_SMART},
+        {"input": "b.wav", "start": "00:01", "end": "00:02.5"},
+    ]
+    manifest = tmp_path / "cuts.json"
+    manifest.write_text(json.dumps({"jobs": records} if wrapped else records))
+    jobs = list(ManifestReader(str(manifest)))
+    assert [(job.start_seconds, job.end_seconds, job.video_mode) for job in jobs] == [(0.0, 2.5, VIDEO_MODE_SMART), (1.0, 2.5, "copy")]
+
+
+def test_bad_rows_name_their_line(tmp_path):
+    manifest = tmp_path / "cuts.csv"
+    manifest.write_text("input,start,end\nclip.mkv,1,2\nclip.mkv,5,3\n")
+    with pytest.raises(ValueError, match=r"cuts\.csv:3: end time must be after start time"):
+        list(ManifestReader(str(manifest)))
+
+
+def test_jobs_are_grouped_per_input_in_file_order(tmp_path):
+    jobs = [CutJob("a.mkv", f"a{i}.mkv", start, start + 1) for i, start in enumerate([30, 10, 20])] + [CutJob("b.mkv", "b.mkv", 5, 6)]
+    grouped = list(group_jobs(jobs))
+    assert isinstance(grouped[0], SegmentsJob) and grouped[0].segments == [(10, 11, "a1.mkv"), (20, 21, "a2.mkv"), (30, 31, "a0.mkv")]
+    assert isinstance(grouped[1], CutJob) and grouped[1].output_file == "b.mkv"
+
+
+def test_drop_frame_timecode():
+    # 00:01:00;02 is the first frame number of the second minute, 1800 frames in
+    assert timecode_to_seconds("00:01:00;02", 30000 / 1001, drop_frame=True) == pytest.approx(1800 * 1001 / 30000)
+    assert timecode_to_seconds("00:10:00;00", 30000 / 1001, drop_frame=True) == pytest.approx(17982 * 1001 / 30000)
+
+
+@requires_ffmpeg
+def test_edl_source_timecodes_count_from_the_first_frame(tmp_path):
+    source = make_video(tmp_path / "tape.mkv", 12, timecode="01:00:00:00")
+    manifest = tmp_path / "cuts.edl"
+    manifest.write_text(EDL.format("01", "tape.mkv"))
+    jobs = list(ManifestReader(str(manifest), video_mode=VIDEO_MODE_SMART))
+    # The black event is skipped; the dissolve cuts to its second clip
+    assert [time for job in jobs for time in (job.start_seconds, job.end_seconds)] == pytest.approx([3.0, 7.48, 9.0, 10.2])
+    for job in jobs:
+        job.run()
+        assert frame_numbers(job.output_file) == frames_between(source, job.start_seconds, job.end_seconds)
+
+
+@requires_ffmpeg
+def test_edl_file_positions_are_kept(tmp_path):
+    # Some tools write positions in the file rather than the source's own timecode
+    make_video(tmp_path / "tape.mkv", 12, timecode="01:00:00:00")
+    manifest = tmp_path / "cuts.edl"
+    manifest.write_text(EDL.format("00", "tape.mkv"))
+    jobs = list(ManifestReader(str(manifest)))
+    assert [time for job in jobs for time in (job.start_seconds, job.end_seconds)] == pytest.approx([3.0, 7.48, 9.0, 10.2])
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from audio_cutter import AUDIO_MODE_COPY
+from helpers import decode_samples, make_audio, requires_ffmpeg, samples_between
+from job_queue import CutJob, JobQueue, SegmentsJob
+from manifest import READ_CHUNK_SIZE, ManifestReader, group_jobs
+
+# Names long enough that a few hundred rows span several read chunks, with a character
+# that takes two bytes in UTF-8 so some of them straddle a chunk boundary
+NAME = "clip_" + "é" * 40
+
+
+def test_csv_is_read_as_jobs_are_taken(tmp_path):
+    manifest = tmp_path / "cuts.csv"
+    rows = [f"{NAME}{i % 3}.wav,{i},{i + 0.5}" for i in range(3000)]
+    manifest.write_text("input,start,end\n" + "\n".join(rows) + "\n", encoding="utf-8")
+    reader = ManifestReader(str(manifest))
+    jobs = iter(reader)
+    first = next(jobs)
+    assert first.start_seconds == 0.0 and reader.bytes_read <= READ_CHUNK_SIZE
+    rest = list(jobs)
+    assert reader.rows_read == 3000 and reader.fraction == 1.0
+    assert [job.input_file.rsplit("/", 1)[1] for job in rest[-3:]] == [f"{NAME}{i % 3}.wav" for i in range(2997, 3000)]
+
+
+def test_json_records_across_read_chunks(tmp_path):
+    records = [{"input": f"{NAME}.wav", "start": i, "end": i + 1, "note": "x" * (i % 97)} for i in range(2000)]
+    manifest = tmp_path / "cuts.json"
+    manifest.write_text(json.dumps({"jobs": records}, indent=1, ensure_ascii=False), encoding="utf-8")
+    jobs = list(ManifestReader(str(manifest)))
+    assert [job.start_seconds for job in jobs] == [float(i) for i in range(2000)]
+    assert all(job.input_file.endswith(f"{NAME}.wav") for job in jobs)
+
+
+@pytest.mark.parametrize("cut, message", [(1, "unexpected end of the job list"), (9, "job 3: Unterminated string")])
+def test_cut_json_list_is_an_error(tmp_path, cut, message):
+    manifest = tmp_path / "cuts.json"
+    manifest.write_text(json.dumps([{"input": "a.wav", "start": 0, "end": 1}] * 3)[:-cut])
+    with pytest.raises(ValueError, match=message):
+        list(ManifestReader(str(manifest)))
+
+
+def test_jobs_stay_compact():
+    job = CutJob("a.wav", "b.wav", 0.0, 1.0)
+    assert not hasattr(job, "__dict__")
+
+
+def test_grouping_only_looks_a_window_ahead():
+    jobs = (CutJob("a.wav", f"{i}.wav", 10 - i, 11 - i) for i in range(6))
+    grouped = list(group_jobs(jobs, window=4))
+    # Ranges are sorted within each window, never across it
+    assert [type(job) for job in grouped] == [SegmentsJob, SegmentsJob]
+    assert [[start for start, _, _ in job.segments] for job in grouped] == [[7, 8, 9, 10], [5, 6]]
+
+
+@requires_ffmpeg
+def test_streamed_manifest_cuts_exactly(tmp_path):
+    source = make_audio(tmp_path / "source.wav", 20, 44100, 2, ["-c:a", "pcm_s16le"])
+    manifest = tmp_path / "cuts.csv"
+    ranges = [(12.5, 13.25), (0.1, 2.0), (7.0, 9.123), (3.3, 3.36), (15.0, 19.0)]
+    manifest.write_text("input,start,end\n" + "".join(f"source.wav,{start},{end}\n" for start, end in ranges))
+    queue = JobQueue(copy_workers=2, encode_workers=1)
+    try:
+        reader = ManifestReader(str(manifest), output_dir=str(tmp_path), audio_mode=AUDIO_MODE_COPY)
+        queue.submit_all(group_jobs(reader), max_pending=1)
+        queue.wait()
+    finally:
+        queue.shutdown()
+    assert queue.counts["done"] == 1
+    for number, (start, end) in enumerate(ranges, 1):
+        assert decode_samples(tmp_path / f"source_{number:03d}.wav") == samples_between(source, start, end, 44100, 2)
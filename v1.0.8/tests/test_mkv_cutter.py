@@ -0,0 +1,52 @@
+import pytest
+
+from helpers import TIME_TOLERANCE, copied_frames_between, decode_samples, ffprobe, frame_numbers, frame_times, make_video, requires_ffmpeg
+from mkv_cutter import cut_mkv
+
+pytestmark = requires_ffmpeg
+
+RANGES = [(10.5, 20.25), (3.0, 9.9), (12.0, 17.37), (0.0, 5.5), (0.0, 24.0)]
+
+
+@pytest.fixture(scope="module", params=["plain.mkv", "offset.mkv"])
+def source(request, media_dir):
+    # AAC's codec delay puts ffmpeg's start time 21 ms before the first video frame
+    options = {"plain.mkv": {}, "offset.mkv": {"start_time": 4.977}}[request.param]
+    return make_video(media_dir / request.param, 24, **options)
+
+
+@pytest.fixture(scope="module", params=["pcm.mkv", "pcm_offset.mkv"])
+def pcm_source(request, media_dir):
+    # PCM decodes the same from any block on; AAC's noise substitution doesn't
+    options = {"pcm.mkv": {}, "pcm_offset.mkv": {"start_time": 4.977}}[request.param]
+    return make_video(media_dir / request.param, 24, audio_codec=("-c:a", "pcm_s16le"), **options)
+
+
+def pcm_blocks_between(path, start, end):
+    # The samples of the whole PCM blocks stamped in [start, end), which is what a copy keeps
+    start_time = float(ffprobe("-show_entries", "format=start_time", path)[0])
+    blocks = [line.split("|") for line in ffprobe("-select_streams", "a:0", "-show_entries", "packet=pts_time,size", "-of", "compact=p=0:nk=1", path)]
+    first = last = position = 0
+    for pts, size in blocks:
+        time = float(pts) - start_time
+        if time < start - TIME_TOLERANCE:
+            first = position + int(size) // 2
+        if time < end - TIME_TOLERANCE:
+            last = position + int(size) // 2
+        position += int(size) // 2
+    return decode_samples(path)[first:last]
+
+
+@pytest.mark.parametrize("start, end", RANGES)
+def test_cut_starts_on_the_keyframe_before_start(source, tmp_path, start, end):
+    output = tmp_path / "cut.mkv"
+    cut_mkv(source, str(output), start, end)
+    assert frame_numbers(output) == copied_frames_between(source, start, end, trailing_references=True)
+
+
+@pytest.mark.parametrize("start, end", RANGES)
+def test_audio_blocks_are_copied_whole(pcm_source, tmp_path, start, end):
+    output = tmp_path / "cut.mkv"
+    cut_mkv(pcm_source, str(output), start, end)
+    first = frame_times(pcm_source)[copied_frames_between(pcm_source, start, end)[0]]
+    assert decode_samples(output) == pcm_blocks_between(pcm_source, first, end)
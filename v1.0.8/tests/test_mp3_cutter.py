@@ -0,0 +1,42 @@
+import pytest
+
+from engines import CutRequest, get_engine
+from helpers import decode_samples, make_audio, requires_ffmpeg, samples_between
+from mp3_cutter import cut_mp3
+
+pytestmark = requires_ffmpeg
+
+# (sample rate, channels, bit rate, whether the encoder writes a Xing/LAME tag)
+SOURCES = [
+    (44100, 2, "128k", True),
+    (44100, 2, "128k", False),
+    # MPEG-2 and MPEG-2.5 frames are half as long as MPEG-1 ones
+    (22050, 1, "32k", True),
+    (22050, 1, "32k", False),
+    (11025, 1, "16k", True),
+]
+
+
+@pytest.fixture(scope="module", params=SOURCES, ids=lambda source: "{}Hz-{}ch-{}-{}".format(*source[:3], "lame" if source[3] else "plain"))
+def source(request, media_dir):
+    sample_rate, channels, bit_rate, tagged = request.param
+    path = media_dir / f"{sample_rate}_{channels}_{bit_rate}_{tagged}.mp3"
+    codec = ["-c:a", "libmp3lame", "-b:a", bit_rate] + ([] if tagged else ["-write_xing", "0"])
+    return make_audio(path, 45, sample_rate, channels, codec), sample_rate, channels
+
+
+@pytest.mark.parametrize("start, end", [(5.123, 5.2), (29.5, 45.0), (0.0, 10.0), (0.0, 0.5), (0.05, 0.06), (44.0, 50.0)])
+def test_cut_is_sample_exact(source, tmp_path, start, end):
+    path, sample_rate, channels = source
+    output = tmp_path / "cut.mp3"
+    cut_mp3(path, str(output), start, end)
+    assert decode_samples(output) == samples_between(path, start, end, sample_rate, channels)
+
+
+def test_range_inside_one_frame_is_left_to_another_engine(source, tmp_path):
+    # The start trim runs on from the frame before, so ffmpeg cannot be told to keep 10 ms
+    path, _, _ = source
+    with pytest.raises(ValueError):
+        cut_mp3(path, str(tmp_path / "cut.mp3"), 0.01, 0.02)
+    request = CutRequest(path, str(tmp_path / "cut.mp3"), 0.01, 0.02, False, None, None, None, None)
+    assert not get_engine("mp3").supports(request)
@@ -0,0 +1,46 @@
+import pytest
+
+from helpers import copied_frames_between, decode_samples, frame_numbers, frame_times, make_video, requires_ffmpeg
+from mp4_cutter import cut_mp4
+
+pytestmark = requires_ffmpeg
+
+# ALAC decodes the same from any frame on; AAC's noise substitution doesn't, so it can't be compared sample by sample
+ALAC_FRAME = 4096
+
+RANGES = [(10.5, 20.25), (3.0, 9.9), (12.0, 17.37), (0.0, 5.5), (0.0, 24.0)]
+
+
+@pytest.fixture(scope="module")
+def alac_mp4(media_dir):
+    return make_video(media_dir / "alac.mp4", 24, audio_codec=("-c:a", "alac"))
+
+
+@pytest.fixture(scope="module", params=["plain.mp4", "offset.mp4", "no_bframes.mp4"])
+def source(request, media_dir):
+    options = {
+        "plain.mp4": {},
+        # Starts at 4.977 s through empty edits, and the request counts from there like ffmpeg's -ss
+        "offset.mp4": {"start_time": 4.977},
+        "no_bframes.mp4": {"bframes": 0, "gop": 12},
+    }[request.param]
+    return make_video(media_dir / request.param, 24, **options)
+
+
+@pytest.mark.parametrize("start, end", RANGES)
+def test_cut_starts_on_the_keyframe_before_start(source, tmp_path, start, end):
+    output = tmp_path / "cut.mp4"
+    cut_mp4(source, str(output), start, end)
+    assert frame_numbers(output) == copied_frames_between(source, start, end)
+
+
+@pytest.mark.parametrize("start, end", RANGES)
+def test_audio_starts_with_the_video_sample_exactly(alac_mp4, tmp_path, start, end):
+    output = tmp_path / "cut.mp4"
+    cut_mp4(alac_mp4, str(output), start, end)
+    first = round(frame_times(alac_mp4)[copied_frames_between(alac_mp4, start, end)[0]] * 48000)
+    wanted = decode_samples(alac_mp4)[first:round(end * 48000)]
+    samples = decode_samples(output)
+    # Audio is copied in whole frames; the edit list tells players to drop what runs past the end
+    assert samples[:len(wanted)] == wanted
+    assert len(samples) - len(wanted) < ALAC_FRAME
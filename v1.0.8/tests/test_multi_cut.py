@@ -0,0 +1,20 @@
+import pytest
+
+from audio_cutter import AUDIO_MODE_COPY
+from helpers import decode_samples, make_audio, requires_ffmpeg, samples_between
+from multi_cut import cut_segments
+
+RANGES = [(12.5, 13.25), (0.1, 2.0), (3.3, 3.36), (7.0, 9.123)]
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("name, codec", [("source.wav", ["-c:a", "pcm_s16le"]), ("source.mp3", ["-c:a", "libmp3lame"])])
+def test_copied_audio_ranges_are_sample_exact(tmp_path, name, codec):
+    source = make_audio(tmp_path / name, 15, 44100, 2, codec)
+    segments = [(start, end, str(tmp_path / f"cut{i}{source[-4:]}")) for i, (start, end) in enumerate(RANGES)]
+    updates = []
+    cut_segments(source, segments, audio_mode=AUDIO_MODE_COPY, progress=updates.append)
+    for start, end, output_file in segments:
+        assert decode_samples(output_file) == samples_between(source, start, end, 44100, 2)
+    fractions = [update.fraction for update in updates]
+    assert fractions == sorted(fractions) and fractions[-1] == pytest.approx(1.0)
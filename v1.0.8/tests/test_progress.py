@@ -0,0 +1,130 @@
+import os
+import stat
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import progress
+from ffmpeg_utils import run_ffmpeg
+from helpers import requires_ffmpeg
+from progress import DEFAULT_REPORT_INTERVAL, ProgressReporter, track
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # A monotonic clock the test moves by hand, starting before any reporter is made
+    now = [100.0]
+    monkeypatch.setattr(progress, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def block(seconds=None, size=None, speed=None, state="continue"):
+    values = {"progress": state}
+    if seconds is not None:
+        values["out_time_us"] = str(int(seconds * 1000000))
+    if size is not None:
+        values["total_size"] = str(size)
+    if speed is not None:
+        values["speed"] = speed
+    return values
+
+
+def test_fraction_accumulates_across_runs(clock):
+    updates = []
+    reporter = ProgressReporter(10.0, updates.append, interval=0)
+    handle = reporter.track(4.0)
+    handle(block(2.0, 1000))
+    handle(block(3.0, 1500, state="end"))
+    handle = reporter.track(6.0)
+    handle(block(3.0, 500))
+    assert [update.fraction for update in updates] == pytest.approx([0.2, 0.4, 0.7])
+    assert [update.processed_seconds for update in updates] == pytest.approx([2.0, 4.0, 7.0])
+    # Every run's bytes count, not just the last one's
+    assert [update.bytes_written for update in updates] == [1000, 1500, 2000]
+
+
+def test_run_time_is_clamped_to_its_span(clock):
+    updates = []
+    handle = ProgressReporter(10.0, updates.append, interval=0).track(4.0)
+    handle(block(6.0))
+    handle({"out_time_us": "N/A", "progress": "continue"})
+    handle({"out_time_us": "-9223372036854775807", "progress": "continue"})
+    assert [update.fraction for update in updates] == [0.4, 0.4, 0.4]
+
+
+def test_eta_and_speed(clock):
+    updates = []
+    handle = ProgressReporter(10.0, updates.append, interval=0).track(10.0)
+    handle(block(0.0))
+    assert updates[-1].eta_seconds is None
+    clock[0] += 2.0
+    handle(block(4.0, 2 * 1024 * 1024))
+    # Four seconds in two: the other six take three more, at twice real time
+    assert updates[-1].eta_seconds == pytest.approx(3.0)
+    assert updates[-1].realtime_factor == pytest.approx(2.0)
+    assert updates[-1].mb_per_second == pytest.approx(1.0)
+    # ffmpeg's own speed wins once it reports one
+    handle(block(4.0, speed="1.5x"))
+    assert updates[-1].realtime_factor == 1.5
+
+
+def test_updates_are_coalesced(clock):
+    updates = []
+    handle = ProgressReporter(10.0, updates.append).track(10.0)
+    # ffmpeg reports 16 times a second here, for 2 seconds
+    for number in range(32):
+        handle(block(number * 0.25))
+        clock[0] += 1 / 16
+    assert len(updates) == 2 / DEFAULT_REPORT_INTERVAL
+    assert [update.processed_seconds for update in updates] == [number * 1.0 for number in range(8)]
+    # The end of a run always gets through
+    handle(block(8.0, state="end"))
+    assert len(updates) == 9 and updates[-1].fraction == 1.0
+
+
+def test_track_without_a_reporter():
+    assert track(None, 5.0) is None
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    # Stands in for ffmpeg and prints whatever the test gives it on stdout
+    def install(output):
+        script = tmp_path / "ffmpeg"
+        script.write_text(f"#!{sys.executable}\nimport sys\nsys.stdout.write({output!r})\n")
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("VC4U_FFMPEG", str(script))
+
+    return install
+
+
+@pytest.mark.skipif(os.name == "nt", reason="the stand-in ffmpeg is a script")
+def test_progress_output_is_split_into_blocks(fake_ffmpeg):
+    fake_ffmpeg(
+        "frame=10\nout_time_us=400000\nspeed=2.0x\nprogress=continue\n"
+        "\n"
+        "frame=20\r\nout_time_us=800000\r\nnote=a=b\r\nprogress=continue\r\n"
+        "frame=25\nout_time_us=1000000\nprogress=end\n"
+    )
+    blocks = []
+    run_ffmpeg(["out.mkv"], progress=blocks.append)
+    assert blocks == [
+        {"frame": "10", "out_time_us": "400000", "speed": "2.0x", "progress": "continue"},
+        {"frame": "20", "out_time_us": "800000", "note": "a=b", "progress": "continue"},
+        {"frame": "25", "out_time_us": "1000000", "progress": "end"},
+    ]
+
+
+@requires_ffmpeg
+def test_ffmpeg_runs_report_to_the_end(tmp_path):
+    updates = []
+    reporter = ProgressReporter(5.0, updates.append)
+    for number, seconds in enumerate((2.0, 3.0)):
+        run_ffmpeg(
+            ["-f", "lavfi", "-i", f"sine=d={seconds}", "-c:a", "pcm_s16le", str(tmp_path / f"{number}.wav")],
+            progress=track(reporter, seconds),
+        )
+    fractions = [update.fraction for update in updates]
+    assert fractions == sorted(fractions) and fractions[-1] == pytest.approx(1.0)
+    assert updates[-1].bytes_written == sum(os.path.getsize(tmp_path / f"{number}.wav") for number in range(2))
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from helpers import copied_frames_between, frame_numbers, frames_between, make_video, requires_ffmpeg
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_engines_leave_pyav_unloaded():
+    # Picking an engine only looks for the package; av loads with the first PyAV cut
+    code = "import sys, engines; engines.get_engine('pyav').available(); print('av' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
+
+@pytest.fixture(scope="module", params=["plain.mp4", "offset.mp4", "offset.mkv"])
+def source(request, media_dir):
+    options = {"plain.mp4": {}, "offset.mp4": {"start_time": 4.977}, "offset.mkv": {"start_time": 4.977}}[request.param]
+    return make_video(media_dir / request.param, 24, **options)
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("start, end", [(10.5, 20.25), (3.3, 9.9), (0.0, 5.5)])
+def test_remux_starts_on_the_keyframe_before_start(source, tmp_path, start, end):
+    pytest.importorskip("av")
+    from pyav_cutter import remux_cut
+
+    output = tmp_path / ("cut" + source[-4:])
+    remux_cut(source, str(output), start, end)
+    numbers = frame_numbers(output)
+    # Video stops in decode order like ffmpeg's own copy, so frames past the end may follow
+    assert numbers[0] == copied_frames_between(source, start, end)[0]
+    assert set(frames_between(source, start, end)) <= set(numbers)
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from helpers import decode_samples, frame_numbers, make_audio, make_video, requires_ffmpeg
+from keyframe_index import get_keyframe_index
+from splitter import SIZE_MARGIN, split_media
+
+pytestmark = requires_ffmpeg
+
+
+@pytest.fixture(scope="module", params=["source.mkv", "source.mp4"])
+def source(request, media_dir):
+    # Keyframes every 1.5 s, so parts can never end exactly on a multiple of the part length
+    return make_video(media_dir / request.param, 30, gop=37)
+
+
+def part_starts(source):
+    # Frame number of every keyframe in the source
+    numbers = frame_numbers(source)
+    index = get_keyframe_index(source)
+    return [numbers[index.packets.index(keyframe)] for keyframe in index.keyframes]
+
+
+def test_split_by_length_starts_parts_on_the_keyframe_after_each_boundary(source, tmp_path):
+    index = get_keyframe_index(source)
+    parts = split_media(source, str(tmp_path / f"part{os.path.splitext(source)[1]}"), part_seconds=5.0)
+    expected_starts = [0]
+    for boundary in range(5, 30, 5):
+        keyframe = index.keyframe_at_or_after(boundary)
+        if keyframe is not None and keyframe > index.keyframes[0]:
+            expected_starts.append(index.packets.index(keyframe))
+    assert len(parts) == len(expected_starts)
+    numbers = [frame_numbers(part) for part in parts]
+    assert [part[0] for part in numbers] == expected_starts
+    # Nothing is lost or shown twice at the splits
+    assert [number for part in numbers for number in part] == frame_numbers(source)
+
+
+def test_split_by_size_keeps_every_part_under_the_limit(source, tmp_path):
+    limit = os.path.getsize(source) // 4
+    parts = split_media(source, str(tmp_path / f"part{os.path.splitext(source)[1]}"), part_bytes=limit)
+    assert len(parts) >= 4
+    assert all(os.path.getsize(part) <= limit for part in parts)
+    numbers = [frame_numbers(part) for part in parts]
+    assert all(part[0] in part_starts(source) for part in numbers)
+    assert [number for part in numbers for number in part] == frame_numbers(source)
+
+
+def test_split_audio_by_size(tmp_path):
+    source = make_audio(tmp_path / "source.wav", 20, 44100, 2, ["-c:a", "pcm_s16le"])
+    limit = 1024 * 1024
+    parts = split_media(source, str(tmp_path / "part.wav"), part_bytes=limit)
+    assert len(parts) == -(-os.path.getsize(source) // int(limit * (1 - SIZE_MARGIN)))
+    assert all(os.path.getsize(part) <= limit for part in parts)
+    assert [sample for part in parts for sample in decode_samples(part)] == list(decode_samples(source))
@@ -0,0 +1,114 @@
+import os
+import time
+
+import pytest
+
+import video_cutter
+from ffmpeg_utils import CutCancelled
+from helpers import encoder_available, frame_numbers, frames_between, make_video, requires_ffmpeg
+
+pytestmark = requires_ffmpeg
+
+
+@pytest.fixture(scope="module")
+def shifted_mkv(media_dir):
+    # Starts at 4 s rather than 0, the way captures and remuxed cuts often do
+    return make_video(media_dir / "shifted.mkv", 50, start_time=4.0)
+
+
+HEVC = ("-c:v", "libx265", "-preset", "ultrafast", "-x265-params", "log-level=error")
+
+
+@pytest.fixture(scope="module", params=["plain.mkv", "plain.mp4", "short_gop.mkv", "no_audio.mkv", "offset.mkv", "hevc.mkv", "hevc_closed_gop.mp4"])
+def source(request, media_dir):
+    options = {
+        "plain.mkv": {},
+        "plain.mp4": {},
+        # GOPs shorter than ffmpeg's own seek back-off
+        "short_gop.mkv": {"gop": 5, "bframes": 3},
+        "no_audio.mkv": {"audio": False},
+        "offset.mkv": {"start_time": 4.977},
+        # x265 starts its GOPs on CRA frames whose leading frames refer back to the GOP before
+        "hevc.mkv": {"codec": HEVC},
+        "hevc_closed_gop.mp4": {"codec": HEVC[:-1] + ("log-level=error:open-gop=0",)},
+    }[request.param]
+    if "codec" in options and not encoder_available("libx265"):
+        pytest.skip("ffmpeg was built without libx265")
+    return make_video(media_dir / request.param, 24, **options)
+
+
+@pytest.mark.parametrize("start, end", [(10.5, 20.25), (3.0, 9.9), (12.0, 17.37), (0.0, 5.5), (3.0, 3.3)])
+def test_smart_cut_is_frame_exact(source, tmp_path, start, end):
+    output = tmp_path / "cut.mkv"
+    video_cutter.smart_cut(source, str(output), start, end)
+    assert frame_numbers(output) == frames_between(source, start, end)
+
+
+@pytest.mark.parametrize("start, end", [(1.0, 47.0), (2.3, 31.13)])
+def test_chunked_reencode_is_frame_exact_on_shifted_source(shifted_mkv, tmp_path, monkeypatch, start, end):
+    # Short checkpoints give several chunks, each starting on its own keyframe
+    monkeypatch.setattr(video_cutter, "CHECKPOINT_SECONDS", 12.0)
+    output = tmp_path / "cut.mkv"
+    video_cutter.reencode_cut(shifted_mkv, str(output), start, end)
+    assert frame_numbers(output) == frames_between(shifted_mkv, start, end)
+
+
+def test_resumed_reencode_keeps_finished_chunks(shifted_mkv, tmp_path, monkeypatch):
+    monkeypatch.setattr(video_cutter, "CHECKPOINT_SECONDS", 12.0)
+    run_ffmpeg = video_cutter.run_ffmpeg
+    encoded = []
+    interrupt_at = ["chunk2.part.mkv"]
+
+    def recording_run_ffmpeg(args, progress=None, cancel=None):
+        name = os.path.basename(args[-1])
+        if name in interrupt_at:
+            raise CutCancelled()
+        encoded.append(name)
+        return run_ffmpeg(args, progress=progress, cancel=cancel)
+
+    monkeypatch.setattr(video_cutter, "run_ffmpeg", recording_run_ffmpeg)
+    output = tmp_path / "cut.mkv"
+    with pytest.raises(CutCancelled):
+        video_cutter.reencode_cut(shifted_mkv, str(output), 1.0, 47.0)
+    assert encoded == ["chunk0.part.mkv", "chunk1.part.mkv"]
+
+    encoded.clear()
+    interrupt_at.clear()
+    video_cutter.reencode_cut(shifted_mkv, str(output), 1.0, 47.0)
+    assert not {"chunk0.part.mkv", "chunk1.part.mkv"} & set(encoded)
+    assert frame_numbers(output) == frames_between(shifted_mkv, 1.0, 47.0)
+    # Nothing is left beside the output once the cut is done
+    assert os.listdir(tmp_path) == ["cut.mkv"]
+
+
+def test_resume_skips_journalled_chunks_behind_a_slow_one(shifted_mkv, tmp_path, monkeypatch):
+    # Chunks run one at a time; while chunk 0 is still encoding, chunk 1 has to find itself in the journal
+    monkeypatch.setattr(video_cutter, "CHECKPOINT_SECONDS", 12.0)
+    monkeypatch.setattr(video_cutter, "chunk_count", lambda duration, cpu_count=None: 1)
+    run_ffmpeg = video_cutter.run_ffmpeg
+    encoded = []
+    interrupt_at = ["chunk2.part.mkv"]
+
+    def recording_run_ffmpeg(args, progress=None, cancel=None):
+        name = os.path.basename(args[-1])
+        if name in interrupt_at:
+            raise CutCancelled()
+        if name == "chunk0.part.mkv":
+            # Long enough for the queue to poll its workers a few times
+            time.sleep(0.5)
+        encoded.append(name)
+        return run_ffmpeg(args, progress=progress, cancel=cancel)
+
+    monkeypatch.setattr(video_cutter, "run_ffmpeg", recording_run_ffmpeg)
+    output = tmp_path / "cut.mkv"
+    with pytest.raises(CutCancelled):
+        video_cutter.reencode_cut(shifted_mkv, str(output), 1.0, 47.0)
+    # Seed the journal with chunk 1 only
+    journal = next(tmp_path.glob(".cut.mkv.vc4u-resume-*/journal.txt"))
+    journal.write_text("".join(line for line in journal.read_text().splitlines(keepends=True) if not line.startswith("0 ")))
+
+    encoded.clear()
+    interrupt_at.clear()
+    video_cutter.reencode_cut(shifted_mkv, str(output), 1.0, 47.0)
+    assert encoded[:2] == ["chunk0.part.mkv", "chunk2.part.mkv"]
+    assert frame_numbers(output) == frames_between(shifted_mkv, 1.0, 47.0)
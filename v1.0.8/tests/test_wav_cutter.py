@@ -0,0 +1,51 @@
+import io
+import os
+
+import pytest
+
+from file_copy import copy_range
+from helpers import decode_samples, make_audio, requires_ffmpeg, samples_between
+from wav_cutter import cut_wav
+
+
+class TrickleFile(io.RawIOBase):
+    # An unbuffered target that takes at most a few bytes per write, as pipes and some network filesystems do
+    def __init__(self):
+        super().__init__()
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        taken = bytes(data[:7])
+        self.data += taken
+        return len(taken)
+
+
+def test_copy_range_finishes_short_writes(tmp_path, monkeypatch):
+    # Without kernel copies every byte goes through the target's own write
+    monkeypatch.delattr(os, "copy_file_range", raising=False)
+    monkeypatch.delattr(os, "sendfile", raising=False)
+    content = bytes(range(256)) * 40
+    path = tmp_path / "source.bin"
+    path.write_bytes(content)
+    target = TrickleFile()
+    with open(path, "rb") as source:
+        copy_range(source, content, target, 100, 9000)
+    assert bytes(target.data) == content[100:9100]
+
+
+@pytest.fixture(scope="module", params=[("pcm_s16le", 2), ("pcm_s24le", 1), ("pcm_f32le", 2), ("pcm_u8", 1)], ids=lambda param: f"{param[0]}-{param[1]}ch")
+def source(request, media_dir):
+    codec, channels = request.param
+    return make_audio(media_dir / f"{codec}_{channels}.wav", 20, 44100, channels, ["-c:a", codec]), channels
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize("start, end", [(0.0, 20.0), (1.23457, 7.5), (19.99, 25.0), (3.0, 3.00002)])
+def test_cut_is_sample_exact(source, tmp_path, start, end):
+    path, channels = source
+    output = tmp_path / "cut.wav"
+    cut_wav(path, str(output), start, end)
+    assert decode_samples(output) == samples_between(path, start, end, 44100, channels)
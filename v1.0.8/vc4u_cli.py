@@ -0,0 +1,239 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+
+from audio_cutter import AUDIO_MODE_REENCODE, AUDIO_MODES
+from cutter import cut_media, parse_time
+from engines import ENGINE_ENV, engine_names
+from ffmpeg_command import SEEK_INPUT, SEEK_MODES, STREAM_MAPS, FFmpegOptions
+from ffmpeg_utils import CutCancelled
+from job_queue import DEFAULT_COPY_WORKERS, DEFAULT_ENCODE_WORKERS, FINISHED_STATES, JOB_DONE, JOB_FAILED, JOB_QUEUED, JobQueue
+from joiner import join_files, join_ranges
+from manifest import ManifestReader, group_jobs
+from multi_cut import cut_segments
+from splitter import parse_size, split_media
+from video_cutter import VIDEO_MODE_COPY, VIDEO_MODES
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="vc4u", description="Cut a range out of a video or audio file.")
+    parser.add_argument("input", nargs="?", help="file to cut (not used with --manifest)")
+    parser.add_argument("output", nargs="?", help="where to write the cut (not used with --range)")
+    parser.add_argument("-s", "--start", type=parse_time, default=0.0, help="start time, seconds or hh:mm:ss.mmm (default: 0)")
+    parser.add_argument("-e", "--end", type=parse_time, help="end time, seconds or hh:mm:ss.mmm")
+    parser.add_argument(
+        "-r", "--range",
+        nargs=3,
+        action="append",
+        metavar=("START", "END", "OUTPUT"),
+        dest="ranges",
+        help="extract this range too; repeat to pull many ranges out of the input in a single pass",
+    )
+    parser.add_argument(
+        "-c", "--clip",
+        nargs=2,
+        action="append",
+        metavar=("START", "END"),
+        dest="clips",
+        help="cut this range and play it after the clips before it in OUTPUT; repeat for every range",
+    )
+    parser.add_argument(
+        "-j", "--join",
+        nargs="+",
+        metavar="FILE",
+        help="play these files one after another in the last FILE named; files that match each other are copied, not re-encoded",
+    )
+    parser.add_argument("--split-every", type=parse_time, metavar="DURATION", help="split the whole input into parts of about this length, named OUTPUT_001, OUTPUT_002, ...")
+    parser.add_argument("--split-size", type=parse_size, metavar="SIZE", help="split the whole input into parts no bigger than this, e.g. 700M or 2G")
+    parser.add_argument("-m", "--manifest", help="run every cut listed in a CSV, JSON or CMX3600 EDL manifest")
+    parser.add_argument("--output-dir", help="where manifest cuts without an output name are written (default: next to the manifest)")
+    parser.add_argument("--source", help="source file for EDL events that name no clip")
+    parser.add_argument("--frame-rate", type=float, help="frame rate of EDL timecodes (default: the source's)")
+    parser.add_argument("--copy-workers", type=int, default=DEFAULT_COPY_WORKERS, help="stream-copy jobs run at once (default: %(default)s)")
+    parser.add_argument("--encode-workers", type=int, default=DEFAULT_ENCODE_WORKERS, help="re-encode jobs run at once (default: %(default)s)")
+    parser.add_argument("--video-mode", choices=VIDEO_MODES, default=VIDEO_MODE_COPY, help="how video is cut (default: %(default)s)")
+    parser.add_argument("--audio-mode", choices=AUDIO_MODES, default=AUDIO_MODE_REENCODE, help="how audio is cut (default: %(default)s)")
+    parser.add_argument("--seek-mode", choices=SEEK_MODES, default=SEEK_INPUT, help="input seeks are fast, output seeks read everything before the start, hybrid reads only the last few seconds (default: %(default)s)")
+    parser.add_argument("--streams", choices=list(STREAM_MAPS), help="which streams to keep (default: all for video, audio for audio files)")
+    parser.add_argument("--threads", type=int, help="threads per ffmpeg run (default: ffmpeg decides)")
+    parser.add_argument(
+        "--muxer-option",
+        action="append",
+        default=[],
+        metavar="OPTION=VALUE",
+        type=parse_muxer_option,
+        help="pass an output option to ffmpeg, e.g. movflags=+faststart; repeatable",
+    )
+    parser.add_argument("--engine", choices=engine_names(), help=f"force a cut engine instead of the cheapest suitable one (same as setting {ENGINE_ENV})")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print progress")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="show ffmpeg's warnings (twice: also the commands run)")
+    return parser
+
+
+def parse_muxer_option(value):
+    option, separator, setting = value.partition("=")
+    if not separator or not option.strip():
+        raise argparse.ArgumentTypeError(f"expected OPTION=VALUE, got {value!r}")
+    return option.strip(), setting
+
+
+def print_progress(update):
+    eta = f"{update.eta_seconds:.0f}s" if update.eta_seconds is not None else "--"
+    sys.stderr.write(
+        f"\r{update.fraction * 100:5.1f}%  {update.mb_per_second:7.1f} MB/s  "
+        f"{update.realtime_factor:6.1f}x  ETA {eta:>6}"
+    )
+    sys.stderr.flush()
+
+
+def run_manifest(args):
+    try:
+        reader = ManifestReader(
+            args.manifest,
+            output_dir=args.output_dir,
+            source=args.source,
+            frame_rate=args.frame_rate,
+            video_mode=args.video_mode,
+            audio_mode=args.audio_mode,
+            options=args.options,
+        )
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"vc4u: error: {e}\n")
+        return 1
+
+    show_progress = not args.quiet and sys.stderr.isatty()
+    outputs = {}
+
+    def print_batch_progress():
+        counts = queue.counts
+        sys.stderr.write(
+            f"\rmanifest {reader.fraction * 100:5.1f}%  {reader.rows_read} rows  "
+            f"{counts[JOB_DONE]} done  {counts[JOB_FAILED]} failed  {queue.active_count()} active"
+        )
+        sys.stderr.flush()
+
+    def report(job_id, status, detail):
+        if status == JOB_QUEUED:
+            outputs[job_id] = ", ".join(detail.outputs)
+        if status not in FINISHED_STATES:
+            return
+        job_outputs = outputs.pop(job_id, "")
+        if status == JOB_FAILED:
+            sys.stderr.write(("\n" if show_progress else "") + f"vc4u: job {job_id + 1} failed ({job_outputs}): {detail}\n")
+        if show_progress:
+            print_batch_progress()
+
+    queue = JobQueue(copy_workers=max(1, args.copy_workers), encode_workers=max(1, args.encode_workers), on_update=report)
+    try:
+        queue.submit_all(group_jobs(reader), submitted=print_batch_progress if show_progress else None)
+        queue.wait()
+    except KeyboardInterrupt:
+        queue.shutdown()
+        sys.stderr.write(("\n" if show_progress else "") + "vc4u: cancelled\n")
+        return 130
+    except (OSError, ValueError) as e:
+        # A bad row stops reading the manifest, the jobs already queued still finish
+        sys.stderr.write(("\n" if show_progress else "") + f"vc4u: error: {e}\n")
+        queue.wait()
+        queue.shutdown()
+        return 1
+    queue.shutdown()
+    if show_progress:
+        sys.stderr.write("\n")
+    if not args.quiet:
+        print(f"{queue.counts[JOB_DONE]} jobs done, {queue.counts[JOB_FAILED]} failed, {reader.rows_read} manifest rows")
+    return 1 if queue.counts[JOB_FAILED] else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    level = (logging.WARNING, logging.INFO, logging.DEBUG)[min(args.verbose, 2)]
+    logging.basicConfig(level=level, format="%(levelname)s: %(message)s")
+    if args.engine:
+        # Through the environment, so manifest jobs in worker processes see it too
+        os.environ[ENGINE_ENV] = args.engine
+    args.options = FFmpegOptions(
+        seek_mode=args.seek_mode,
+        streams=args.streams,
+        threads=args.threads,
+        muxer_options=tuple(args.muxer_option),
+    )
+
+    if args.manifest:
+        return run_manifest(args)
+    if args.join:
+        if len(args.join) < 3:
+            parser.error("--join needs at least two files to join and the output")
+        return run_cut(args, [args.join[-1]], join_files, args.join[:-1], args.join[-1], options=args.options)
+    if not args.input:
+        parser.error("give an input file, --join or a --manifest")
+    if args.split_every is not None or args.split_size is not None:
+        if not args.output or args.ranges or args.clips or args.end is not None:
+            parser.error("splitting needs an output file and cannot be mixed with --end, --range or --clip")
+        return run_cut(
+            args, None, split_media, args.input, args.output,
+            part_seconds=args.split_every, part_bytes=args.split_size, options=args.options,
+        )
+    if args.clips:
+        if not args.output or args.ranges or args.end is not None:
+            parser.error("--clip needs an output file and cannot be mixed with --end or --range")
+        try:
+            clips = [(parse_time(start), parse_time(end)) for start, end in args.clips]
+        except ValueError as e:
+            parser.error(str(e))
+        return run_cut(
+            args, [args.output], join_ranges, args.input, clips, args.output,
+            video_mode=args.video_mode, audio_mode=args.audio_mode, options=args.options,
+        )
+
+    segments = []
+    if args.output:
+        if args.end is None:
+            parser.error("the following arguments are required: -e/--end")
+        segments.append((args.start, args.end, args.output))
+    for start, end, output in args.ranges or []:
+        try:
+            segments.append((parse_time(start), parse_time(end), output))
+        except ValueError as e:
+            parser.error(str(e))
+    if not segments:
+        parser.error("give an output file or at least one --range")
+
+    if len(segments) == 1:
+        start, end, output = segments[0]
+        return run_cut(
+            args, [output], cut_media, args.input, output, start, end,
+            video_mode=args.video_mode, audio_mode=args.audio_mode, options=args.options,
+        )
+    return run_cut(
+        args, [output for _, _, output in segments], cut_segments, args.input, segments,
+        video_mode=args.video_mode, audio_mode=args.audio_mode, options=args.options,
+    )
+
+
+def run_cut(args, outputs, function, *function_args, **function_options):
+    # Runs one cut (or join or split) in this process and reports the files it wrote. Without
+    # outputs, the function returns the files it wrote.
+    progress = None if args.quiet or not sys.stderr.isatty() else print_progress
+    try:
+        written = function(*function_args, progress=progress, **function_options)
+    except (CutCancelled, KeyboardInterrupt):
+        sys.stderr.write(("\n" if progress else "") + "vc4u: cancelled\n")
+        return 130
+    except Exception as e:
+        sys.stderr.write(("\n" if progress else "") + f"vc4u: error: {e}\n")
+        return 1
+    if progress:
+        sys.stderr.write("\n")
+    if not args.quiet:
+        for output in outputs or written:
+            print(f"{output} ({os.path.getsize(output)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
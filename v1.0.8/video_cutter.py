@@ -0,0 +1,351 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+from disk_cache import file_cache_key
+from encode_journal import SegmentJournal, checkpoint_dir
+from ffmpeg_command import check_options, cut_args, muxer_args, thread_args
+from ffmpeg_utils import CutCancelled, iter_ffprobe_entries, run_ffmpeg
+from keyframe_index import copy_start_time, get_keyframe_index
+from media_probe import probe_media
+from progress import ProgressReporter, track
+
+# Video cutting modes
+VIDEO_MODE_COPY = "copy"
+VIDEO_MODE_SMART = "smart"
+VIDEO_MODE_REENCODE = "reencode"
+VIDEO_MODES = [VIDEO_MODE_COPY, VIDEO_MODE_SMART, VIDEO_MODE_REENCODE]
+
+# Encoders used to rebuild the boundary GOPs in the same codec as the copied middle section
+VIDEO_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "mpeg4": "mpeg4",
+    "mpeg2video": "mpeg2video",
+    "vp8": "libvpx",
+    "vp9": "libvpx-vp9",
+    "av1": "libaom-av1",
+}
+
+# Repeat the parameter sets in-band on every keyframe so segments from different encoders join cleanly.
+# libx265 already writes Annex B, which hevc_mp4toannexb passes through untouched, and keeps its
+# parameter sets in the extradata only, so those are added to its keyframes as well.
+PARAMETER_SET_FILTERS = {
+    "h264": "h264_mp4toannexb",
+    "hevc": "hevc_mp4toannexb,dump_extra=freq=keyframe",
+}
+
+# Anything shorter than this is treated as already sitting on a keyframe
+KEYFRAME_TOLERANCE = 0.001
+
+# Extra input read before a copied section, so ffmpeg's own seek back-off never clips it
+SEEK_MARGIN = 1.0
+
+# Matroska keeps milliseconds, so a copied section starts within this of where it was planned
+COPY_START_TOLERANCE = 0.002
+
+# Re-encodes are split into chunks encoded side by side; shorter chunks than this aren't worth
+# an extra encoder, whose start-up and first keyframe cost about as much as a few seconds of video
+MIN_CHUNK_SECONDS = 30.0
+# Re-encodes are cut into segments of about this length at most, so an interrupted
+# encode only loses the segments that were in flight
+CHECKPOINT_SECONDS = 60.0
+
+
+def encoder_args(stream):
+    codec = stream.get("codec_name")
+    encoder = VIDEO_ENCODERS.get(codec)
+    if encoder is None:
+        raise ValueError(f"Cannot re-encode {codec} video")
+    args = ["-c:v", encoder]
+    if stream.get("pix_fmt"):
+        args += ["-pix_fmt", stream["pix_fmt"]]
+    if encoder in ("libx264", "libx265"):
+        args += ["-crf", "18", "-preset", "fast"]
+    elif stream.get("bit_rate"):
+        args += ["-b:v", stream["bit_rate"]]
+    return args + bitstream_filter_args(stream)
+
+
+def bitstream_filter_args(stream):
+    bsf = PARAMETER_SET_FILTERS.get(stream.get("codec_name"))
+    return ["-bsf:v", bsf] if bsf else []
+
+
+def copy_cut(input_file, output_file, start_seconds, end_seconds, progress=None, cancel=None, options=None):
+    if end_seconds <= start_seconds:
+        raise ValueError("End time must be after start time")
+    duration = end_seconds - start_seconds
+    reporter = ProgressReporter(duration, progress) if progress else None
+    args = cut_args(input_file, output_file, start_seconds, end_seconds, ["-vcodec", "copy", "-acodec", "copy"], options=options)
+    run_ffmpeg(args, progress=track(reporter, duration), cancel=cancel)
+
+
+def smart_cut(input_file, output_file, start_seconds, end_seconds, progress=None, cancel=None, options=None):
+    # Smart cuts place every seek themselves, so only the thread count and muxer flags apply
+    if end_seconds <= start_seconds:
+        raise ValueError("End time must be after start time")
+    options = check_options(options)
+
+    stream = probe_media(input_file).video_stream
+    if stream is None:
+        raise ValueError("No video stream found")
+    index = get_keyframe_index(input_file)
+    encode_args = encoder_args(stream) + thread_args(options)
+    duration = end_seconds - start_seconds
+
+    # The copied section runs from the first keyframe at or after the start
+    # to the last keyframe at or before the end. Only the partial GOPs on either
+    # side of it go through the encoder. Both ends have to be closed keyframes: the
+    # leading frames of an open GOP refer back to the GOP the copy leaves out, so an
+    # open-GOP source (x265's default) ends up re-encoded whole.
+    copy_start = index.keyframe_at_or_after(start_seconds, KEYFRAME_TOLERANCE, closed=True)
+    copy_end = index.keyframe_at_or_before(end_seconds, KEYFRAME_TOLERANCE, closed=True)
+
+    def has_frames(start, end):
+        return index.frame_count(start, end, KEYFRAME_TOLERANCE) > 0
+
+    plan = []
+    if copy_start is None or copy_end is None or copy_end - copy_start < KEYFRAME_TOLERANCE:
+        # No complete GOP inside the range, so the whole clip is a boundary
+        plan.append(("encode", start_seconds, end_seconds))
+    else:
+        if has_frames(start_seconds, copy_start):
+            plan.append(("encode", start_seconds, copy_start))
+        plan.append(("copy", copy_start, copy_end))
+        if has_frames(copy_end, end_seconds):
+            plan.append(("encode", copy_end, end_seconds))
+
+    # Progress counts media seconds: each video segment, then the audio pass and the final join
+    reporter = ProgressReporter(duration * 3, progress) if progress else None
+
+    work_dir = tempfile.mkdtemp(prefix="vc4u_", dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        segments = []
+        for kind, start, end in plan:
+            path = os.path.join(work_dir, f"segment{len(segments)}.mkv")
+            # Counting frames rather than seconds keeps a frame on a boundary from landing in both segments
+            frames = ["-frames:v", str(index.frame_count(start, end, KEYFRAME_TOLERANCE))]
+            encode = [
+                "-ss", repr(start),
+                "-i", input_file,
+                "-map", "0:v:0",
+                "-an", "-sn", "-dn",
+            ] + frames + encode_args
+            if kind == "encode":
+                run_ffmpeg(encode + [path], progress=track(reporter, end - start), cancel=cancel)
+                segments.append(path)
+                continue
+
+            # Demuxers that seek by decode timestamp (Matroska among them) land on an earlier
+            # keyframe than asked, and ffmpeg backs some seeks off by 3/23 s as well, so the
+            # input seek lands anywhere before the keyframe and the output-side seek trims the
+            # copy to start exactly on it, the way a multi-range copy cut does. Stream copy
+            # would also stop on decode timestamps and let reordered frames from the next GOP
+            # slip in; counting packets makes the copied section end exactly where the
+            # re-encoded tail begins.
+            read_start = copy_start_time(index, start)
+            base = max(read_start - SEEK_MARGIN, 0.0)
+            args = ["-ss", repr(base), "-i", input_file]
+            if read_start > base:
+                args += ["-ss", repr(read_start - base)]
+            else:
+                read_start = base
+            args += [
+                "-map", "0:v:0",
+                "-an", "-sn", "-dn",
+                "-c:v", "copy",
+            ] + frames + bitstream_filter_args(stream)
+            run_ffmpeg(args + [path], progress=track(reporter, end - start), cancel=cancel)
+            # Both seeks shift timestamps, so the first keyframe should show up where the
+            # planned one sits relative to the read start. Anything else came from another
+            # GOP, and that section is encoded instead.
+            first = first_packet(path)
+            if first is None or "K" not in first.get("flags", "") or abs(float(first["pts_time"]) - (start - read_start)) > COPY_START_TOLERANCE:
+                logging.warning("Stream copy of %.3f-%.3fs did not start on its keyframe, re-encoding it", start, end)
+                run_ffmpeg(encode + [path], cancel=cancel)
+            segments.append(path)
+
+        join_segments(segments, input_file, output_file, start_seconds, duration, work_dir, options, reporter, cancel)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def first_packet(path):
+    for packet in iter_ffprobe_entries([
+        "-select_streams", "v:0",
+        "-read_intervals", "%+#1",
+        "-show_entries", "packet=pts_time,flags",
+        path,
+    ]):
+        if packet.get("pts_time") not in (None, "N/A"):
+            return packet
+    return None
+
+
+def chunk_count(duration, cpu_count=None):
+    # One encoder per core, as long as every chunk stays long enough to be worth one
+    cpu_count = cpu_count or os.cpu_count() or 1
+    return max(1, min(cpu_count, int(duration // MIN_CHUNK_SECONDS)))
+
+
+def plan_chunks(index, start_seconds, end_seconds, count):
+    # Splits the range at the source keyframes nearest to equal shares, so every chunk's
+    # encoder starts decoding on a keyframe
+    duration = end_seconds - start_seconds
+    bounds = [start_seconds]
+    for i in range(1, count):
+        keyframe = index.keyframe_at_or_after(start_seconds + duration * i / count, KEYFRAME_TOLERANCE)
+        if keyframe is not None and bounds[-1] + KEYFRAME_TOLERANCE < keyframe < end_seconds - KEYFRAME_TOLERANCE:
+            bounds.append(keyframe)
+    bounds.append(end_seconds)
+    return list(zip(bounds, bounds[1:]))
+
+
+def encode_chunks(chunks, index, input_file, work_dir, encode_args, reporter=None, cancel=None, workers=None, journal=None):
+    # Runs up to `workers` ffmpegs at the same time, one per chunk. The first failure (or a
+    # cancel) stops the others; progress is the sum of what every encoder has done. Chunks
+    # the journal already has are not encoded again.
+    stop = threading.Event()
+    lock = threading.Lock()
+    finished = journal.finished if journal else {}
+    done = [end - start if number in finished else 0.0 for number, (start, end) in enumerate(chunks)]
+    written = [os.path.getsize(finished[number]) if number in finished else 0 for number in range(len(chunks))]
+
+    def run(number, start, end):
+        def on_block(block):
+            out_time_us = block.get("out_time_us", "")
+            total_size = block.get("total_size", "")
+            with lock:
+                if out_time_us.isdigit():
+                    done[number] = min(int(out_time_us) / 1000000.0, end - start)
+                if total_size.isdigit():
+                    written[number] = int(total_size)
+                reporter.advance(sum(done), sum(written))
+
+        path = os.path.join(work_dir, f"chunk{number}.mkv")
+        if number in finished:
+            return path
+        partial_path = os.path.join(work_dir, f"chunk{number}.part.mkv")
+        args = [
+            "-ss", repr(start),
+            "-i", input_file,
+            "-map", "0:v:0",
+            "-an", "-sn", "-dn",
+            # A start between two frames would otherwise leave a gap before the chunk's first
+            # frame, and the concat demuxer would carry it into the chunks after it. Counting
+            # frames rather than seconds keeps the frame on a boundary out of both chunks.
+            "-vf", "setpts=PTS-STARTPTS",
+            "-frames:v", str(index.frame_count(start, end, KEYFRAME_TOLERANCE)),
+        ] + encode_args
+        if journal:
+            run_ffmpeg(args + [partial_path], progress=on_block if reporter else None, cancel=stop)
+            journal.record(number, partial_path, path)
+        else:
+            run_ffmpeg(args + [path], progress=on_block if reporter else None, cancel=stop)
+        return path
+
+    if reporter:
+        reporter.track(sum(end - start for start, end in chunks))
+        reporter.advance(sum(done), sum(written))
+    with ThreadPoolExecutor(max_workers=workers or len(chunks)) as executor:
+        futures = [executor.submit(run, number, start, end) for number, (start, end) in enumerate(chunks)]
+        pending = futures
+        while pending:
+            done_futures, pending = wait(pending, timeout=0.1, return_when=FIRST_EXCEPTION)
+            if (cancel is not None and cancel.is_set()) or any(future.exception() for future in done_futures):
+                stop.set()
+    if cancel is not None and cancel.is_set():
+        raise CutCancelled()
+    # Report the failure that started it rather than the cancels it caused
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    for error in errors:
+        if not isinstance(error, CutCancelled):
+            raise error
+    if errors:
+        raise errors[0]
+    return [future.result() for future in futures]
+
+
+def reencode_cut(input_file, output_file, start_seconds, end_seconds, progress=None, cancel=None, options=None):
+    # Re-encodes the whole range, frame accurate, in chunks that run on all cores at once.
+    # Finished chunks are kept beside the output until the cut completes, so running the
+    # same cut again after a crash or a cancel picks up where it stopped.
+    if end_seconds <= start_seconds:
+        raise ValueError("End time must be after start time")
+    options = check_options(options)
+
+    stream = probe_media(input_file).video_stream
+    if stream is None:
+        raise ValueError("No video stream found")
+    duration = end_seconds - start_seconds
+    index = get_keyframe_index(input_file)
+    workers = chunk_count(duration)
+    chunks = plan_chunks(index, start_seconds, end_seconds, max(workers, int(duration // CHECKPOINT_SECONDS)))
+    # The encoders share the cores unless a thread count was asked for
+    threads = thread_args(options) or ["-threads", str(max(1, (os.cpu_count() or 1) // workers))]
+    codec_args = encoder_args(stream)
+
+    # Progress counts media seconds: the encodes, then the audio pass and the final join
+    reporter = ProgressReporter(duration * 3, progress) if progress else None
+
+    # The thread count only changes how fast a chunk is encoded, so it is left out of the
+    # checkpoint's identity and a resumed cut may use a different one. The start time is
+    # what the chunk bounds count from, so chunks planned against another one never match.
+    work_dir = checkpoint_dir(output_file, file_cache_key(input_file), index.start_time, chunks, codec_args)
+    journal = SegmentJournal(work_dir)
+    segments = encode_chunks(chunks, index, input_file, work_dir, codec_args + threads, reporter, cancel, workers, journal)
+    # Each chunk lasts from its first frame to the next chunk's, which starts on a keyframe
+    firsts = [index.frame_at_or_after(start, KEYFRAME_TOLERANCE) for start, _ in chunks]
+    durations = [following - first for first, following in zip(firsts, firsts[1:])] + [None]
+    join_segments(segments, input_file, output_file, start_seconds, duration, work_dir, options, reporter, cancel, durations)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def write_concat_list(concat_list, paths, durations=None):
+    # Matroska leaves the last frame's length out of a file's duration, so callers that know
+    # each file's exact length pass it on to the concat demuxer
+    with open(concat_list, "w", encoding="utf-8") as f:
+        for number, path in enumerate(paths):
+            escaped = path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+            if durations and durations[number] is not None:
+                f.write(f"duration {durations[number]!r}\n")
+
+
+def join_segments(segments, input_file, output_file, start_seconds, duration, work_dir, options, reporter=None, cancel=None, durations=None):
+    # Concatenates the video segments without re-encoding and muxes them with the source's audio
+    concat_list = os.path.join(work_dir, "segments.txt")
+    write_concat_list(concat_list, segments, durations)
+
+    # Audio comes straight from the source. Its frames are short enough that stream
+    # copying them is accurate to a few milliseconds. Some demuxers can only seek to the
+    # video keyframe before the start, so the output-side "-ss 0" drops any audio that
+    # was read before the requested start.
+    inputs = ["-f", "concat", "-safe", "0", "-i", concat_list]
+    if probe_media(input_file).audio_streams:
+        audio_path = os.path.join(work_dir, "audio.mka")
+        run_ffmpeg([
+            "-ss", repr(start_seconds),
+            "-t", repr(duration),
+            "-i", input_file,
+            "-ss", "0",
+            "-map", "0:a?",
+            "-c", "copy",
+            audio_path,
+        ], progress=track(reporter, duration), cancel=cancel)
+        inputs += ["-i", audio_path]
+    else:
+        # Nothing to copy, and a Matroska file with no streams cannot be written at all
+        track(reporter, duration)
+
+    run_ffmpeg(inputs + [
+        "-i", input_file,
+        "-map", "0:v:0",
+        "-map", "1:a?",
+        "-map_metadata", str(inputs.count("-i")),
+        "-c", "copy",
+    ] + muxer_args(options) + [output_file], progress=track(reporter, duration), cancel=cancel)
@@ -0,0 +1,125 @@
+import mmap
+import struct
+from collections import namedtuple
+
+from file_copy import copy_range, write_all
+from progress import ProgressReporter
+
+# Sample formats where every block is exactly one sample frame, so any frame boundary is a valid cut
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_ALAW = 0x0006
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+SAMPLE_FORMATS = (WAVE_FORMAT_PCM, WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_ALAW, WAVE_FORMAT_MULAW)
+
+# Chunks carried over to the cut; anything else (cue points, broadcast timing) describes the whole file
+KEPT_CHUNKS = (b"LIST",)
+
+# Sizes in a plain RIFF header are 32 bit; larger cuts are written as RF64
+MAX_RIFF_SIZE = 0xFFFFFFFF
+
+# data_offset/data_size locate the samples in the file; fmt_chunk and extra_chunks are copied into cuts verbatim
+WavInfo = namedtuple(
+    "WavInfo",
+    ["format_tag", "channels", "sample_rate", "block_align", "data_offset", "data_size", "fmt_chunk", "extra_chunks"],
+)
+
+
+def _chunks(data, offset):
+    # Yields (chunk id, body offset, body size) up to the end of the mapped file
+    while offset + 8 <= len(data):
+        chunk_id, size = struct.unpack_from("<4sI", data, offset)
+        yield chunk_id, offset + 8, size
+        offset += 8 + size + (size & 1)
+
+
+def parse_wav(data):
+    # data is the mapped file; raises ValueError for anything that isn't uncompressed WAV
+    if len(data) < 12 or data[8:12] != b"WAVE" or data[0:4] not in (b"RIFF", b"RF64"):
+        raise ValueError("Not a WAV file")
+    rf64_data_size = None
+    fmt = None
+    extra_chunks = []
+    for chunk_id, offset, size in _chunks(data, 12):
+        if chunk_id == b"ds64":
+            rf64_data_size = struct.unpack_from("<Q", data, offset + 8)[0]
+        elif chunk_id == b"fmt ":
+            fmt = bytes(data[offset:offset + size])
+        elif chunk_id in KEPT_CHUNKS:
+            extra_chunks.append((chunk_id, bytes(data[offset:offset + size])))
+        elif chunk_id == b"data":
+            if fmt is None or len(fmt) < 16:
+                raise ValueError("WAV file has no format chunk before its samples")
+            format_tag, channels, sample_rate, _, block_align = struct.unpack_from("<HHIIH", fmt)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+                # The real format is the first two bytes of the sub-format GUID
+                format_tag = struct.unpack_from("<H", fmt, 24)[0]
+            if format_tag not in SAMPLE_FORMATS or not block_align or not sample_rate:
+                raise ValueError(f"WAV sample format 0x{format_tag:04x} can't be cut without decoding")
+            if size == MAX_RIFF_SIZE and rf64_data_size is not None:
+                size = rf64_data_size
+            # Recorders that were stopped early leave a size of 0 or one that runs past the end
+            available = len(data) - offset
+            if size == 0 or size > available:
+                size = available
+            size -= size % block_align
+            return WavInfo(format_tag, channels, sample_rate, block_align, offset, size, fmt, extra_chunks)
+    raise ValueError("WAV file has no samples")
+
+
+def read_wav_info(input_file):
+    with open(input_file, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return parse_wav(data)
+
+
+def _chunk(chunk_id, body):
+    return struct.pack("<4sI", chunk_id, len(body)) + body + (b"\0" if len(body) & 1 else b"")
+
+
+def wav_header(info, data_size, frames):
+    # Everything in front of the samples of a cut holding data_size bytes
+    chunks = _chunk(b"fmt ", info.fmt_chunk)
+    if info.format_tag != WAVE_FORMAT_PCM:
+        # Non-PCM WAV is expected to state its length in frames
+        chunks += _chunk(b"fact", struct.pack("<I", min(frames, MAX_RIFF_SIZE)))
+    for chunk_id, body in info.extra_chunks:
+        chunks += _chunk(chunk_id, body)
+    riff_size = 4 + len(chunks) + 8 + data_size + (data_size & 1)
+    if riff_size <= MAX_RIFF_SIZE:
+        return b"RIFF" + struct.pack("<I", riff_size) + b"WAVE" + chunks + struct.pack("<4sI", b"data", data_size)
+    ds64 = _chunk(b"ds64", struct.pack("<QQQI", riff_size + 36, data_size, frames, 0))
+    return b"RF64" + struct.pack("<I", MAX_RIFF_SIZE) + b"WAVE" + ds64 + chunks + struct.pack("<4sI", b"data", MAX_RIFF_SIZE)
+
+
+def cut_wav(input_file, output_file, start_seconds, end_seconds, progress=None, cancel=None):
+    # A WAV cut is a new header plus a byte range of the samples; nothing is decoded
+    if end_seconds <= start_seconds:
+        raise ValueError("End time must be after start time")
+
+    with open(input_file, "rb") as source, mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        info = parse_wav(data)
+        total_frames = info.data_size // info.block_align
+        start_frame = min(int(round(start_seconds * info.sample_rate)), total_frames)
+        end_frame = min(int(round(end_seconds * info.sample_rate)), total_frames)
+        if end_frame <= start_frame:
+            raise ValueError("Nothing to cut in the requested range")
+        frames = end_frame - start_frame
+        offset = info.data_offset + start_frame * info.block_align
+        size = frames * info.block_align
+
+        duration = frames / info.sample_rate
+        bytes_per_second = info.sample_rate * info.block_align
+        reporter = ProgressReporter(duration, progress) if progress else None
+        if reporter:
+            reporter.track(duration)
+
+        with open(output_file, "wb", buffering=0) as target:
+            write_all(target, wav_header(info, size, frames))
+            on_copied = (lambda copied: reporter.advance(copied / bytes_per_second, copied)) if reporter else None
+            copy_range(source, data, target, offset, size, cancel=cancel, on_copied=on_copied)
+            if size & 1:
+                write_all(target, b"\0")
+
+    if reporter:
+        reporter.report(force=True)